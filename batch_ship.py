@@ -0,0 +1,145 @@
+"""Пакетная подготовка файлов отгрузки без окна.
+
+Берёт сохранённые сессии упаковки (кнопка "Сохранить сессию"), GTIN-индекс и
+шаблоны WB/Ozon и пишет для каждого заказа файлы <имя сессии>_<формат>.xlsx.
+Заказы обрабатываются в пуле процессов, по одному заказу на процесс.
+
+Пример:
+    python batch_ship.py orders/*.json --out shipments \\
+        --gtin ~/.warehouse_packer_gtin.idx --wb-template wb_templates/ -j 4
+
+Шаблон можно указать файлом (общий для всех заказов) или папкой - тогда
+для заказа берётся <папка>/<имя сессии>.xlsx. Содержимое файлов зависит
+только от входных данных, а не от числа процессов и порядка их завершения.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from packing_session import PackingSession
+import shipment_writer
+
+FORMATS = ('export', 'wb', 'ozon')
+DEFAULT_GTIN_INDEX = os.path.expanduser('~/.warehouse_packer_gtin.idx')
+
+
+def _template_path(option, stem):
+    if os.path.isdir(option):
+        return os.path.join(option, stem + '.xlsx')
+    return option
+
+
+def _read_template(path, required):
+    import pandas as pd
+    tpl = pd.read_excel(path, dtype=str)
+    shipment_writer.check_template(tpl, required)
+    return tpl
+
+
+def ship_order(job):
+    """Все файлы одного заказа; выполняется в процессе пула.
+
+    Возвращает (сессия, [(файл, строк, секунд)], ошибка или None).
+    """
+    session_path, options = job
+    stem = os.path.splitext(os.path.basename(session_path))[0]
+    written = []
+    catalog = tmp = None
+    try:
+        session = PackingSession.load(session_path)
+        if options['gtin'] and os.path.exists(options['gtin']):
+            import gtin_index
+            catalog = gtin_index.GtinCatalog(options['gtin'])
+            session.set_gtin_map(catalog)
+        for fmt in options['formats']:
+            started = time.perf_counter()
+            path = os.path.join(options['out'], f"{stem}_{fmt}.xlsx")
+            tmp = path + '.tmp'
+            if fmt == 'export':
+                rows = shipment_writer.write_export(tmp, session)
+            elif fmt == 'wb':
+                tpl = _read_template(_template_path(options['wb_template'], stem),
+                                     shipment_writer.WB_TEMPLATE_COLUMNS)
+                rows = shipment_writer.write_wb(tmp, session, tpl)
+            else:
+                tpl = _read_template(_template_path(options['ozon_template'], stem),
+                                     shipment_writer.OZON_COLUMNS)
+                rows = shipment_writer.write_ozon(tmp, session, tpl)
+            os.replace(tmp, path)
+            tmp = None
+            written.append((os.path.basename(path), rows, time.perf_counter() - started))
+    except Exception as e:
+        # Недописанный файл не должен остаться рядом с готовыми
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+        return session_path, written, f"{type(e).__name__}: {e}"
+    finally:
+        if catalog is not None:
+            catalog.close()
+    return session_path, written, None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Файлы отгрузки WB/Ozon для сохранённых сессий упаковки")
+    parser.add_argument('sessions', nargs='+', help="файлы сессий (.json)")
+    parser.add_argument('--out', default='.', help="папка для результатов")
+    parser.add_argument('--gtin', default=DEFAULT_GTIN_INDEX, help="GTIN-индекс (.idx)")
+    parser.add_argument('--wb-template', help="шаблон WB: файл или папка с <сессия>.xlsx")
+    parser.add_argument('--ozon-template', help="шаблон Ozon: файл или папка с <сессия>.xlsx")
+    parser.add_argument('--formats', default=None,
+                        help="через запятую из export,wb,ozon; по умолчанию export и те, "
+                             "для которых указан шаблон")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help="число процессов")
+    args = parser.parse_args(argv)
+
+    if args.formats is None:
+        formats = ['export']
+        formats += [fmt for fmt, tpl in (('wb', args.wb_template), ('ozon', args.ozon_template)) if tpl]
+    else:
+        formats = [fmt.strip() for fmt in args.formats.split(',') if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if unknown:
+        parser.error(f"неизвестный формат: {', '.join(unknown)}")
+    if 'wb' in formats and not args.wb_template:
+        parser.error("для формата wb нужен --wb-template")
+    if 'ozon' in formats and not args.ozon_template:
+        parser.error("для формата ozon нужен --ozon-template")
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in args.sessions]
+    if len(set(stems)) != len(stems):
+        parser.error("имена файлов сессий должны различаться: по ним называются результаты")
+    args.formats = formats
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.out, exist_ok=True)
+    options = {'out': args.out, 'gtin': args.gtin, 'formats': args.formats,
+               'wb_template': args.wb_template, 'ozon_template': args.ozon_template}
+    jobs = [(path, options) for path in args.sessions]
+
+    started = time.perf_counter()
+    workers = max(1, min(args.workers or 1, len(jobs)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map отдаёт результаты в порядке заказов, поэтому отчёт одинаков при любом числе процессов
+        results = list(pool.map(ship_order, jobs))
+    elapsed = time.perf_counter() - started
+
+    failed = 0
+    for session_path, written, error in results:
+        print(os.path.basename(session_path))
+        for name, rows, seconds in written:
+            print(f"  {name:<40} {rows:>8} строк {seconds:8.2f} с")
+        if error:
+            failed += 1
+            print(f"  ОШИБКА: {error}")
+    files = sum(len(written) for _, written, _ in results)
+    print(f"Заказов: {len(results)}, файлов: {files}, ошибок: {failed}, "
+          f"процессов: {workers}, время: {elapsed:.2f} с")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Бенчмарк хранилищ склада: задержка одного скана и запись пачки.
+
+Google Sheets имитируется в памяти с задержкой SHEETS_LATENCY на запрос
+(типичное время ответа API); SQLite - настоящий файл во временной папке.
+
+Запуск: python benchmarks/bench_backends.py [число артикулов] [задержка Sheets, с]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from fake_sheets import FakeSheetsService
+from inventory_backends import SheetsBackend, SqliteBackend
+from warehouse_storage import WarehouseStorage
+
+SHEETS_LATENCY = 0.15
+SCANS = {'sheets': 20, 'sqlite': 5000}
+BATCH = 500
+
+
+def sheets_backend(rows, latency):
+    storage = WarehouseStorage()
+    storage.service = FakeSheetsService(rows, latency)
+    storage.spreadsheet_id = 'bench'
+    storage.reconciler.interval = 3600  # без фоновой сверки во время замеров
+    return SheetsBackend(storage)
+
+
+def measure(name, backend, articles):
+    start = time.perf_counter()
+    records = backend.load()
+    load = time.perf_counter() - start
+
+    probe = random.Random(1).choices(articles, k=SCANS[name])
+    start = time.perf_counter()
+    for article in probe:
+        backend.apply_delta(article, -1)
+    per_scan = (time.perf_counter() - start) / len(probe)
+
+    batch = {article: (5, 'B-02-02') for article in articles[:BATCH]}
+    start = time.perf_counter()
+    backend.bulk_apply(batch)
+    bulk = time.perf_counter() - start
+
+    print(f"{name:<7} загрузка {len(records)}: {load * 1000:8.1f} мс   "
+          f"скан: {per_scan * 1000:8.3f} мс   пачка {BATCH}: {bulk * 1000:8.1f} мс")
+    backend.close()
+
+
+def main(n=10000, latency=SHEETS_LATENCY):
+    articles = [f"ART-{i:06d}" for i in range(n)]
+    rows = [(art, 10, 'A-01-01') for art in articles]
+    measure('sheets', sheets_backend(rows, latency), articles)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SqliteBackend(os.path.join(tmp, 'stock.db'))
+        backend.bulk_apply({art: (10, 'A-01-01') for art in articles})
+        measure('sqlite', backend, articles)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+         float(sys.argv[2]) if len(sys.argv) > 2 else SHEETS_LATENCY)
@@ -0,0 +1,54 @@
+"""Бенчмарк плана коробок на большом заказе.
+
+Каталог и количества случайные; проверяется, что план раскладывает все
+единицы и ни одна коробка не превышает объём и вес.
+Код возврата 1, если расчёт дольше BUDGET секунд.
+
+Запуск: python benchmarks/bench_box_planner.py [число строк]
+"""
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import box_planner
+
+BUDGET = 1.0
+
+
+def main(lines=10000):
+    rng = random.Random(1)
+    articles = [f"ART-{i:06d}" for i in range(lines)]
+    counts = [rng.randint(1, 20) for _ in articles]
+    # У 3% артикулов нет размеров в каталоге
+    catalog = {art: (rng.uniform(0.05, 8.0), rng.uniform(0.01, 3.0))
+               for art in articles if rng.random() > 0.03}
+
+    start = time.perf_counter()
+    plan = box_planner.plan_boxes(articles, counts, catalog)
+    contents = box_planner.box_contents(plan)
+    elapsed = time.perf_counter() - start
+
+    planned = np.bincount(plan.article, plan.quantity, minlength=lines)
+    assert (planned == counts).all(), "план разложил не все единицы"
+    assert len(contents) == plan.boxes
+    assert (plan.volumes <= box_planner.BOX_VOLUME + 1e-6).all()
+    assert (plan.weights <= box_planner.BOX_WEIGHT + 1e-6).all()
+
+    # Нижняя граница числа коробок по суммарному объёму и весу
+    volumes, weights, _ = box_planner.unit_sizes(articles, catalog)
+    bound = max(np.dot(counts, volumes) / box_planner.BOX_VOLUME,
+                np.dot(counts, weights) / box_planner.BOX_WEIGHT)
+    print(f"{lines} строк, {sum(counts)} единиц: {plan.boxes} коробок "
+          f"(нижняя граница {int(np.ceil(bound))}) за {elapsed * 1000:.0f} мс")
+    if elapsed > BUDGET:
+        print(f"ОШИБКА: расчёт дольше {BUDGET:g} с")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000))
@@ -0,0 +1,54 @@
+"""Микробенчмарк: поиск и изменение остатка в pandas DataFrame и в StockRecord.
+
+Запуск: python benchmarks/bench_inventory.py [число артикулов]
+"""
+import os
+import random
+import sys
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from warehouse_storage import StockRecord, WarehouseStorage
+
+
+def main(n=10000, lookups=20000):
+    articles = [f"ART-{i:06d}" for i in range(n)]
+    probe = random.Random(1).choices(articles, k=lookups)
+
+    # Прежнее хранение: DataFrame с индексом по артикулу
+    df = pd.DataFrame({'Артикул': articles, 'Количество': 10, 'Ячейка': 'A-01-01'}).set_index('Артикул')
+
+    def df_lookup():
+        for art in probe:
+            if art in df.index:
+                row = df.loc[art]
+                row['Количество'], row['Ячейка']
+
+    def df_update():
+        for art in probe:
+            df.loc[art, 'Количество'] = max(0, df.loc[art, 'Количество'] - 1)
+
+    storage = WarehouseStorage()
+    storage.enabled = True
+    storage.sync.push = lambda *args: None  # без фоновой записи
+    storage.storage_data = {art: StockRecord(10, 'A-01-01') for art in articles}
+
+    def store_lookup():
+        for art in probe:
+            storage.get_article_info(art)
+
+    def store_update():
+        for art in probe:
+            storage.update_article_quantity(art, -1)
+
+    print(f"{n} артикулов, {lookups} операций")
+    for name, fn in [("DataFrame поиск", df_lookup), ("StockRecord поиск", store_lookup),
+                     ("DataFrame изменение", df_update), ("StockRecord изменение", store_update)]:
+        best = min(timeit.repeat(fn, number=1, repeat=3))
+        print(f"{name:24s} {best / lookups * 1e6:8.2f} мкс/операция")
+
+
+if __name__ == '__main__':
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,53 @@
+"""Бенчмарк журнала упаковки: стоимость записи скана и время восстановления.
+
+Запуск: python benchmarks/bench_journal.py [число сканов]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from packing_session import PackingSession, OK
+from scan_journal import ScanJournal
+
+ARTICLES = 10000
+BOXES = 100
+
+
+def main(scans=50000):
+    articles = [f"ART-{i:06d}" for i in range(ARTICLES)]
+    gtin_map = {f"46{i:011d}": art for i, art in enumerate(articles)}
+    gtins = list(gtin_map)
+    probe = random.Random(1).choices(gtins, k=scans)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for journaled in (False, True):
+            session = PackingSession()
+            session.set_gtin_map(gtin_map)
+            journal = ScanJournal(tmp)
+            if journaled:
+                session.journal = journal
+            session.load_sheet(articles, [scans] * ARTICLES)
+            for b in range(BOXES):
+                session.add_box(f"BOX-{b:03d}")
+            start = time.perf_counter()
+            for n, gtin in enumerate(probe):
+                assert session.scan(gtin, session.boxes[n % BOXES]).status == OK
+            elapsed = time.perf_counter() - start
+            journal.close()
+            print(f"{'с журналом' if journaled else 'без журнала':<12} "
+                  f"{elapsed / scans * 1e6:7.1f} мкс на скан")
+
+        restored = PackingSession()
+        start = time.perf_counter()
+        replayed = ScanJournal(tmp).resume(restored)
+        elapsed = time.perf_counter() - start
+        assert (restored.counts[:BOXES] == session.counts[:BOXES]).all()
+        print(f"Восстановление {scans} сканов: {elapsed * 1000:.0f} мс "
+              f"(повторено {replayed} записей после снимка)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
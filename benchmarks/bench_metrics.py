@@ -0,0 +1,65 @@
+"""Бенчмарк накладных расходов замеров на цикле сканирования.
+
+Один и тот же цикл ScanIntake запускается в отдельных процессах с
+WAREHOUSE_METRICS=0 и =1 (флаг читается при импорте) и сравнивается с
+прямыми вызовами PackingSession.scan без очереди и без замеров.
+
+Запуск: python benchmarks/bench_metrics.py [число сканов]
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+PROBE = r'''
+import json, random, sys, time
+sys.path.insert(0, %r)
+from packing_session import PackingSession
+from scan_intake import ScanIntake
+
+scans = %d
+articles = [f"ART-{i:06d}" for i in range(10000)]
+gtin_map = {f"46{i:011d}": art for i, art in enumerate(articles)}
+probe = random.Random(1).choices(list(gtin_map), k=scans)
+
+def session():
+    s = PackingSession()
+    s.set_gtin_map(gtin_map)
+    s.load_sheet(articles, [scans] * len(articles))
+    s.add_box("BOX-1")
+    return s
+
+direct = session()
+start = time.perf_counter()
+for code in probe:
+    direct.scan(code, "BOX-1")
+plain = time.perf_counter() - start
+
+intake = ScanIntake(session())
+start = time.perf_counter()
+for code in probe:
+    intake.push(code, "BOX-1")
+    intake.drain()
+queued = time.perf_counter() - start
+print(json.dumps({'direct': plain / scans, 'intake': queued / scans}))
+'''
+
+
+def run(enabled, scans):
+    env = dict(os.environ, WAREHOUSE_METRICS='1' if enabled else '0')
+    out = subprocess.run([sys.executable, '-c', PROBE % (ROOT, scans)], env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out)
+
+
+def main(scans=100000):
+    off, on = run(False, scans), run(True, scans)
+    print(f"scan напрямую:             {off['direct'] * 1e6:6.2f} мкс")
+    print(f"через очередь, замеры выкл: {off['intake'] * 1e6:6.2f} мкс")
+    print(f"через очередь, замеры вкл:  {on['intake'] * 1e6:6.2f} мкс")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
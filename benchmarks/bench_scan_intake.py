@@ -0,0 +1,109 @@
+"""Бенчмарк приёма сканов: устойчивая скорость на листе из 10 000 строк.
+
+Сканер присылает коды пачками по 1-5 штук, часть кодов ошибочные
+(неизвестный GTIN, превышение количества). После каждой пачки выполняется
+то же, что окно делает за один кадр: разбор очереди и пересчёт таблицы.
+
+С дисплеем замер идёт через настоящее окно WarehousePacker (ввод в поле
+сканера, разбор по таймеру Tk, перерисовка таблицы); без дисплея - через
+ScanIntake и пересчёт данных таблицы без виджетов.
+Код возврата 1, если скорость ниже MIN_RATE сканов в секунду.
+
+Запуск: python benchmarks/bench_scan_intake.py [число сканов]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from packing_session import PackingSession
+from scan_intake import ScanIntake
+
+ARTICLES = 10000
+MIN_RATE = 20
+ERROR_SHARE = 0.05
+
+
+def make_bursts(gtins, scans):
+    rng = random.Random(1)
+    bursts, left = [], scans
+    while left > 0:
+        size = min(left, rng.randint(1, 5))
+        bursts.append([rng.choice(gtins) if rng.random() > ERROR_SHARE else "0000000000000"
+                       for _ in range(size)])
+        left -= size
+    return bursts
+
+
+def prepare(session, articles, gtin_map):
+    session.set_gtin_map(gtin_map)
+    # Малые количества: часть сканов упирается в "Превышено"
+    session.load_sheet(articles, [3] * len(articles))
+    session.add_box("BOX-1")
+
+
+def run_headless(articles, gtin_map, bursts):
+    session = PackingSession()
+    prepare(session, articles, gtin_map)
+    intake = ScanIntake(session)
+    for burst in bursts:
+        for code in burst:
+            intake.push(code, "BOX-1")
+        intake.drain()
+        # Пересчёт, который делает refresh_tree на каждую пачку
+        session.box_counts("BOX-1")
+        session.remaining_counts().nonzero()
+    return intake
+
+
+def run_window(articles, gtin_map, bursts):
+    import tkinter as tk
+    import packing
+
+    root = tk.Tk()
+    app = packing.WarehousePacker(root)
+    prepare(app.session, articles, gtin_map)
+    app.current_box = "BOX-1"
+    app.refresh_tree()
+    root.update()
+    for burst in bursts:
+        for code in burst:
+            app.scan_entry.insert(0, code)
+            app.process_scan(None)
+        # Ждём разбора пачки по таймеру и перерисовки окна
+        while app._scan_flush is not None:
+            root.update()
+        root.update()
+    intake = app.intake
+    app.journal.close()
+    root.destroy()
+    return intake
+
+
+def main(scans=2000):
+    articles = [f"ART-{i:06d}" for i in range(ARTICLES)]
+    gtin_map = {f"46{i:011d}": art for i, art in enumerate(articles)}
+    bursts = make_bursts(list(gtin_map), scans)
+
+    with_window = bool(os.environ.get('DISPLAY')) or sys.platform == 'win32'
+    with tempfile.TemporaryDirectory() as home:
+        # Окно не должно видеть настройки, журнал и склад этой машины
+        os.environ['HOME'] = os.environ['USERPROFILE'] = home
+        start = time.perf_counter()
+        intake = (run_window if with_window else run_headless)(articles, gtin_map, bursts)
+        elapsed = time.perf_counter() - start
+
+    rate = scans / elapsed
+    print(f"{'окно Tk' if with_window else 'без окна'}: {scans} сканов в {len(bursts)} пачках "
+          f"за {elapsed:.2f} с - {rate:.0f} сканов/с "
+          f"(принято {intake.accepted}, ошибок {scans - intake.accepted})")
+    if rate < MIN_RATE:
+        print(f"ОШИБКА: скорость ниже {MIN_RATE} сканов/с")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
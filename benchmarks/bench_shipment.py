@@ -0,0 +1,85 @@
+"""Бенчмарк записи отгрузки WB: прежние три прохода против записи по столбцам.
+
+Прежний путь: список словарей -> DataFrame.to_excel -> load_workbook ->
+сброс шрифта и рамок у каждой ячейки -> повторное сохранение.
+
+Запуск: python benchmarks/bench_shipment.py [число строк]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.styles import Font
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import shipment_writer
+from packing_session import PackingSession
+
+ARTICLES_PER_BOX = 200
+
+
+def make_session(lines):
+    boxes = max(1, lines // ARTICLES_PER_BOX)
+    articles = [f"ART-{i:06d}" for i in range(ARTICLES_PER_BOX)]
+    session = PackingSession()
+    session.load_sheet(articles, [boxes] * len(articles))
+    for b in range(boxes):
+        box = f"BOX-{b:05d}"
+        session.add_box(box)
+        for art in articles:
+            session.set_quantity(box, art, 1)
+    tpl = pd.DataFrame({'ШК короба': [f"WB_{b:08d}" for b in range(boxes)],
+                        'Срок годности': '2027-01-01'}, dtype=str)
+    return session, tpl
+
+
+def old_wb(path, session, tpl):
+    out_rows = []
+    for idx, box in enumerate(session.boxes):
+        if idx >= len(tpl):
+            break
+        box_code = tpl.at[idx, 'ШК короба']
+        shelf_life = tpl.at[idx, 'Срок годности']
+        for art, cnt in session.box_items(box):
+            out_rows.append({'Баркод товара': art, 'Кол-во товаров': cnt,
+                             'ШК короба': box_code, 'Срок годности': shelf_life})
+    pd.DataFrame(out_rows).to_excel(path, index=False)
+    wb = load_workbook(path)
+    ws = wb.active
+    for row in ws.iter_rows(min_row=1, max_row=1):
+        for cell in row:
+            cell.font = Font(bold=False)
+    for row in ws.iter_rows():
+        for cell in row:
+            cell.border = None
+    wb.save(path)
+
+
+def measure(name, write, path, session, tpl):
+    tracemalloc.start()
+    start = time.perf_counter()
+    write(path, session, tpl)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<22} {elapsed:8.2f} с   пик памяти {peak / 1e6:7.1f} МБ   "
+          f"файл {os.path.getsize(path) / 1e6:.1f} МБ")
+    return elapsed
+
+
+def main(lines=100000):
+    session, tpl = make_session(lines)
+    print(f"Строк: {len(session.boxes) * ARTICLES_PER_BOX}, коробок: {len(session.boxes)}")
+    with tempfile.TemporaryDirectory() as tmp:
+        old = measure("to_excel + restyle", old_wb, os.path.join(tmp, 'old.xlsx'), session, tpl)
+        new = measure("столбцы xlsx_writer", shipment_writer.write_wb,
+                      os.path.join(tmp, 'new.xlsx'), session, tpl)
+    print(f"Ускорение: x{old / new:.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,101 @@
+"""Бенчмарк запуска окна упаковки: время импорта и время до первого окна.
+
+Замер идёт в отдельном процессе с чистым HOME (без сохранённых настроек,
+журнала и снимка склада). Процесс запускается с -X importtime, самые
+дорогие модули выводятся списком. Дополнительно проверяется, что тяжёлые
+библиотеки (pandas, openpyxl, PIL, клиент Google) при старте не загружены:
+они нужны только при чтении листа, записи отгрузки и подключении к таблице.
+
+Без дисплея окно не создаётся - меряется только импорт.
+Код возврата 1, если время до окна (или импорта) больше бюджета.
+
+Запуск: python benchmarks/bench_startup.py [бюджет, мс] [повторов]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BUDGET_MS = 1500
+HEAVY_MODULES = ['pandas', 'openpyxl', 'PIL', 'googleapiclient', 'google_auth_oauthlib']
+TOP = 10
+
+# Выполняется в дочернем процессе; печатает одну строку JSON
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import packing
+imported = time.perf_counter() - start
+window = None
+try:
+    import tkinter as tk
+    root = tk.Tk()
+except Exception:
+    root = None
+if root is not None:
+    packing.WarehousePacker(root)
+    root.update()
+    window = time.perf_counter() - start
+    root.destroy()
+print(json.dumps({'import': imported, 'window': window,
+                  'loaded': [m for m in %r if m in sys.modules]}))
+''' % (HEAVY_MODULES,)
+
+
+def parse_importtime(stderr):
+    """Строки -X importtime -> [(суммарно мкс, модуль)] по убыванию"""
+    entries = []
+    for line in stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|', 2)
+        entries.append((int(cumulative), name.strip()))
+    entries.sort(reverse=True)
+    return entries
+
+
+def run_once(home):
+    env = dict(os.environ, HOME=home, USERPROFILE=home, PYTHONDONTWRITEBYTECODE='1')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"Запуск завершился с ошибкой:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['importtime'] = parse_importtime(proc.stderr)
+    return result
+
+
+def main(budget_ms=BUDGET_MS, repeats=5):
+    with tempfile.TemporaryDirectory() as home:
+        runs = [run_once(home) for _ in range(repeats)]
+    best = min(runs, key=lambda r: r['window'] if r['window'] is not None else r['import'])
+
+    print(f"Самые долгие импорты (суммарно, первый из {repeats} запусков):")
+    for cumulative, name in runs[0]['importtime'][:TOP]:
+        print(f"  {cumulative / 1000:8.1f} мс  {name}")
+
+    imported_ms = min(r['import'] for r in runs) * 1000
+    print(f"импорт packing: {imported_ms:.0f} мс")
+    if best['window'] is not None:
+        measured_ms = min(r['window'] for r in runs) * 1000
+        print(f"до первого окна: {measured_ms:.0f} мс (бюджет {budget_ms} мс)")
+    else:
+        measured_ms = imported_ms
+        print(f"нет дисплея: окно не создавалось, бюджет {budget_ms} мс применён к импорту")
+
+    failed = False
+    if best['loaded']:
+        print(f"ОШИБКА: при старте загружены {', '.join(best['loaded'])}")
+        failed = True
+    if measured_ms > budget_ms:
+        print(f"ОШИБКА: запуск дольше бюджета на {measured_ms - budget_ms:.0f} мс")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else BUDGET_MS,
+                  int(sys.argv[2]) if len(sys.argv) > 2 else 5))
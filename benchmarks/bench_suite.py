@@ -0,0 +1,288 @@
+"""Набор бенчмарков упаковки, склада и выгрузок на синтетических данных.
+
+Для каждого размера (артикулов x коробок) меряются: цикл сканирования,
+переключение коробки, пересчёт итогов, экспорт, отгрузки WB и Ozon,
+загрузка и запись склада через имитацию Google Sheets (fake_sheets.py).
+Каждый замер повторяется, берётся медиана. Сканирование, переключение
+коробки и итоги меряются целым блоком (SCANS сканов, SWITCHES переключений),
+чтобы время было в миллисекундах, а не в шуме таймера. Результаты - JSON
+{"meta": ..., "results": {"<размер>/<замер>": секунды}}.
+
+По умолчанию результаты сравниваются с базовым прогоном BASELINE_FILE
+(benchmarks/baseline.json, быстрый набор): замер хуже базового больше чем
+на порог (по умолчанию 20%) и при этом больше чем на NOISE_FLOOR (1 мс)
+считается регрессией, код возврата 1. Замеры короче STABLE_MIN (10 мс в
+базовом прогоне) только показываются: их разброс больше порога. Базовый
+прогон (--save-baseline) - медиана BASELINE_RUNS полных прогонов. Скорость виртуальной машины плавает
+между запусками в разы, поэтому для каждого размера до и после замеров
+меряется эталонная нагрузка (calibration); при сравнении время приводится
+к скорости машины базового прогона. Базовый прогон снят на одной машине;
+на другой его стоит сначала переснять.
+
+Запуск:
+    python benchmarks/bench_suite.py                         # быстрый набор, сравнение с baseline.json
+    python benchmarks/bench_suite.py --profile full          # до 100k артикулов и 500 коробок
+    python benchmarks/bench_suite.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_suite.py --baseline other.json --threshold 0.2 --out result.json
+    python benchmarks/bench_suite.py --no-baseline           # без сравнения
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import numpy as np
+
+import shipment_writer
+import synthetic
+from fake_sheets import FakeSheetsService
+from warehouse_storage import WarehouseStorage
+
+# (артикулов, коробок)
+PROFILES = {
+    'quick': [(100, 1), (1000, 20), (10000, 50)],
+    'full': [(100, 1), (1000, 20), (10000, 50), (10000, 500), (100000, 20), (100000, 500)],
+}
+REPEATS = 5
+SCANS = 2000
+SWITCHES = 200
+STORAGE_WRITES = 500
+THRESHOLD = 0.2
+RETRIES = 2
+BASELINE_RUNS = 3
+NOISE_FLOOR = 0.001  # с: разница меньше - шум, не регрессия
+STABLE_MIN = 0.01    # с: более короткие замеры не сравниваются
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def median_of(repeats, func):
+    """Медиана времени func() из repeats запусков"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def _reference_load():
+    """Эталонная нагрузка: словарь и строки, как в сессии, плюс NumPy"""
+    counts = {}
+    for i in range(200000):
+        key = str(i % 5000)
+        counts[key] = counts.get(key, 0) + 1
+    values = np.arange(200000)
+    (values * 3 % 7).sum()
+
+
+def calibrate(repeats):
+    """Время эталонной нагрузки: мера текущей скорости машины"""
+    return median_of(repeats, _reference_load)
+
+
+def bench_packing(articles, boxes, repeats, tmp):
+    names, quantities = synthetic.order_sheet(articles)
+    catalog = synthetic.gtin_catalog(names, tmp)
+    results = {}
+
+    # Сканирование в свободную сессию: время SCANS сканов
+    gtins = list(synthetic.gtin_map(names))
+    probe = [gtins[i] for i in np.random.default_rng(2).integers(0, articles, SCANS)]
+    box_names = [f"BOX-{b:03d}" for b in range(boxes)]
+
+    def scan_loop():
+        session = synthetic.empty_session(names, quantities, boxes, catalog)
+        start = time.perf_counter()
+        for n, code in enumerate(probe):
+            session.scan(code, box_names[n % boxes])
+        return time.perf_counter() - start
+    results['scan'] = statistics.median(scan_loop() for _ in range(repeats))
+
+    session = synthetic.packed_session(names, quantities, boxes, catalog)
+
+    # Переключение коробки: то, что таблица пересчитывает при выборе коробки
+    def switch():
+        for n in range(SWITCHES):
+            box = box_names[n % boxes]
+            counts = session.box_counts(box)
+            remaining = session.remaining_counts()
+            session.box_total(box)
+            np.flatnonzero(remaining > 0)
+            counts.tolist()
+    results['box_switch'] = median_of(repeats, switch)
+
+    # Итоги по всем коробкам и листу
+    def totals():
+        for _ in range(SWITCHES):
+            session.remaining_counts().sum()
+            [session.box_total(box) for box in session.boxes]
+            session.scanned.sum()
+    results['totals'] = median_of(repeats, totals)
+
+    wb, ozon = synthetic.wb_template(boxes), synthetic.ozon_template(boxes)
+    path = os.path.join(tmp, 'out.xlsx')
+    cells = dict((art, cell) for art, _, cell in synthetic.inventory_rows(names))
+    results['export'] = median_of(repeats, lambda: shipment_writer.write_export(path, session, cells.get))
+    results['ship_wb'] = median_of(repeats, lambda: shipment_writer.write_wb(path, session, wb))
+    results['ship_ozon'] = median_of(repeats, lambda: shipment_writer.write_ozon(path, session, ozon))
+    catalog.close()
+    return results
+
+
+def bench_storage(articles, repeats):
+    names, _ = synthetic.order_sheet(articles)
+    rows = synthetic.inventory_rows(names)
+    storage = WarehouseStorage()
+    storage.service = FakeSheetsService(rows)
+    storage.spreadsheet_id = 'bench'
+    storage.reconciler.interval = 3600  # без фоновой сверки во время замеров
+    storage.enabled = True
+    results = {'storage_load': median_of(repeats, storage.reload_storage_data)}
+
+    changed = names[:STORAGE_WRITES]
+
+    def write():
+        for art in changed:
+            storage.apply_quantity_change(art, -1)
+        storage.write_storage_data()
+    results['storage_write'] = median_of(repeats, write)
+    storage.reconciler.stop()
+    return results
+
+
+def run(profile, repeats, sizes=None):
+    """{"<размер>/<замер>": секунды}; sizes - только эти размеры ("1000x20")"""
+    results, storage_done = {}, set()
+    with tempfile.TemporaryDirectory() as tmp:
+        for articles, boxes in PROFILES[profile]:
+            size = f"{articles}x{boxes}"
+            if sizes is not None and size not in sizes:
+                continue
+            print(f"{size} ...", file=sys.stderr)
+            before = calibrate(repeats)
+            measured = bench_packing(articles, boxes, repeats, tmp)
+            if articles not in storage_done:
+                # Склад зависит только от числа артикулов
+                measured.update(bench_storage(articles, repeats))
+                storage_done.add(articles)
+            measured['calibration'] = (before + calibrate(repeats)) / 2
+            for name, seconds in measured.items():
+                results[f"{size}/{name}"] = seconds
+    return results
+
+
+def compare(results, baseline, threshold, floor=NOISE_FLOOR):
+    """Строки сравнения и список регрессий: хуже базового больше чем на долю
+    threshold и больше чем на floor секунд. Время приводится к скорости машины
+    базового прогона по эталонной нагрузке того же размера"""
+    lines, regressions = [], []
+    for key in results:
+        size, name = key.split('/')
+        current = results[key]
+        base = baseline.get(key)
+        if name == 'calibration':
+            lines.append(f"{key:<32} {current * 1000:10.3f} мс")
+            continue
+        scale = baseline.get(f"{size}/calibration")
+        if scale and results.get(f"{size}/calibration"):
+            current *= scale / results[f"{size}/calibration"]
+        if base is None:
+            lines.append(f"{key:<32} {current * 1000:10.3f} мс" + ("   (нет в базовом)" if baseline else ""))
+            continue
+        change = current / base - 1 if base else 0.0
+        mark = ""
+        if base < STABLE_MIN:
+            mark = "  (не сравнивается)"
+        elif change > threshold and current - base > floor:
+            mark = "  РЕГРЕССИЯ"
+            regressions.append(key)
+        lines.append(f"{key:<32} {current * 1000:10.3f} мс   {change:+7.1%}{mark}")
+    return lines, regressions
+
+
+def load_baseline(args):
+    """Результаты базового прогона или {}, если сравнение не нужно"""
+    if args.no_baseline or args.save_baseline:
+        return {}
+    if not os.path.exists(args.baseline):
+        print(f"Базовый прогон {args.baseline} не найден, сравнения нет")
+        return {}
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        return json.load(f)['results']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки упаковки, склада и выгрузок")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick')
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    parser.add_argument('--out', help="куда записать результаты JSON")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="JSON базового прогона для сравнения")
+    parser.add_argument('--no-baseline', action='store_true', help="не сравнивать с базовым прогоном")
+    parser.add_argument('--save-baseline', help="сохранить результаты как базовый прогон")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help="допустимое ухудшение, доля (0.2 = 20%%)")
+    parser.add_argument('--noise-floor', type=float, default=NOISE_FLOOR,
+                        help="разница меньше этой, с, - шум (по умолчанию 0.001)")
+    args = parser.parse_args(argv)
+
+    saved = {name: os.environ.get(name) for name in ('HOME', 'USERPROFILE')}
+    with tempfile.TemporaryDirectory(prefix='bench-home-') as home:
+        # Бенчмарк не должен трогать настройки, снимки и журнал этой машины
+        os.environ['HOME'] = os.environ['USERPROFILE'] = home
+        try:
+            if args.save_baseline:
+                # Один прогон может целиком попасть на быструю или медленную фазу машины
+                runs = [run(args.profile, args.repeats) for _ in range(BASELINE_RUNS)]
+                results = {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+            else:
+                results = run(args.profile, args.repeats)
+            baseline = load_baseline(args)
+            for _ in range(RETRIES):
+                _, regressions = compare(results, baseline, args.threshold, args.noise_floor)
+                if not regressions:
+                    break
+                # Одиночный выброс (другой процесс, частота CPU) - не регрессия:
+                # размеры с подозрениями меряются ещё раз целиком, вместе с
+                # эталонной нагрузкой; остаётся прогон с меньшим числом регрессий
+                print("Повторный замер: " + ", ".join(regressions), file=sys.stderr)
+                again = run(args.profile, args.repeats, {key.split('/')[0] for key in regressions})
+                for size in {key.split('/')[0] for key in again}:
+                    old = {k: v for k, v in results.items() if k.startswith(size + '/')}
+                    new = {k: v for k, v in again.items() if k.startswith(size + '/')}
+                    if (len(compare(new, baseline, args.threshold, args.noise_floor)[1])
+                            < len(compare(old, baseline, args.threshold, args.noise_floor)[1])):
+                        results.update(new)
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+    report = {
+        'meta': {'profile': args.profile, 'repeats': args.repeats, 'time': time.time(),
+                 'python': platform.python_version(), 'numpy': np.__version__,
+                 'platform': platform.platform()},
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    for path in filter(None, (args.out, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    lines, regressions = compare(report['results'], baseline, args.threshold, args.noise_floor)
+    print("\n".join(lines))
+    if regressions:
+        print(f"Регрессии больше {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    if not args.out and not args.save_baseline:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Имитация Google Sheets API (values.get/update/batchUpdate/append/clear)
+в памяти с задержкой каждого запроса - для бенчмарков без сети и квоты."""
+import re
+import time
+
+HEADER = ['Артикул', 'Количество', 'Ячейка']
+
+
+def _parse_range(range_name):
+    """'Лист!B5:C7' -> (первая колонка, первая строка, последняя колонка, последняя строка или None), с нуля"""
+    cells = range_name.split('!')[1]
+    m = re.match(r'([A-Z])(\d*)(?::([A-Z])(\d*))?$', cells)
+    first_col = ord(m.group(1)) - ord('A')
+    last_col = ord(m.group(3)) - ord('A') if m.group(3) else first_col
+    first_row = int(m.group(2) or 1) - 1
+    last_row = int(m.group(4)) - 1 if m.group(4) else None
+    return first_col, first_row, last_col, last_row
+
+
+class _Request:
+    def __init__(self, service, action):
+        self.service = service
+        self.action = action
+
+    def execute(self):
+        self.service.requests += 1
+        time.sleep(self.service.latency)
+        return self.action()
+
+
+class _Values:
+    def __init__(self, service):
+        self.service = service
+
+    def _write(self, range_name, values):
+        grid = self.service.grid
+        first_col, first_row, _, _ = _parse_range(range_name)
+        for offset, row in enumerate(values):
+            while len(grid) <= first_row + offset:
+                grid.append(['', '', ''])
+            for col, value in enumerate(row):
+                grid[first_row + offset][first_col + col] = value
+
+    def get(self, spreadsheetId, range):
+        def action():
+            first_col, first_row, last_col, last_row = _parse_range(range)
+            stop = None if last_row is None else last_row + 1
+            rows = [[str(v) for v in row[first_col:last_col + 1]]
+                    for row in self.service.grid[first_row:stop]]
+            while rows and not any(rows[-1]):
+                rows.pop()
+            return {'values': rows}
+        return _Request(self.service, action)
+
+    def update(self, spreadsheetId, range, valueInputOption, body):
+        return _Request(self.service, lambda: self._write(range, body['values']) or {})
+
+    def batchUpdate(self, spreadsheetId, body):
+        def action():
+            for item in body['data']:
+                self._write(item['range'], item['values'])
+            return {}
+        return _Request(self.service, action)
+
+    def append(self, spreadsheetId, range, valueInputOption, body, insertDataOption=None):
+        def action():
+            grid = self.service.grid
+            used = len(grid)
+            while used and not any(grid[used - 1]):
+                used -= 1
+            sheet = range.split('!')[0]
+            self._write(f'{sheet}!A{used + 1}:C', body['values'])
+            last = used + len(body['values'])
+            return {'updates': {'updatedRange': f'{sheet}!A{used + 1}:C{last}'}}
+        return _Request(self.service, action)
+
+    def clear(self, spreadsheetId, range):
+        def action():
+            self.service.grid = []
+            return {}
+        return _Request(self.service, action)
+
+
+class _Spreadsheets:
+    def __init__(self, service):
+        self.service = service
+
+    def values(self):
+        return _Values(self.service)
+
+    def get(self, spreadsheetId):
+        return _Request(self.service, lambda: {'sheets': [{'properties': {'title': 'Склад'}}]})
+
+    def batchUpdate(self, spreadsheetId, body):
+        return _Request(self.service, lambda: {})
+
+
+class FakeSheetsService:
+    """Подставляется в WarehouseStorage.service вместо googleapiclient"""
+
+    def __init__(self, rows=(), latency=0.0):
+        self.grid = [list(HEADER)] + [list(row) for row in rows]
+        self.latency = latency
+        self.requests = 0
+
+    def spreadsheets(self):
+        return _Spreadsheets(self)
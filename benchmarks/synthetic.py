@@ -0,0 +1,86 @@
+"""Синтетические данные для бенчмарков: лист заказа, GTIN-таблица, остатки
+склада, шаблоны WB/Ozon и упакованная сессия. Всё воспроизводимо по seed."""
+import os
+import random
+
+import numpy as np
+
+import shipment_writer
+from gtin_index import GtinCatalog
+from packing_session import PackingSession, SESSION_FORMAT
+
+ZONES = 'ABCD'
+
+
+def order_sheet(articles, seed=1):
+    """(артикулы по возрастанию, количества 1..20)"""
+    rng = random.Random(seed)
+    names = [f"ART-{i:06d}" for i in range(articles)]
+    return names, [rng.randint(1, 20) for _ in names]
+
+
+def gtin_map(articles):
+    """{gtin: артикул}, по одному GTIN-13 на артикул"""
+    return {f"46{i:011d}": art for i, art in enumerate(articles)}
+
+
+def gtin_catalog(articles, directory):
+    """GtinCatalog из gtin_map в файле внутри directory"""
+    catalog = GtinCatalog(os.path.join(directory, f"gtin-{len(articles)}.idx"))
+    catalog.replace(gtin_map(articles).items())
+    return catalog
+
+
+def inventory_rows(articles, seed=1):
+    """Строки листа склада: (артикул, количество, ячейка)"""
+    rng = random.Random(seed)
+    return [(art, rng.randint(0, 200),
+             f"{rng.choice(ZONES)}-{rng.randint(1, 30):02d}-{rng.randint(1, 40):02d}")
+            for art in articles]
+
+
+def wb_template(boxes):
+    import pandas as pd
+    return pd.DataFrame({'ШК короба': [f"WB_{b:08d}" for b in range(boxes)],
+                         'Срок годности': '2027-01-01'}, dtype=str)
+
+
+def ozon_template(boxes):
+    import pandas as pd
+    return pd.DataFrame({
+        'Зона размещения': 'Основная',
+        'ШК ГМ': [f"OZ_{b:08d}" for b in range(boxes)],
+        'Тип ГМ (не обязательно)': 'Короб',
+        shipment_writer.OZON_SHELF_COLUMN: '2027-01-01',
+    }, index=range(boxes), dtype=str)
+
+
+def empty_session(articles, quantities, boxes, catalog):
+    """Загруженный лист и boxes пустых коробок; catalog - GtinCatalog (см. gtin_catalog)"""
+    session = PackingSession()
+    session.set_gtin_map(catalog)
+    session.load_sheet(articles, quantities)
+    for b in range(boxes):
+        session.add_box(f"BOX-{b:03d}")
+    return session
+
+
+def packed_session(articles, quantities, boxes, catalog, seed=1):
+    """Сессия, где всё количество листа разложено по boxes коробкам.
+
+    Каждый артикул попадает в одну-две случайные коробки, как при обычной
+    упаковке большого заказа.
+    """
+    rng = np.random.default_rng(seed)
+    first = rng.integers(0, boxes, len(articles)).tolist()
+    second = rng.integers(0, boxes, len(articles)).tolist()
+    items = [{} for _ in range(boxes)]
+    for art, qty, a, b in zip(articles, quantities, first, second):
+        items[a][art] = items[a].get(art, 0) + qty - qty // 2
+        if qty // 2:
+            items[b][art] = items[b].get(art, 0) + qty // 2
+    session = PackingSession()
+    session.set_gtin_map(catalog)
+    session.restore({'format': SESSION_FORMAT, 'articles': articles, 'quantities': quantities,
+                     'boxes': [{'name': f"BOX-{b:03d}", 'items': items[b]} for b in range(boxes)]})
+    return session
@@ -0,0 +1,138 @@
+"""План коробок для большого заказа.
+
+По тому, что ещё не разложено по листу, и каталогу объёма/веса единицы
+товара заранее рассчитывается, сколько коробок нужно и что положить в
+каждую, с ограничением объёма и веса коробки.
+
+Эвристика - next-fit decreasing: единицы упорядочены по убыванию объёма
+(одинаковые единицы артикула идут подряд), коробка заполняется подряд, пока
+не упрётся в объём или вес, затем открывается следующая. Граница коробки
+ищется двоичным поиском (np.searchsorted) по накопленным суммам объёма и
+веса по артикулам, поэтому число шагов равно числу коробок, а не единиц.
+
+Модуль не зависит от tkinter.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+# Короб 60x40x40 см
+BOX_VOLUME = 96.0   # л
+BOX_WEIGHT = 25.0   # кг
+# Для артикулов, которых нет в каталоге
+DEFAULT_UNIT_VOLUME = 1.0
+DEFAULT_UNIT_WEIGHT = 0.5
+# Запас на погрешность сумм с плавающей точкой
+EPSILON = 1e-9
+
+# Раскладка в длинном формате: строка k - quantity[k] единиц артикула с id
+# article[k] в коробке box[k] (номера коробок 0..boxes-1 по возрастанию);
+# volumes/weights - загрузка коробок; missing - артикулы без размеров в
+# каталоге (взяты значения по умолчанию); oversize - артикулы, единица
+# которых больше коробки (по одной в коробку)
+BoxPlan = namedtuple('BoxPlan', 'box article quantity boxes volumes weights missing oversize')
+
+
+def unit_sizes(articles, catalog):
+    """catalog: {article: (объём л, вес кг)} -> (объёмы, веса, артикулы без размеров)"""
+    volumes = np.full(len(articles), DEFAULT_UNIT_VOLUME)
+    weights = np.full(len(articles), DEFAULT_UNIT_WEIGHT)
+    missing = []
+    for i, art in enumerate(articles):
+        sizes = catalog.get(art)
+        if sizes is None:
+            missing.append(art)
+        else:
+            volumes[i], weights[i] = sizes
+    return volumes, weights, missing
+
+
+def _fit_end(start_units, limit, base, unit_base, unit_size, counts, total):
+    """Первая единица, на которой накопленная сумма превысит limit"""
+    j = np.searchsorted(base, limit + EPSILON, side='right') - 1
+    if j >= len(counts):
+        return total
+    size = unit_size[j]
+    fit = counts[j] if size <= 0 else min(counts[j], int((limit + EPSILON - base[j]) // size))
+    return max(start_units + 1, unit_base[j] + fit)
+
+
+def plan_boxes(articles, counts, catalog=None, box_volume=BOX_VOLUME, box_weight=BOX_WEIGHT):
+    """План раскладки counts единиц (по id артикулов листа) по коробкам"""
+    counts = np.maximum(np.asarray(counts, dtype=np.int64), 0)
+    volumes, weights, missing = unit_sizes(articles, catalog or {})
+    n = len(counts)
+
+    too_big = (volumes > box_volume + EPSILON) | (weights > box_weight + EPSILON)
+    oversize = [articles[i] for i in np.flatnonzero(too_big & (counts > 0))]
+
+    # Порядок: по убыванию объёма, при равном объёме - по убыванию веса
+    ids = np.flatnonzero((counts > 0) & ~too_big)
+    ids = ids[np.lexsort((-weights[ids], -volumes[ids]))]
+    cnt, vol, wt = counts[ids], volumes[ids], weights[ids]
+    unit_base = np.concatenate([[0], np.cumsum(cnt)])
+    vol_base = np.concatenate([[0.0], np.cumsum(cnt * vol)])
+    wt_base = np.concatenate([[0.0], np.cumsum(cnt * wt)])
+    total = int(unit_base[-1])
+
+    def cumulative(units, base, size):
+        """Накопленная сумма до единицы units (не включая её)"""
+        j = min(np.searchsorted(unit_base, units, side='right') - 1, len(cnt) - 1)
+        return base[j] + (units - unit_base[j]) * size[j]
+
+    bounds, start = [], 0
+    while start < total:
+        end = min(_fit_end(start, cumulative(start, vol_base, vol) + box_volume,
+                           vol_base, unit_base, vol, cnt, total),
+                  _fit_end(start, cumulative(start, wt_base, wt) + box_weight,
+                           wt_base, unit_base, wt, cnt, total),
+                  total)
+        bounds.append((start, end))
+        start = end
+
+    starts = np.array([b[0] for b in bounds], dtype=np.int64)
+    ends = np.array([b[1] for b in bounds], dtype=np.int64)
+    # Позиции (в порядке ids) артикулов, чьи единицы попали в [start, end) коробки
+    first = np.searchsorted(unit_base, starts, side='right') - 1
+    lengths = np.searchsorted(unit_base, ends, side='left') - first
+    box = np.repeat(np.arange(len(bounds)), lengths)
+    offsets = np.cumsum(lengths) - lengths   # начало коробки в длинном формате
+    pos = np.repeat(first - offsets, lengths) + np.arange(len(box))
+    quantity = (np.minimum(unit_base[pos + 1], ends[box]) -
+                np.maximum(unit_base[pos], starts[box]))
+    article = ids[pos]
+
+    # Единицы больше коробки - каждая в отдельную коробку
+    big = np.flatnonzero(too_big & (counts > 0))
+    big_article = np.repeat(big, counts[big])
+    box = np.concatenate([box, len(bounds) + np.arange(len(big_article))])
+    article = np.concatenate([article, big_article])
+    quantity = np.concatenate([quantity, np.ones(len(big_article), dtype=np.int64)])
+    boxes = len(bounds) + len(big_article)
+
+    return BoxPlan(box, article, quantity, boxes,
+                   np.bincount(box, quantity * volumes[article], minlength=boxes),
+                   np.bincount(box, quantity * weights[article], minlength=boxes),
+                   missing, oversize)
+
+
+def box_contents(plan):
+    """По коробкам плана: пары (id артикулов, количества)"""
+    cuts = np.searchsorted(plan.box, np.arange(1, plan.boxes))
+    return list(zip(np.split(plan.article, cuts), np.split(plan.quantity, cuts)))
+
+
+def summary_text(plan, box_volume=BOX_VOLUME, box_weight=BOX_WEIGHT):
+    """Описание плана для подтверждения в окне"""
+    boxes = plan.boxes
+    lines = [f"Коробок: {boxes}, единиц: {int(plan.quantity.sum())}"]
+    if boxes:
+        lines.append(f"Средняя загрузка: объём {plan.volumes.mean() / box_volume:.0%}, "
+                     f"вес {plan.weights.mean() / box_weight:.0%}")
+    if plan.missing:
+        lines.append(f"Нет в каталоге: {len(plan.missing)} артикулов "
+                     f"(взято {DEFAULT_UNIT_VOLUME:g} л и {DEFAULT_UNIT_WEIGHT:g} кг на единицу)")
+    if plan.oversize:
+        lines.append(f"Больше коробки, по одной единице в коробку: {', '.join(plan.oversize[:5])}"
+                     + (" ..." if len(plan.oversize) > 5 else ""))
+    return "\n".join(lines)
@@ -0,0 +1,184 @@
+"""Потоковое чтение листов заказа, GTIN-таблиц и каталога размеров из Excel.
+
+Книга открывается в режиме read-only, строки читаются по одной и только в
+нужных колонках, сразу проверяются и превращаются во внутренние структуры -
+без промежуточного DataFrame на весь файл. Если установлен python-calamine,
+разбор идёт через него (в разы быстрее openpyxl и читает .xls).
+"""
+import importlib.util
+import os
+
+import metrics
+
+# Сами библиотеки импортируются при первом чтении файла, а не при старте окна
+CALAMINE_AVAILABLE = importlib.util.find_spec('python_calamine') is not None
+
+# Как часто сообщать о прогрессе, строк
+PROGRESS_EVERY = 2000
+# Меняется при любом изменении результата разбора (ключ кэша parse_cache)
+PARSER_VERSION = 1
+
+
+def _text(value):
+    """Значение ячейки -> строка; целые числа без '.0'"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def engine(path):
+    """Чем будет разобран файл: 'calamine', 'pandas' (.xls) или 'openpyxl'"""
+    if CALAMINE_AVAILABLE:
+        return 'calamine'
+    if os.path.splitext(path)[1].lower() == '.xls':
+        return 'pandas'
+    return 'openpyxl'
+
+
+def _pick(row, indices):
+    return tuple(row[i] if i < len(row) else None for i in indices)
+
+
+def iter_columns(path, pick_columns, progress=None):
+    """Строки книги, урезанные до нужных колонок.
+
+    pick_columns(header) -> список индексов колонок по строке заголовка.
+    progress(done, total) вызывается каждые PROGRESS_EVERY строк.
+    Возвращает пары (номер строки в книге, кортеж значений).
+    """
+    kind = engine(path)
+    # Книга закрывается на любом выходе: ошибка pick_columns, брошенный генератор
+    close = lambda: None
+    try:
+        if kind == 'calamine':
+            from python_calamine import CalamineWorkbook
+            workbook = CalamineWorkbook.from_path(path)
+            close = workbook.close
+            sheet = workbook.get_sheet_by_index(0)
+            rows = iter(sheet.iter_rows())
+            header = next(rows, ())
+            indices = pick_columns([_text(c).lower() for c in header])
+            total = sheet.height
+            # Пустые ячейки calamine отдаёт как ''
+            rows = (tuple(v if v != '' else None for v in _pick(row, indices)) for row in rows)
+        elif kind == 'pandas':
+            # Старый формат openpyxl не читает - читаем через pandas целиком
+            import pandas as pd
+            df = pd.read_excel(path, header=None, dtype=object)
+            df = df.astype(object).where(df.notna(), None)
+            rows = df.itertuples(index=False, name=None)
+            header = next(rows, ())
+            indices = pick_columns([_text(c).lower() for c in header])
+            total = len(df)
+            rows = (_pick(row, indices) for row in rows)
+        else:
+            from openpyxl import load_workbook
+            wb = load_workbook(path, read_only=True, data_only=True)
+            close = wb.close
+            ws = wb.active
+            header = next(ws.iter_rows(max_row=1, values_only=True), ())
+            indices = pick_columns([_text(c).lower() for c in header])
+            # Ячейки правее нужных колонок не разбираются
+            first, last = min(indices), max(indices)
+            shifted = [i - first for i in indices]
+            total = ws.max_row
+            rows = (_pick(row, shifted) for row in
+                    ws.iter_rows(min_row=2, min_col=first + 1, max_col=last + 1, values_only=True))
+
+        for done, values in enumerate(rows, start=2):
+            if progress and done % PROGRESS_EVERY == 0:
+                progress(done, total)
+            yield done, values
+        if progress:
+            progress(total or 0, total)
+    finally:
+        close()
+
+
+@metrics.timed('sheet_parse')
+def read_order_sheet(path, progress=None):
+    """Лист заказа -> (артикулы, количества), отсортированные по артикулу.
+
+    Колонки ищутся по заголовкам "Артикул"/"Количество", иначе берутся первые две.
+    Повторы артикула суммируются.
+    """
+    def pick(header):
+        if 'артикул' in header and 'количество' in header:
+            return [header.index('артикул'), header.index('количество')]
+        return [0, 1]
+
+    totals = {}
+    for row_number, (article, quantity) in iter_columns(path, pick, progress):
+        article = _text(article)
+        if not article and quantity is None:
+            continue  # пустая строка
+        if not article:
+            raise ValueError(f"Строка {row_number}: не указан артикул")
+        try:
+            quantity = int(float(quantity))
+        except (TypeError, ValueError):
+            raise ValueError(f"Строка {row_number}: неверное количество {quantity!r} для {article}")
+        totals[article] = totals.get(article, 0) + quantity
+
+    articles = sorted(totals)
+    return articles, [totals[art] for art in articles]
+
+
+def iter_gtin_pairs(path, progress=None):
+    """GTIN-таблица -> пары (gtin, article) из первых двух колонок"""
+    for row_number, (gtin, article) in iter_columns(path, lambda header: [0, 1], progress):
+        gtin = _text(gtin)
+        if gtin:
+            yield gtin, _text(article)
+
+
+@metrics.timed('gtin_parse')
+def read_gtin_columns(path, progress=None):
+    """GTIN-таблица -> (список gtin, список артикулов); так результат компактнее в кэше"""
+    gtins, articles = [], []
+    for gtin, article in iter_gtin_pairs(path, progress):
+        gtins.append(gtin)
+        articles.append(article)
+    return gtins, articles
+
+
+def read_box_catalog(path, progress=None):
+    """Каталог размеров -> (артикулы, объём единицы в л, вес единицы в кг).
+
+    Колонки по заголовкам: "Артикул", "Вес" (кг) и либо "Объём" (л), либо
+    "Длина", "Ширина", "Высота" (см).
+    """
+    def pick(header):
+        def find(*names):
+            return next((header.index(name) for name in names if name in header), None)
+        article, weight = find('артикул'), find('вес', 'вес, кг')
+        volume = find('объём', 'объем', 'объём, л', 'объем, л')
+        sides = [find(name, f'{name}, см') for name in ('длина', 'ширина', 'высота')]
+        if article is None or weight is None:
+            raise ValueError("В каталоге нужны колонки \"Артикул\" и \"Вес\"")
+        if volume is not None:
+            return [article, weight, volume]
+        if None in sides:
+            raise ValueError("В каталоге нужна колонка \"Объём\" или \"Длина\", \"Ширина\", \"Высота\"")
+        return [article, weight, *sides]
+
+    articles, volumes, weights = [], [], []
+    for row_number, values in iter_columns(path, pick, progress):
+        article = _text(values[0])
+        if not article:
+            continue
+        try:
+            numbers = [float(v) for v in values[1:]]
+        except (TypeError, ValueError):
+            raise ValueError(f"Строка {row_number}: неверные размеры или вес для {article}")
+        weight, sizes = numbers[0], numbers[1:]
+        # см^3 -> л
+        volume = sizes[0] if len(sizes) == 1 else sizes[0] * sizes[1] * sizes[2] / 1000
+        if volume < 0 or weight < 0:
+            raise ValueError(f"Строка {row_number}: отрицательные размеры или вес для {article}")
+        articles.append(article)
+        volumes.append(volume)
+        weights.append(weight)
+    return articles, volumes, weights
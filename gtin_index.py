@@ -0,0 +1,369 @@
+"""Двусторонний индекс GTIN <-> артикул.
+
+Основа - бинарный файл, открываемый через mmap (little-endian):
+    заголовок   HEADER: magic, версия, число ключей, число артикулов,
+                длина таблицы строк, длина JSON-блока, размер хеш-таблицы
+    keys        uint64[n_keys]; ключ = (длина GTIN << 56) | число.
+                Сгруппированы по артикулу, первый в группе - предпочтительный
+    key_article uint32[n_keys], id артикула для каждого ключа
+    art_start   uint64[n_articles + 1], границы групп артикулов в keys
+    offsets     uint64[n_articles + 1], границы артикулов в таблице строк
+    slots       uint32[table_size], хеш-таблица с линейным пробированием:
+                0 - пусто, иначе номер ключа + 1
+    strings     артикулы в UTF-8 подряд
+    extra       JSON: {"codes": {код: id артикула}} для нецифровых кодов и
+                {"preferred": {артикул: код}} для явно выбранных кодов
+
+Файл не читается целиком: GTIN ищется по хеш-таблице прямо в отображённой
+памяти. Добавления поверх файла (GtinCatalog.upsert) держатся в памяти и в
+журнале рядом с индексом, а в файл сливаются при сжатии.
+"""
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'WPGI'
+VERSION = 2
+HEADER = struct.Struct('<4sIQQQQQ')
+# Длина GTIN хранится в старших битах ключа, чтобы "0123" и "123" не совпадали
+LENGTH_SHIFT = 56
+MAX_DIGITS = 16
+HASH_MUL = 0x9E3779B97F4A7C15
+MASK64 = (1 << 64) - 1
+# Журнал сливается в файл, когда добавлений больше этой доли от основы
+COMPACT_RATIO = 0.25
+COMPACT_MIN = 10000
+
+
+def pack_gtin(gtin):
+    """GTIN -> целочисленный ключ или None, если код не цифровой"""
+    # isdigit() пропускает и не-ASCII цифры ("²", "٣"), int() их не разберёт как надо
+    if gtin.isascii() and gtin.isdigit() and len(gtin) <= MAX_DIGITS:
+        return (len(gtin) << LENGTH_SHIFT) | int(gtin)
+    return None
+
+
+def unpack_gtin(key):
+    return str(key & ((1 << LENGTH_SHIFT) - 1)).zfill(key >> LENGTH_SHIFT)
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def _table_bits(n_keys):
+    # Заполненность не больше половины
+    return max(3, (2 * n_keys - 1).bit_length())
+
+
+def _build_slots(keys):
+    """Хеш-таблица с линейным пробированием, собранная векторно: за раунд
+    каждая свободная ячейка достаётся одному претенденту, остальные сдвигаются"""
+    bits = _table_bits(len(keys))
+    size = 1 << bits
+    slots = np.zeros(size, dtype=np.uint32)
+    pos = ((keys * np.uint64(HASH_MUL)) >> np.uint64(64 - bits)).astype(np.int64)
+    pending = np.arange(len(keys))
+    while len(pending):
+        p = pos[pending]
+        free = np.flatnonzero(slots[p] == 0)
+        claimed, first = np.unique(p[free], return_index=True)
+        slots[claimed] = pending[free[first]] + 1
+        placed = np.zeros(len(pending), dtype=bool)
+        placed[free[first]] = True
+        pending = pending[~placed]
+        pos[pending] = (pos[pending] + 1) & (size - 1)
+    return slots
+
+
+def write_index(pairs, path, preferred=None):
+    """Записать индекс из пар (gtin, article).
+
+    При повторе GTIN побеждает последняя пара; предпочтительный GTIN артикула -
+    первый встреченный, если не задан явно в preferred {article: gtin}.
+    """
+    article_ids = {}
+    keys, key_articles, codes = [], [], {}
+    for gtin, article in pairs:
+        gtin, article = str(gtin).strip(), str(article).strip()
+        if not gtin:
+            continue
+        art_id = article_ids.setdefault(article, len(article_ids))
+        key = pack_gtin(gtin)
+        if key is None:
+            codes[gtin] = art_id
+        else:
+            keys.append(key)
+            key_articles.append(art_id)
+
+    keys = np.array(keys, dtype=np.uint64)
+    key_articles = np.array(key_articles, dtype=np.uint32)
+    seq = np.arange(len(keys))
+    # Последнее вхождение каждого ключа
+    order = np.argsort(keys, kind='stable')
+    last = np.ones(len(keys), dtype=bool)
+    last[:-1] = keys[order][1:] != keys[order][:-1]
+    keep = order[last]
+    # Группировка по артикулу в порядке появления
+    keep = keep[np.lexsort((seq[keep], key_articles[keep]))]
+    keys, key_articles = keys[keep], key_articles[keep]
+
+    n_articles = len(article_ids)
+    art_start = np.zeros(n_articles + 1, dtype=np.uint64)
+    art_start[1:] = np.cumsum(np.bincount(key_articles, minlength=n_articles))
+    encoded = [article.encode('utf-8') for article in article_ids]
+    offsets = np.zeros(n_articles + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    strings = b''.join(encoded)
+    slots = _build_slots(keys)
+    extra_blob = json.dumps({'codes': codes, 'preferred': preferred or {}},
+                            ensure_ascii=False).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(keys), n_articles, len(strings),
+                            len(extra_blob), len(slots)))
+        f.write(keys.tobytes())
+        f.write(key_articles.tobytes())
+        f.write(b'\0' * (_align(f.tell()) - f.tell()))
+        f.write(art_start.tobytes())
+        f.write(offsets.tobytes())
+        f.write(slots.tobytes())
+        f.write(strings)
+        f.write(extra_blob)
+
+
+class GtinIndex:
+    """Только для чтения: индекс из файла, отображённого в память"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, n_keys, n_articles, str_len,
+         extra_len, table_size) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            self._file.close()
+            raise ValueError(f"Неподдерживаемый формат GTIN-индекса: {path}")
+
+        view = memoryview(self._mm)
+        pos = HEADER.size
+        self.keys = view[pos:pos + 8 * n_keys].cast('Q')
+        pos += 8 * n_keys
+        self.key_articles = view[pos:pos + 4 * n_keys].cast('I')
+        pos = _align(pos + 4 * n_keys)
+        self.art_start = view[pos:pos + 8 * (n_articles + 1)].cast('Q')
+        pos += 8 * (n_articles + 1)
+        self.offsets = view[pos:pos + 8 * (n_articles + 1)].cast('Q')
+        pos += 8 * (n_articles + 1)
+        self.slots = view[pos:pos + 4 * table_size].cast('I')
+        pos += 4 * table_size
+        self._strings_pos = pos
+        pos += str_len
+        extra = json.loads(bytes(view[pos:pos + extra_len]).decode('utf-8'))
+        view.release()
+        self.codes = extra['codes']
+        self.preferred = extra['preferred']
+        self._mask = table_size - 1
+        self._shift = 64 - (table_size.bit_length() - 1)
+        self.n_articles = n_articles
+        self._article_ids = None
+        self._code_groups = None
+
+    def close(self):
+        # Представления памяти нужно отпустить до закрытия mmap
+        for view in (self.keys, self.key_articles, self.art_start, self.offsets, self.slots):
+            view.release()
+        self._mm.close()
+        self._file.close()
+
+    def __len__(self):
+        return len(self.keys) + len(self.codes)
+
+    def article(self, art_id):
+        pos = self._strings_pos
+        return self._mm[pos + self.offsets[art_id]:pos + self.offsets[art_id + 1]].decode('utf-8')
+
+    def _find(self, key):
+        """Номер ключа в keys или -1"""
+        slot = ((key * HASH_MUL) & MASK64) >> self._shift
+        while True:
+            index = self.slots[slot]
+            if not index:
+                return -1
+            if self.keys[index - 1] == key:
+                return index - 1
+            slot = (slot + 1) & self._mask
+
+    def get(self, gtin, default=None):
+        """Артикул по GTIN"""
+        key = pack_gtin(gtin)
+        if key is None:
+            art_id = self.codes.get(gtin)
+        else:
+            index = self._find(key)
+            art_id = self.key_articles[index] if index >= 0 else None
+        return default if art_id is None else self.article(art_id)
+
+    def article_id(self, article):
+        # Словарь артикулов строится при первом обратном запросе
+        if self._article_ids is None:
+            self._article_ids = {self.article(i): i for i in range(self.n_articles)}
+        return self._article_ids.get(article)
+
+    def gtins(self, article):
+        """Все GTIN артикула, предпочтительный первым"""
+        art_id = self.article_id(article)
+        if art_id is None:
+            return []
+        result = [unpack_gtin(self.keys[i])
+                  for i in range(self.art_start[art_id], self.art_start[art_id + 1])]
+        if self._code_groups is None:
+            self._code_groups = {}
+            for code, code_art in self.codes.items():
+                self._code_groups.setdefault(code_art, []).append(code)
+        result += self._code_groups.get(art_id, [])
+        explicit = self.preferred.get(article)
+        if explicit in result:
+            result.remove(explicit)
+            result.insert(0, explicit)
+        return result
+
+    def items(self):
+        """Все пары (gtin, article)"""
+        for art_id in range(self.n_articles):
+            article = self.article(art_id)
+            for i in range(self.art_start[art_id], self.art_start[art_id + 1]):
+                yield unpack_gtin(self.keys[i]), article
+        for code, art_id in self.codes.items():
+            yield code, self.article(art_id)
+
+
+class GtinCatalog:
+    """Индекс GTIN <-> артикул с дозагрузкой поверх файла.
+
+    Поиск в обе стороны - по хеш-таблицам (файл и словари добавлений).
+    upsert не пересобирает файл: новые пары пишутся в журнал path + '.log'
+    и применяются при открытии; compact() сливает всё в новый файл.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = path + '.log'
+        self.base = GtinIndex(path) if os.path.exists(path) else None
+        self._fwd = {}        # gtin -> article, добавленные после сборки файла
+        self._rev = {}        # article -> [gtin] из добавлений
+        self._preferred = {}  # article -> явно выбранный gtin
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._apply(json.loads(line))
+
+    def close(self):
+        if self.base is not None:
+            self.base.close()
+            self.base = None
+
+    def __len__(self):
+        # Приблизительно: переопределённые GTIN считаются дважды
+        return (len(self.base) if self.base is not None else 0) + len(self._fwd)
+
+    def get(self, gtin, default=None):
+        """Артикул по GTIN"""
+        gtin = str(gtin).strip()
+        article = self._fwd.get(gtin)
+        if article is None and self.base is not None:
+            article = self.base.get(gtin)
+        return default if article is None else article
+
+    def gtins(self, article):
+        """Все GTIN артикула, предпочтительный первым"""
+        found = self.base.gtins(article) if self.base is not None else []
+        found += self._rev.get(article, [])
+        # Отбрасываем GTIN, которые позже переназначены другому артикулу
+        result = []
+        for gtin in found:
+            if gtin not in result and self.get(gtin) == article:
+                result.append(gtin)
+        explicit = self._preferred.get(article)
+        if explicit in result:
+            result.remove(explicit)
+            result.insert(0, explicit)
+        return result
+
+    def preferred_gtin(self, article):
+        found = self.gtins(article)
+        return found[0] if found else None
+
+    def items(self):
+        """Все действующие пары (gtin, article)"""
+        if self.base is not None:
+            for gtin, article in self.base.items():
+                if gtin not in self._fwd:
+                    yield gtin, article
+        yield from self._fwd.items()
+
+    def upsert(self, pairs):
+        """Добавить или переназначить пары (gtin, article) без пересборки файла"""
+        batch = []
+        for gtin, article in pairs:
+            gtin, article = str(gtin).strip(), str(article).strip()
+            if gtin:
+                batch.append([gtin, article])
+        self._write_journal({'upsert': batch})
+        base_size = len(self.base) if self.base is not None else 0
+        if len(self._fwd) > max(COMPACT_MIN, base_size * COMPACT_RATIO):
+            self.compact()
+        return len(batch)
+
+    def set_preferred(self, article, gtin):
+        self._write_journal({'preferred': [article, gtin]})
+
+    def replace(self, pairs):
+        """Заменить всё содержимое новыми парами"""
+        self._rebuild(pairs, {})
+
+    def compact(self):
+        """Слить журнал добавлений в новый файл индекса"""
+        self._rebuild(self._grouped_items(), self._explicit_preferred())
+
+    def _grouped_items(self):
+        # Группы по артикулу в порядке gtins(), чтобы предпочтительный остался первым
+        articles = {}
+        for gtin, article in self.items():
+            articles.setdefault(article, None)
+        for article in articles:
+            for gtin in self.gtins(article):
+                yield gtin, article
+
+    def _explicit_preferred(self):
+        preferred = dict(self.base.preferred) if self.base is not None else {}
+        preferred.update(self._preferred)
+        return preferred
+
+    def _rebuild(self, pairs, preferred):
+        tmp_path = self.path + '.tmp'
+        write_index(pairs, tmp_path, preferred)
+        # Windows не даёт заменить файл, пока он отображён в память
+        self.close()
+        os.replace(tmp_path, self.path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.base = GtinIndex(self.path)
+        self._fwd, self._rev, self._preferred = {}, {}, {}
+
+    def _write_journal(self, record):
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._apply(record)
+
+    def _apply(self, record):
+        for gtin, article in record.get('upsert', ()):
+            self._fwd[gtin] = article
+            self._rev.setdefault(article, []).append(gtin)
+        if 'preferred' in record:
+            article, gtin = record['preferred']
+            self._preferred[article] = gtin
@@ -0,0 +1,302 @@
+"""Хранилища остатков склада: Google Sheets и локальная база SQLite.
+
+WarehouseStorage держит остатки в памяти и работает с хранилищем через
+общий интерфейс InventoryBackend:
+
+    load()                         -> {article: (количество, ячейка)}
+    get(article)                   -> (количество, ячейка) или None
+    apply_delta(article, delta, cell="") -> новое (количество, ячейка)
+    bulk_apply(records)            записать пачку итоговых значений
+                                   {article: (количество, ячейка) или None - удалить}
+    snapshot()                     -> {article: (количество, ячейка)} на момент вызова
+    compact(records)               переписать хранилище ровно этими значениями
+
+SheetsBackend - прежняя работа с листом Google Sheets, каждая операция идёт
+по сети и расходует квоту API. SqliteBackend хранит остатки в локальном
+файле (режим WAL, индекс по артикулу, пачка - одна транзакция) и работает
+без сети.
+"""
+import abc
+import os
+import re
+import sqlite3
+import threading
+
+from storage_reconcile import parse_storage_rows
+
+SQLITE_FILE = os.path.expanduser('~/.warehouse_storage.db')
+
+
+class InventoryBackend(abc.ABC):
+    """Интерфейс хранилища остатков; количество не бывает меньше нуля"""
+
+    @abc.abstractmethod
+    def load(self):
+        ...
+
+    @abc.abstractmethod
+    def get(self, article):
+        ...
+
+    @abc.abstractmethod
+    def apply_delta(self, article, delta, cell=""):
+        ...
+
+    @abc.abstractmethod
+    def bulk_apply(self, records):
+        ...
+
+    @abc.abstractmethod
+    def snapshot(self):
+        ...
+
+    @abc.abstractmethod
+    def compact(self, records):
+        ...
+
+    def close(self):
+        pass
+
+
+class SheetsBackend(InventoryBackend):
+    """Лист Google Sheets подключённого WarehouseStorage.
+
+    Номера строк (storage.row_index) и последнее известное содержимое листа
+    (storage.remote) хранятся в самом WarehouseStorage - по ним же работает
+    фоновая сверка.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def _check(self):
+        storage = self.storage
+        if not storage.service or not storage.spreadsheet_id:
+            raise RuntimeError("нет подключения к Google Sheets")
+
+    def load(self):
+        self._check()
+        storage = self.storage
+        values = storage.fetch_sheet_values()
+        records, row_index = parse_storage_rows(values)
+        with storage.lock:
+            storage.row_index = row_index
+            storage.remote = dict(records)
+        # Дальше изменения листа подхватывает фоновая сверка
+        storage.reconciler.reset(values)
+        storage.reconciler.start()
+        return records
+
+    def get(self, article):
+        with self.storage.lock:
+            return self.storage.remote.get(article)
+
+    def apply_delta(self, article, delta, cell=""):
+        # Атомарного приращения в Sheets нет: считаем от последнего известного значения
+        quantity, old_cell = self.get(article) or (0, "")
+        record = (max(0, quantity + delta), cell or old_cell)
+        self.bulk_apply({article: record})
+        return record
+
+    def _fetch_row_index(self):
+        """Номера строк артикулов по столбцу A листа"""
+        storage = self.storage
+        result = storage.service.spreadsheets().values().get(
+            spreadsheetId=storage.spreadsheet_id,
+            range=f'{storage.sheet_name}!A:A'
+        ).execute()
+        rows = {}
+        for row_number, row in enumerate(result.get('values', []), start=1):
+            if row_number > 1 and row and str(row[0]).strip():
+                rows[str(row[0]).strip()] = row_number
+        return rows
+
+    def bulk_apply(self, records):
+        """Существующие строки обновляются одним values.batchUpdate, новые
+        артикулы дописываются в конец листа, строки удалённых очищаются.
+
+        Перед записью столбец A перечитывается: сотрудники могли вставить или
+        удалить строки вручную, и запись по старым номерам попала бы в чужой
+        артикул."""
+        self._check()
+        storage = self.storage
+        sheet = storage.sheet_name
+        values_api = storage.service.spreadsheets().values()
+        row_index = self._fetch_row_index()
+        with storage.lock:
+            storage.row_index = row_index
+            # Сверка, заставшая запись, отбрасывает прочитанный лист
+            storage.write_generation += 1
+            data, new_rows, cleared, written = [], [], [], {}
+            for article, record in records.items():
+                row_number = storage.row_index.get(article)
+                if record is None:
+                    # Удалённый артикул: очищаем его строку, место освободит сжатие
+                    if row_number:
+                        data.append({'range': f'{sheet}!A{row_number}:C{row_number}',
+                                     'values': [['', '', '']]})
+                        cleared.append(article)
+                    continue
+                quantity, cell = int(record[0]), str(record[1])
+                if row_number is None:
+                    new_rows.append([str(article), quantity, cell])
+                    continue
+                written[article] = (quantity, cell)
+                data.append({'range': f'{sheet}!B{row_number}:C{row_number}',
+                             'values': [[quantity, cell]]})
+
+        try:
+            if data:
+                values_api.batchUpdate(
+                    spreadsheetId=storage.spreadsheet_id,
+                    body={'valueInputOption': 'RAW', 'data': data}
+                ).execute()
+                with storage.lock:
+                    storage.remote.update(written)
+                    for article in cleared:
+                        storage.remote.pop(article, None)
+                        storage.row_index.pop(article, None)
+
+            if new_rows:
+                result = values_api.append(
+                    spreadsheetId=storage.spreadsheet_id,
+                    range=f'{sheet}!A:C',
+                    valueInputOption='RAW',
+                    insertDataOption='INSERT_ROWS',
+                    body={'values': new_rows}
+                ).execute()
+                first_row = int(re.search(r'![A-Z]+(\d+)',
+                                          result['updates']['updatedRange']).group(1))
+                with storage.lock:
+                    for offset, row in enumerate(new_rows):
+                        storage.row_index[row[0]] = first_row + offset
+                        storage.remote[row[0]] = (row[1], row[2])
+        finally:
+            with storage.lock:
+                storage.write_generation += 1
+
+    def snapshot(self):
+        self._check()
+        records, _ = parse_storage_rows(self.storage.fetch_sheet_values())
+        return records
+
+    def compact(self, records):
+        """Полная перезапись листа: убирает пустые строки удалённых артикулов"""
+        self._check()
+        storage = self.storage
+        range_name = f'{storage.sheet_name}!A:C'
+        values = [['Артикул', 'Количество', 'Ячейка']]
+        values += [[str(article), int(quantity), str(cell)]
+                   for article, (quantity, cell) in records.items()]
+        with storage.lock:
+            storage.write_generation += 1
+        try:
+            # Очищаем существующие данные и записываем новые
+            storage.service.spreadsheets().values().clear(
+                spreadsheetId=storage.spreadsheet_id,
+                range=range_name
+            ).execute()
+            storage.service.spreadsheets().values().update(
+                spreadsheetId=storage.spreadsheet_id,
+                range=range_name,
+                valueInputOption='RAW',
+                body={'values': values}
+            ).execute()
+            with storage.lock:
+                storage.row_index = {row[0]: row_number for row_number, row
+                                     in enumerate(values[1:], start=2)}
+                storage.remote = {row[0]: (row[1], row[2]) for row in values[1:]}
+        finally:
+            with storage.lock:
+                storage.write_generation += 1
+
+    def close(self):
+        self.storage.reconciler.stop()
+
+
+class SqliteBackend(InventoryBackend):
+    """Остатки в локальном файле SQLite.
+
+    WAL позволяет читать базу, пока идёт запись; synchronous=NORMAL
+    не ждёт диск на каждой транзакции. Поиск по артикулу - по первичному ключу.
+    """
+
+    def __init__(self, path=SQLITE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        # Соединение используется и окном, и потоком синхронизации
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS stock ('
+                        'article TEXT PRIMARY KEY, '
+                        'quantity INTEGER NOT NULL, '
+                        "cell TEXT NOT NULL DEFAULT '')")
+
+    def _transaction(self, statements):
+        """Выполнить (sql, строки) одной транзакцией"""
+        with self._lock:
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                for sql, rows in statements:
+                    self.db.executemany(sql, rows)
+            except Exception:
+                self.db.execute('ROLLBACK')
+                raise
+            self.db.execute('COMMIT')
+
+    def load(self):
+        return self.snapshot()
+
+    def get(self, article):
+        with self._lock:
+            row = self.db.execute('SELECT quantity, cell FROM stock WHERE article = ?',
+                                  (article,)).fetchone()
+        return row
+
+    def apply_delta(self, article, delta, cell=""):
+        with self._lock:
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                self.db.execute(
+                    'INSERT INTO stock (article, quantity, cell) VALUES (?, max(0, ?), ?) '
+                    'ON CONFLICT(article) DO UPDATE SET '
+                    'quantity = max(0, quantity + excluded.quantity), '
+                    "cell = CASE WHEN excluded.cell != '' THEN excluded.cell ELSE cell END",
+                    (article, delta, cell))
+                row = self.db.execute('SELECT quantity, cell FROM stock WHERE article = ?',
+                                      (article,)).fetchone()
+            except Exception:
+                self.db.execute('ROLLBACK')
+                raise
+            self.db.execute('COMMIT')
+        return row
+
+    def bulk_apply(self, records):
+        upserts = [(article, int(record[0]), str(record[1]))
+                   for article, record in records.items() if record is not None]
+        deletes = [(article,) for article, record in records.items() if record is None]
+        self._transaction([
+            ('INSERT INTO stock (article, quantity, cell) VALUES (?, ?, ?) '
+             'ON CONFLICT(article) DO UPDATE SET quantity = excluded.quantity, cell = excluded.cell',
+             upserts),
+            ('DELETE FROM stock WHERE article = ?', deletes),
+        ])
+
+    def snapshot(self):
+        with self._lock:
+            rows = self.db.execute('SELECT article, quantity, cell FROM stock').fetchall()
+        return {article: (quantity, cell) for article, quantity, cell in rows}
+
+    def compact(self, records):
+        self._transaction([
+            ('DELETE FROM stock', [()]),
+            ('INSERT INTO stock (article, quantity, cell) VALUES (?, ?, ?)',
+             [(article, int(quantity), str(cell)) for article, (quantity, cell) in records.items()]),
+        ])
+        with self._lock:
+            self.db.execute('VACUUM')
+
+    def close(self):
+        with self._lock:
+            self.db.close()
@@ -0,0 +1,322 @@
+"""Общий склад для нескольких станций упаковки.
+
+Одна машина в сети держит остатки в памяти (WarehouseStorage, подключённый
+к Google Sheets) и обслуживает станции по TCP: одна строка JSON на запрос,
+ответ и уведомление. Операции выполняются по одной в цикле asyncio под
+блокировкой склада, поэтому резерв двух станций на последнюю единицу не
+проходит дважды. Изменения сразу рассылаются подписанным станциям, а в
+таблицу уходят пачками через очередь StorageSyncQueue хоста. Правки,
+сделанные прямо в таблице, хост получает фоновой сверкой и рассылает так же.
+
+Запрос:      {"id": 1, "op": "reserve", "article": "A-1", "n": 1}
+Ответ:       {"id": 1, "ok": true, "quantity": 4, "cell": "A-01"}
+Уведомление: {"event": "changed", "article": "A-1", "quantity": 4, "cell": "A-01"}
+
+Операции: get, snapshot, subscribe, reserve (списать, только если хватает),
+decrement (списать, не ниже нуля), return (вернуть на склад).
+
+Запуск хоста: python inventory_service.py [--host 0.0.0.0] [--port 8765]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import threading
+
+DEFAULT_PORT = 8765
+# Операции execute (subscribe обслуживает само соединение)
+OPERATIONS = ('get', 'snapshot', 'reserve', 'decrement', 'return')
+# Сколько станция ждёт ответа сервера, секунды
+CALL_TIMEOUT = 5
+
+
+def _encode(message):
+    return (json.dumps(message, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def parse_address(address):
+    """'host:port' или 'host' -> (host, port); ValueError при неверном порте"""
+    host, _, port = address.strip().rpartition(':')
+    if not host:
+        return port, DEFAULT_PORT
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"Неверный порт сервера склада: {port!r}")
+    return host, int(port)
+
+
+class InventoryService:
+    """Атомарные операции над остатками хоста и рассылка изменений"""
+
+    def __init__(self, storage):
+        self.storage = storage     # WarehouseStorage хоста
+        self.listeners = []        # callback(article, quantity, cell) в процессе
+        self._subscribers = set()  # StreamWriter подписанных станций
+        self._loop = None
+        # Правки листа, пришедшие сверкой или перезагрузкой, тоже рассылаются
+        storage.listeners.append(self._on_storage_changed)
+
+    def _state(self, article):
+        record = self.storage.storage_data.get(article)
+        if record is None:
+            return {'quantity': None, 'cell': ""}
+        return {'quantity': record.quantity, 'cell': record.cell}
+
+    def _change(self, article, delta, cell=""):
+        storage = self.storage
+        storage.apply_quantity_change(article, delta, cell)
+        storage.sync.push(article, delta, cell)   # пакетная запись в таблицу
+        return self._state(article)
+
+    def execute(self, request):
+        """Выполнить запрос станции; возвращает ответ без id"""
+        op = request.get('op')
+        if op not in OPERATIONS:
+            return {'ok': False, 'error': f"неизвестная операция {op!r}"}
+        article = request.get('article')
+        if op != 'snapshot' and (not isinstance(article, str) or not article):
+            return {'ok': False, 'error': "не указан артикул"}
+        n = request.get('n', 1)
+        if isinstance(n, bool) or not isinstance(n, int):
+            return {'ok': False, 'error': f"количество должно быть целым числом, получено {n!r}"}
+        cell = request.get('cell', "")
+        if not isinstance(cell, str):
+            return {'ok': False, 'error': "ячейка должна быть строкой"}
+        storage = self.storage
+        with storage.lock:
+            if op == 'get':
+                return dict(self._state(article), ok=True)
+            if op == 'snapshot':
+                items = [[art, record.quantity, record.cell]
+                         for art, record in storage.storage_data.items()]
+                return {'ok': True, 'items': items}
+            if n < 0:
+                return {'ok': False, 'error': "отрицательное количество"}
+            if op == 'reserve':
+                record = storage.storage_data.get(article)
+                if record is not None and record.quantity < n:
+                    return dict(self._state(article), ok=False)
+                state = self._change(article, -n)
+            elif op == 'decrement':
+                state = self._change(article, -n)
+            else:
+                state = self._change(article, n, cell)
+        self._notify(article, state)
+        return dict(state, ok=True)
+
+    def _on_storage_changed(self, articles):
+        """Артикулы хоста, изменённые мимо execute (правка листа вручную)"""
+        with self.storage.lock:
+            states = [(article, self._state(article)) for article in articles]
+        for article, state in states:
+            self._notify(article, state)
+
+    def _notify(self, article, state):
+        for listener in self.listeners:
+            listener(article, state['quantity'], state['cell'])
+        if self._subscribers:
+            # execute может вызываться не из цикла сервера (LocalInventoryClient)
+            line = _encode(dict(state, event='changed', article=article))
+            self._loop.call_soon_threadsafe(self._broadcast, line)
+
+    def _broadcast(self, line):
+        for writer in list(self._subscribers):
+            if writer.is_closing():
+                self._subscribers.discard(writer)
+            else:
+                writer.write(line)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    writer.write(_encode({'ok': False, 'error': "неверный JSON"}))
+                    continue
+                if not isinstance(request, dict):
+                    writer.write(_encode({'ok': False, 'error': "запрос должен быть объектом JSON"}))
+                    continue
+                try:
+                    if request.get('op') == 'subscribe':
+                        self._subscribers.add(writer)
+                        response = {'ok': True}
+                    else:
+                        response = self.execute(request)
+                except Exception as e:
+                    # Ошибка одного запроса не должна рвать соединение станции
+                    response = {'ok': False, 'error': f"ошибка сервера: {e}"}
+                response['id'] = request.get('id')
+                writer.write(_encode(response))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._subscribers.discard(writer)
+            writer.close()
+
+    async def serve(self, host='0.0.0.0', port=DEFAULT_PORT):
+        self._loop = asyncio.get_running_loop()
+        return await asyncio.start_server(self._handle, host, port)
+
+
+class InventoryClient:
+    """Подключение станции к InventoryService.
+
+    Вызовы синхронные (их делает окно), сеть обслуживает собственный цикл
+    asyncio в фоновом потоке. on_change(article, quantity, cell) вызывается
+    из этого потока для каждого уведомления сервера.
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT, on_change=None, timeout=CALL_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.on_change = on_change
+        self.timeout = timeout
+        self.connected = False
+        self._ids = itertools.count(1)
+        self._waiting = {}        # id -> Future ответа
+        self._loop = None
+        self._writer = None
+
+    def connect(self):
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="inventory-client", daemon=True).start()
+        try:
+            self._submit(self._open()).result(self.timeout)
+        except Exception:
+            self.close()
+            raise
+
+    async def _open(self):
+        reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self.connected = True
+        asyncio.get_running_loop().create_task(self._read(reader))
+
+    async def _read(self, reader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                # Одна битая строка не должна останавливать чтение: пропускаем её
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ValueError("ожидался объект JSON")
+                    if 'event' in message:
+                        event = (message['article'], message['quantity'], message['cell'])
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"Сервер склада: пропущено неверное сообщение: {e}")
+                    continue
+                if 'event' in message:
+                    if self.on_change:
+                        self.on_change(*event)
+                    continue
+                future = self._waiting.pop(message.get('id'), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except ConnectionError:
+            pass
+        finally:
+            self.connected = False
+            for future in self._waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("соединение с сервером склада потеряно"))
+            self._waiting.clear()
+
+    async def _call(self, request):
+        if not self.connected:
+            raise ConnectionError("нет соединения с сервером склада")
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request['id']] = future
+        self._writer.write(_encode(request))
+        await self._writer.drain()
+        return await future
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def call(self, op, **params):
+        """Запрос к серверу; ответ - словарь с ключом ok"""
+        request = dict(params, op=op, id=next(self._ids))
+        response = self._submit(self._call(request)).result(self.timeout)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._writer is not None:
+            self._loop.call_soon_threadsafe(self._writer.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+        self.connected = False
+
+
+class LocalInventoryClient:
+    """Замена InventoryClient без сети: вызовы идут прямо в InventoryService.
+
+    Для проверок и для станции, которая сама является хостом.
+    """
+
+    def __init__(self, service, on_change=None):
+        self.service = service
+        self.on_change = on_change
+        self.connected = False
+
+    def connect(self):
+        self.connected = True
+
+    def call(self, op, **params):
+        if op == 'subscribe':
+            if self.on_change and self.on_change not in self.service.listeners:
+                self.service.listeners.append(self.on_change)
+            return {'ok': True}
+        response = self.service.execute(dict(params, op=op))
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    def close(self):
+        if self.on_change in self.service.listeners:
+            self.service.listeners.remove(self.on_change)
+        self.connected = False
+
+
+def main(argv=None):
+    from warehouse_storage import WarehouseStorage
+
+    parser = argparse.ArgumentParser(description="Сервер общего склада для станций упаковки")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+
+    # Таблица и лист берутся из настроек окна склада этой машины
+    storage = WarehouseStorage()
+    if not (storage.spreadsheet_id and storage.authenticate_google()
+            and storage.create_spreadsheet_structure() and storage.load_storage_data()):
+        raise SystemExit("Не удалось подключиться к таблице склада")
+    storage.enabled = True
+    service = InventoryService(storage)
+
+    async def run():
+        server = await service.serve(args.host, args.port)
+        print(f"Сервер склада: {args.host}:{args.port}, артикулов {len(storage.storage_data)}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Дописываем в таблицу то, что ещё в очереди
+        storage.sync.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""Замеры времени горячих путей станции.
+
+Включаются переменной окружения WAREHOUSE_METRICS=1 до запуска. Выключенные
+ничего не стоят: декоратор timed возвращает функцию без обёртки, timer -
+общий пустой контекст, observe сразу выходит.
+
+Каждая метрика - гистограмма с фиксированными корзинами (BUCKETS, секунды):
+число вызовов, сумма, ошибки, p50/p95/p99 оцениваются по корзинам.
+Снаружи видно через:
+    HTTP http://127.0.0.1:<порт>/metrics        - текстовый формат Prometheus,
+                                                  порт - WAREHOUSE_METRICS_PORT
+                                                  или DEFAULT_PORT
+    METRICS_FILE                                - строка JSON раз в FILE_INTERVAL
+                                                  секунд, файл ротируется по размеру
+"""
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+ENABLED = os.environ.get('WAREHOUSE_METRICS', '') not in ('', '0')
+DEFAULT_PORT = 9464
+METRICS_FILE = os.path.expanduser('~/.warehouse_metrics.jsonl')
+FILE_INTERVAL = 60
+FILE_MAX_BYTES = 1024 * 1024
+PREFIX = 'warehouse_'
+
+# Верхние границы корзин: от 25 мкс до ~105 с, шаг x2
+BUCKETS = tuple(25e-6 * 2 ** k for k in range(23))
+
+
+class Histogram:
+    def __init__(self, name):
+        self.name = name
+        self.counts = [0] * (len(BUCKETS) + 1)   # последняя - больше всех границ
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds, error=False):
+        bucket = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.total += seconds
+            if error:
+                self.errors += 1
+
+    def quantile(self, q):
+        """Оценка квантиля: линейно внутри корзины"""
+        with self.lock:
+            counts, count = list(self.counts), self.count
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for bucket, n in enumerate(counts):
+            if n and seen + n >= rank:
+                low = BUCKETS[bucket - 1] if bucket else 0.0
+                high = BUCKETS[bucket] if bucket < len(BUCKETS) else BUCKETS[-1]
+                return low + (high - low) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+    def summary(self):
+        with self.lock:
+            count, total, errors = self.count, self.total, self.errors
+        return {'count': count, 'errors': errors, 'sum': total,
+                'p50': self.quantile(0.5), 'p95': self.quantile(0.95), 'p99': self.quantile(0.99)}
+
+
+def metrics_port():
+    """Порт эндпоинта из WAREHOUSE_METRICS_PORT; неверное значение - DEFAULT_PORT"""
+    value = os.environ.get('WAREHOUSE_METRICS_PORT', '').strip()
+    if not value:
+        return DEFAULT_PORT
+    try:
+        port = int(value)
+        if not 0 < port < 65536:
+            raise ValueError
+    except ValueError:
+        print(f"WAREHOUSE_METRICS_PORT={value!r} - не номер порта, используется {DEFAULT_PORT}")
+        return DEFAULT_PORT
+    return port
+
+
+_histograms = {}
+_registry_lock = threading.Lock()
+
+
+def histogram(name):
+    hist = _histograms.get(name)
+    if hist is None:
+        with _registry_lock:
+            hist = _histograms.setdefault(name, Histogram(name))
+    return hist
+
+
+def observe(name, seconds, error=False):
+    if ENABLED:
+        histogram(name).observe(seconds, error)
+
+
+def timed(name):
+    """Декоратор: время каждого вызова; исключение считается ошибкой"""
+    def decorate(func):
+        if not ENABLED:
+            return func
+        hist = histogram(name)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                hist.observe(time.perf_counter() - start, error=True)
+                raise
+            hist.observe(time.perf_counter() - start)
+            return result
+        return wrapper
+    return decorate
+
+
+class _Timer:
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.hist.observe(time.perf_counter() - self.start, error=exc_type is not None)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name):
+    """with timer('имя'): ... - время блока"""
+    return _Timer(histogram(name)) if ENABLED else _NULL_TIMER
+
+
+def snapshot():
+    """{имя: сводка} по всем метрикам"""
+    with _registry_lock:
+        hists = sorted(_histograms.items())
+    return {name: hist.summary() for name, hist in hists}
+
+
+def prometheus_text():
+    lines = []
+    with _registry_lock:
+        hists = sorted(_histograms.items())
+    for name, hist in hists:
+        metric = f"{PREFIX}{name}_seconds"
+        with hist.lock:
+            counts, count, total, errors = list(hist.counts), hist.count, hist.total, hist.errors
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, n in zip(BUCKETS, counts):
+            cumulative += n
+            lines.append(f'{metric}_bucket{{le="{bound:.6g}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{le="+Inf"}} {count}')
+        lines.append(f"{metric}_sum {total:.9g}")
+        lines.append(f"{metric}_count {count}")
+        lines.append(f"# TYPE {PREFIX}{name}_errors_total counter")
+        lines.append(f"{PREFIX}{name}_errors_total {errors}")
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path=METRICS_FILE, max_bytes=FILE_MAX_BYTES):
+    """Дописать строку со сводкой; большой файл переименовывается в .1"""
+    try:
+        if os.path.getsize(path) > max_bytes:
+            os.replace(path, path + '.1')
+    except OSError:
+        pass
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'time': time.time(), 'metrics': snapshot()}, ensure_ascii=False) + '\n')
+
+
+def _file_loop(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            write_file(path)
+        except OSError as e:
+            print(f"Не удалось записать метрики: {e}")
+
+
+def serve(port=None, host='127.0.0.1'):
+    """HTTP-сервер /metrics в фоновом потоке; возвращает сервер"""
+    if port is None:
+        port = metrics_port()
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # без строки в консоль на каждый запрос
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def start(port=None, path=METRICS_FILE, interval=FILE_INTERVAL):
+    """Эндпоинт и файл метрик, если замеры включены"""
+    if not ENABLED:
+        return
+    if port is None:
+        port = metrics_port()
+    try:
+        serve(port)
+    except OSError as e:
+        print(f"Эндпоинт метрик на порту {port} недоступен: {e}")
+    threading.Thread(target=_file_loop, args=(path, interval), name="metrics-file", daemon=True).start()
@@ -1,14 +1,20 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk, simpledialog
-import pandas as pd
+import numpy as np
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl.styles.stylesheet")
-import winsound
+try:
+    import winsound
+except ImportError:
+    # Не Windows: окно работает без звуков
+    from types import SimpleNamespace
+    winsound = SimpleNamespace(Beep=lambda frequency, duration: None,
+                               PlaySound=lambda sound, flags: None, SND_ALIAS=0, SND_ASYNC=0)
 import os
+import json
+import threading
+import time
 import pickle
-from openpyxl import load_workbook
-from openpyxl.styles import Font
-from PIL import Image, ImageTk
 
 # Импортируем модуль склада
 try:
@@ -18,6 +24,29 @@ except ImportError:
     STORAGE_AVAILABLE = False
     print("Модуль склада недоступен. Установите необходимые зависимости.")
 
+from packing_session import PackingSession, OK, NO_CONNECTION
+from virtual_tree import VirtualTree
+import gtin_index
+import excel_ingest
+from parse_cache import ParseCache
+import shipment_writer
+import box_planner
+import pick_route
+import metrics
+from scan_journal import ScanJournal
+from scan_intake import ScanIntake, FLUSH_DELAY_MS
+
+# Версия разбора шаблонов WB/Ozon для кэша
+TEMPLATE_PARSER_VERSION = 1
+
+# С какого размера листа таблица показывает только видимые строки
+VIRTUAL_ROWS_THRESHOLD = 2000
+
+
+def _read_template_file(path):
+    import pandas as pd  # pandas нужен только для шаблонов WB/Ozon
+    return pd.read_excel(path, dtype=str)
+
 class WarehousePacker:
     def __init__(self, root):
         self.root = root
@@ -27,19 +56,30 @@ class WarehousePacker:
         style.configure("Treeview", font=("Arial", 18))
         style.configure("Treeview", rowheight=36)
         self.row_height = 36
-        self.img = ImageTk.PhotoImage(Image.new('RGBA', (1, self.row_height), (255, 255, 255, 0)))
 
-        # Data structures
-        self.data = None         
-        self.gtin_map = None         
-        self.packages = {}         
         self.current_box = None
+        self._box_targets = None  # план текущей коробки (массив по id) или None
+        # Маршрут сборки по ячейкам склада (строится при первом показе листа)
+        self.pick_mode = tk.BooleanVar(value=False)
+        self.route = None
+        self._route_articles = None
+        self.route_layout = None
 
         # Инициализация модуля склада
         self.storage = WarehouseStorage(root) if STORAGE_AVAILABLE else None
+        if self.storage:
+            # Остатки из снимка сразу, сверка с таблицей в фоне
+            self.storage.start_from_snapshot()
 
-        # Persistent GTIN mapping file
-        self.mapping_file = os.path.expanduser('~/.warehouse_packer_gtin.pkl')
+        # Вся логика упаковки живёт в PackingSession, окно только отображает её
+        self.session = PackingSession(self.storage)
+
+        # Кэш разобранных Excel-файлов
+        self.parse_cache = ParseCache()
+
+        # Persistent GTIN mapping file (бинарный индекс; .pkl - прежний формат)
+        self.mapping_file = os.path.expanduser('~/.warehouse_packer_gtin.idx')
+        self.legacy_mapping_file = os.path.expanduser('~/.warehouse_packer_gtin.pkl')
         self._load_mapping_disk()
 
         # Build UI
@@ -57,6 +97,7 @@ class WarehousePacker:
         btn_frame.pack(pady=5)
         for text, cmd in [("Добавить", self.add_box), ("Переименовать", self.rename_box), ("Удалить", self.delete_box)]:
             tk.Button(btn_frame, text=text, command=cmd).pack(side=tk.LEFT, padx=2)
+        tk.Button(box_frame, text="План коробок", command=self.plan_boxes).pack(pady=(0,5))
 
         # Right panel: controls and tree
         right_frame = tk.Frame(main_frame)
@@ -72,6 +113,9 @@ class WarehousePacker:
             ("Загрузить лист", self.load_sheet),
             ("Загрузить GTIN", self.load_gtin_map),
             ("Скачать шаблон", self.download_template),
+            ("Кэш файлов", self.show_cache_stats),
+            ("Сохранить сессию", self.save_session),
+            ("Открыть сессию", self.open_session),
         ]
         for text, cmd in actions1:
             tk.Button(toolbar1, text=text, command=cmd).pack(side=tk.LEFT, padx=3)
@@ -82,7 +126,8 @@ class WarehousePacker:
         actions2 = [
             ("Экспорт", self.export),
             ("Отгрузка WB", self.ship_wb),
-            ("Отгрузка Ozon", self.ship_ozon)
+            ("Отгрузка Ozon", self.ship_ozon),
+            ("Диагностика", self.show_diagnostics),
         ]
         for text, cmd in actions2:
             tk.Button(toolbar2, text=text, command=cmd).pack(side=tk.LEFT, padx=3)
@@ -91,6 +136,8 @@ class WarehousePacker:
         if self.storage:
             tk.Button(toolbar2, text="Собственный склад", 
                      command=self.storage.show_storage_window).pack(side=tk.LEFT, padx=3)
+            tk.Checkbutton(toolbar2, text="Маршрут сборки", variable=self.pick_mode,
+                           command=self.toggle_pick_route).pack(side=tk.LEFT, padx=3)
 
         scan_frame = tk.Frame(right_frame)
         scan_frame.pack(fill=tk.X, pady=5)
@@ -100,124 +147,421 @@ class WarehousePacker:
         self.scan_entry.bind('<Return>', self.process_scan)
         self.scan_entry.focus_set()
 
-        # Tree with dynamic headings - добавляем колонку для ячейки
+        # Сканы идут через очередь: окно не ждёт диалогов и перерисовки на каждый код
+        self.intake = ScanIntake(self.session)
+        self._scan_flush = None
+
+        # Строка состояния сканера и список последних ошибок (без модальных окон)
+        status_frame = tk.Frame(right_frame)
+        status_frame.pack(fill=tk.X, padx=5)
+        self.scan_status = tk.Label(status_frame, text="", anchor='w', font=("Arial", 14))
+        self.scan_status.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        tk.Button(status_frame, text="Очистить ошибки",
+                  command=self.clear_scan_errors).pack(side=tk.RIGHT)
+        self.error_list = tk.Listbox(right_frame, height=3, fg="red3")
+        self.error_list.pack(fill=tk.X, padx=5, pady=(0,5))
+
+        # Tree with dynamic headings - добавляем колонку для ячейки.
+        # Таблица живёт в отдельном фрейме, чтобы пересоздавать её на том же месте
+        self.tree_frame = tk.Frame(right_frame)
+        self.tree_frame.pack(fill=tk.BOTH, expand=True)
+        self._build_tree()
+
+        # Label: total remaining
+        self.remaining_label = tk.Label(right_frame, text="")
+        self.remaining_label.pack(pady=3)
+
+        # Индикатор фоновой записи склада
+        if self.storage:
+            self.sync_label = tk.Label(right_frame, text="", fg="gray40")
+            self.sync_label.pack(pady=(0,3))
+            # Артикулы, изменённые на складе не с этой станции (из фонового потока)
+            self._storage_changed = set()
+            self._storage_changed_lock = threading.Lock()
+            self.storage.listeners.append(self._on_storage_changed)
+            self._storage_stale = self.storage.stale
+            self._poll_sync()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Журнал упаковки: восстановление после сбоя
+        self.journal = ScanJournal()
+        self._resume_journal()
+        self.session.journal = self.journal
+        self._poll_journal()
+
+        # Эндпоинт и файл метрик (только при WAREHOUSE_METRICS=1)
+        metrics.start()
+
+    def _on_storage_changed(self, articles):
+        with self._storage_changed_lock:
+            self._storage_changed.update(articles)
+
+    def _poll_sync(self):
+        status = [self.storage.sync.status_text()]
+        if self.storage.enabled:
+            status.append(self.storage.stale_text())
+        self.sync_label.config(text="; ".join(text for text in status if text))
+        with self._storage_changed_lock:
+            changed, self._storage_changed = self._storage_changed, set()
+        stale_flipped = self._storage_stale != self.storage.stale
+        if stale_flipped:
+            # Сверка закончилась: снимаем пометку устаревших ячеек со всех строк
+            self._storage_stale = self.storage.stale
+            ids = range(len(self.session.articles))
+        else:
+            ids = [self.session.article_ids[art] for art in changed if art in self.session.article_ids]
+        if ids and self._route_articles is self.session.articles and \
+                self.route.update(ids, self.session.articles, self._storage_cell):
+            # Сменились ячейки: строки встают в новом порядке маршрута
+            self._clear_rows()
+            self.refresh_tree()
+        elif stale_flipped or (ids and 'cell' in self.tree_mode[0]):
+            self.refresh_tree(ids)
+        self.root.after(500, self._poll_sync)
+
+    def _poll_journal(self):
+        # Досбрасываем на диск записи, оставшиеся после последнего скана,
+        # и уплотняем журнал здесь, а не посреди пачки сканов
+        try:
+            self.journal.maintain(self.session)
+        except OSError as e:
+            print(f"Ошибка записи журнала упаковки: {e}")
+        self.root.after(1000, self._poll_journal)
+
+    def _resume_journal(self):
+        if not self.journal.exists():
+            return
+        if not messagebox.askyesno("Восстановление",
+                                   "Найдена незавершённая сессия упаковки.\nВосстановить её?"):
+            self.journal.clear()
+            return
+        try:
+            replayed = self.journal.resume(self.session)
+        except Exception as e:
+            winsound.Beep(1000,200)
+            messagebox.showerror("Ошибка", f"Не удалось восстановить сессию:\n{e}")
+            self.journal.clear()
+            return
+        self._show_session()
+        messagebox.showinfo("Готово", f"Сессия восстановлена: коробок {len(self.session.boxes)}, "
+                                      f"повторено записей журнала {replayed}.")
+
+    def on_close(self):
+        if self.session.loaded and self.session.scanned.any():
+            keep = messagebox.askyesnocancel(
+                "Выход", "Сохранить незавершённую сессию упаковки, чтобы продолжить "
+                         "её при следующем запуске?")
+            if keep is None:
+                return
+        else:
+            keep = False
+        if keep:
+            self.journal.close()
+        else:
+            # Обычный выход: при следующем запуске не спрашивать о восстановлении
+            self.journal.clear()
+        # Даём очереди склада дописать изменения перед выходом
+        if self.storage:
+            self.storage.sync.stop()
+            if self.storage.enabled:
+                self.storage.save_snapshot()
+        self.root.destroy()
+
+    def _storage_cell(self, art):
+        return self.storage.get_article_info(art)[1]
+
+    def toggle_pick_route(self):
+        if self.pick_mode.get():
+            if not self.storage.enabled:
+                messagebox.showwarning("Маршрут сборки", "Маршрут строится по ячейкам склада.\n"
+                                                         "Сначала включите собственный склад.")
+                self.pick_mode.set(False)
+                return
+            try:
+                self.route_layout = pick_route.load_layout()
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Не удалось прочитать схему склада "
+                                               f"{pick_route.LAYOUT_FILE}:\n{e}")
+                self.pick_mode.set(False)
+                return
+        # Маршрут перестраивается по новой схеме при показе строк
+        self.route = self._route_articles = None
+        self._clear_rows()
+        self.refresh_tree()
+
+    def _route_order(self):
+        """id артикулов в порядке маршрута сборки или None (порядок листа)"""
+        if not (self.pick_mode.get() and self.storage and self.storage.enabled):
+            return None
+        if self._route_articles is not self.session.articles:
+            # Новый лист: маршрут считается один раз, дальше только обновляется
+            self.route = pick_route.PickRoute(self.route_layout)
+            self.route.build(self.session.articles, self._storage_cell)
+            self._route_articles = self.session.articles
+        return self.route.order
+
+    def _tree_columns(self):
         if self.storage and self.storage.enabled:
-            columns = ("article","scanned","remaining","cell")
-            self.tree = ttk.Treeview(right_frame, columns=columns, show='headings')
-            self.tree.heading('article', text='Артикул')
-            self.tree.heading('scanned', text='В коробке')
-            self.tree.heading('remaining', text='Осталось')
+            return ("article","scanned","remaining","cell")
+        return ("article","scanned","remaining")
+
+    def _tree_mode(self):
+        return self._tree_columns(), len(self.session.articles) > VIRTUAL_ROWS_THRESHOLD
+
+    def _build_tree(self):
+        self.tree_mode = columns, virtual = self._tree_mode()
+        if virtual:
+            self.vtree = VirtualTree(self.tree_frame, columns, self.row_height)
+            self.tree = self.vtree.tree
+        else:
+            self.vtree = None
+            self.tree = ttk.Treeview(self.tree_frame, columns=columns, show='headings')
+        self.tree.heading('article', text='Артикул')
+        self.tree.heading('scanned', text='В коробке')
+        self.tree.heading('remaining', text='Осталось')
+        if 'cell' in columns:
             self.tree.heading('cell', text='Ячейка')
             self.tree.column('article', width=200)
             self.tree.column('scanned', width=100)
             self.tree.column('remaining', width=100)
             self.tree.column('cell', width=100)
         else:
-            columns = ("article","scanned","remaining")
-            self.tree = ttk.Treeview(right_frame, columns=columns, show='headings')
-            self.tree.heading('article', text='Артикул')
-            self.tree.heading('scanned', text='В коробке')
-            self.tree.heading('remaining', text='Осталось')
             self.tree.column('article', width=300)
             self.tree.column('scanned', width=120)
             self.tree.column('remaining', width=120)
-        
-        self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        widget = self.vtree.frame if virtual else self.tree
+        widget.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         self.tree.bind('<Double-1>', self.on_tree_double_click)
 
-        # Label: total remaining
-        self.remaining_label = tk.Label(right_frame, text="")
-        self.remaining_label.pack(pady=3)
+        # Что сейчас показано в строках: по ним считается разница при обновлении
+        self._shown_articles = None   # список артикулов сессии, по которому построены строки
+        self._shown_order = None      # порядок строк (id по маршруту) или None - порядок листа
+        self._row_iids = []           # article id -> iid строки
+        self._shown_scanned = None
+        self._shown_remaining = None
+        self._shown_targets = None
 
     def _load_mapping_disk(self):
-        if os.path.exists(self.mapping_file):
-            try:
-                with open(self.mapping_file, 'rb') as f:
-                    self.gtin_map = pickle.load(f)
-            except:
-                self.gtin_map = None
+        try:
+            catalog = gtin_index.GtinCatalog(self.mapping_file)
+            if not catalog and os.path.exists(self.legacy_mapping_file):
+                # Однократный перевод старого pickle в индекс
+                with open(self.legacy_mapping_file, 'rb') as f:
+                    catalog.replace(pickle.load(f).items())
+            self.session.set_gtin_map(catalog)
+        except Exception as e:
+            print(f"Не удалось открыть GTIN-индекс: {e}")
+            self.session.set_gtin_map(None)
+
+    def _report(self, result):
+        """Показ ошибки операции PackingSession"""
+        winsound.Beep(1000,200)
+        if result.level == 'warning':
+            messagebox.showwarning(result.title, result.message)
         else:
-            self.gtin_map = None
+            messagebox.showerror(result.title, result.message)
 
-    def _save_mapping_disk(self):
-        if self.gtin_map is not None:
-            with open(self.mapping_file, 'wb') as f:
-                pickle.dump(self.gtin_map, f)
+    def _progress(self, what):
+        """Колбэк прогресса чтения файла: пишет число строк в строку состояния"""
+        def progress(done, total):
+            suffix = f" из {total}" if total else ""
+            self.remaining_label.config(text=f"{what}: {done}{suffix} строк")
+            self.root.update_idletasks()
+        return progress
 
     def load_sheet(self):
         path = filedialog.askopenfilename(filetypes=[("Excel files","*.xls *.xlsx")])
         if not path: return
         try:
-            df = pd.read_excel(path)
-            cols = {c.lower(): c for c in df.columns}
-            if 'артикул' in cols and 'количество' in cols:
-                sub = df[[cols['артикул'], cols['количество']]].copy()
-                sub.columns = ['article','quantity']
-                sub['quantity'] = sub['quantity'].astype(int)
-                sub.set_index('article', inplace=True)
-                self.data = sub
-                self.data.sort_index(inplace=True)
-            else:
-                col0, col1 = df.columns[:2]
-                df = df.astype({col0: str, col1: int})
-                df.columns = ['article','quantity']
-                df.set_index('article', inplace=True)
-                self.data = df
-                self.data.sort_index(inplace=True)
-
-            messagebox.showinfo("Готово", f"Загружено {len(self.data)} позиций.")
-            self.packages.clear(); self.current_box=None
+            articles, quantities = self.parse_cache.load(
+                path, 'order_sheet', excel_ingest.PARSER_VERSION,
+                lambda p: excel_ingest.read_order_sheet(p, self._progress("Чтение листа")),
+                excel_ingest.engine(path))
+            self.session.load_sheet(articles, quantities)
+            messagebox.showinfo("Готово", f"Загружено {len(articles)} позиций.")
+            self.current_box=None
             self.box_listbox.delete(0, tk.END)
-            self.tree.delete(*self.tree.get_children())
             self.refresh_tree()
         except Exception as e:
             winsound.Beep(1000,200)
+            self.refresh_tree()
             messagebox.showerror("Ошибка", f"Не удалось загрузить лист:\n{e}")
 
     def load_gtin_map(self):
         path = filedialog.askopenfilename(filetypes=[("Excel files","*.xls *.xlsx")])
         if not path: return
         try:
-            df = pd.read_excel(path, dtype=str)
-            df.columns = ['gtin','article']
-            df.set_index('gtin', inplace=True)
-            self.gtin_map = df['article']
-            self._save_mapping_disk()
-            messagebox.showinfo("Готово", f"Загружено {len(self.gtin_map)} GTIN-сопоставлений.")
+            catalog = self.session.gtin_map
+            if catalog is None:
+                catalog = gtin_index.GtinCatalog(self.mapping_file)
+                self.session.set_gtin_map(catalog)
+            merge = False
+            if catalog:
+                merge = messagebox.askyesnocancel(
+                    "GTIN", "Добавить к уже загруженным сопоставлениям?\n"
+                            "Да - объединить, Нет - заменить полностью.")
+                if merge is None: return
+            gtins, articles = self.parse_cache.load(
+                path, 'gtin_map', excel_ingest.PARSER_VERSION,
+                lambda p: excel_ingest.read_gtin_columns(p, self._progress("Чтение GTIN")),
+                excel_ingest.engine(path))
+            pairs = zip(gtins, articles)
+            if merge:
+                count = catalog.upsert(pairs)
+            else:
+                catalog.replace(pairs)
+                count = len(catalog)
+            self.refresh_tree()
+            messagebox.showinfo("Готово", f"Загружено {count} GTIN-сопоставлений.")
         except Exception as e:
             winsound.Beep(1000,200)
+            self.refresh_tree()
             messagebox.showerror("Ошибка", f"Не удалось загрузить GTIN-таблицу:\n{e}")
 
+    def _read_template(self, path):
+        return self.parse_cache.load(path, 'template', TEMPLATE_PARSER_VERSION,
+                                     _read_template_file)
+
+    def show_diagnostics(self):
+        """Окно с задержками горячих путей (обновляется раз в секунду)"""
+        win = tk.Toplevel(self.root)
+        win.title("Диагностика")
+        if metrics.ENABLED:
+            text = (f"Метрики: http://127.0.0.1:{metrics.metrics_port()}/metrics, "
+                    f"файл {metrics.METRICS_FILE}")
+        else:
+            text = "Замеры выключены. Для включения запустите с WAREHOUSE_METRICS=1"
+        tk.Label(win, text=text, fg="gray40").pack(padx=5, pady=5)
+        columns = ("name", "count", "errors", "p50", "p95", "p99")
+        tree = ttk.Treeview(win, columns=columns, show='headings', height=10)
+        for col, title, width in zip(columns, ("Операция", "Вызовов", "Ошибок", "p50, мс", "p95, мс", "p99, мс"),
+                                     (220, 100, 90, 100, 100, 100)):
+            tree.heading(col, text=title)
+            tree.column(col, width=width, anchor='w' if col == 'name' else 'e')
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        def update():
+            if not win.winfo_exists():
+                return
+            for name, summary in metrics.snapshot().items():
+                values = (name, summary['count'], summary['errors'],
+                          *(f"{summary[q] * 1000:.2f}" for q in ('p50', 'p95', 'p99')))
+                if tree.exists(name):
+                    tree.item(name, values=values)
+                else:
+                    tree.insert('', tk.END, iid=name, values=values)
+            win.after(1000, update)
+        update()
+
+    def show_cache_stats(self):
+        if messagebox.askyesno("Кэш файлов", self.parse_cache.stats_text() + "\n\nОчистить кэш?",
+                               default=messagebox.NO):
+            self.parse_cache.clear()
+
     def download_template(self):
-        df = pd.DataFrame(columns=['Артикул','Количество'])
         path = filedialog.asksaveasfilename(defaultextension='.xlsx', filetypes=[('Excel','*.xlsx')])
         if not path: return
         try:
-            df.to_excel(path, index=False)
+            shipment_writer.write_xlsx(path, ['Артикул','Количество'], [])
             messagebox.showinfo("Готово", f"Шаблон сохранён в {os.path.basename(path)}")
         except Exception as e:
             winsound.Beep(1000,200)
             messagebox.showerror("Ошибка", f"Не удалось сохранить шаблон:\n{e}")
 
+    def save_session(self):
+        if not self.session.loaded:
+            messagebox.showwarning("Внимание","Сначала загрузите лист.")
+            return
+        path = filedialog.asksaveasfilename(defaultextension='.json', title="Сохранить сессию",
+                                            filetypes=[('Сессия упаковки','*.json')])
+        if not path: return
+        try:
+            self.session.save(path)
+            messagebox.showinfo("Готово", f"Сессия сохранена в {os.path.basename(path)}")
+        except Exception as e:
+            winsound.Beep(1000,200)
+            messagebox.showerror("Ошибка", f"Не удалось сохранить сессию:\n{e}")
+
+    def open_session(self):
+        path = filedialog.askopenfilename(title="Открыть сессию", filetypes=[('Сессия упаковки','*.json')])
+        if not path: return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Склад не трогаем: остатки списаны, когда сессия упаковывалась
+            self.session.restore(data)
+        except Exception as e:
+            winsound.Beep(1000,200)
+            messagebox.showerror("Ошибка", f"Не удалось открыть сессию:\n{e}")
+            return
+        self._show_session()
+
+    def _show_session(self):
+        """Список коробок и таблица после загрузки сессии целиком"""
+        self.current_box = None
+        self.box_listbox.delete(0, tk.END)
+        for box in self.session.boxes:
+            self.box_listbox.insert(tk.END, box)
+        self.refresh_tree()
+
     def add_box(self):
-        if self.data is None:
+        if not self.session.loaded:
             messagebox.showwarning("Внимание","Сначала загрузите лист.")
             return
         name = simpledialog.askstring("Имя коробки","Введите имя новой коробки:")
-        if not name or name in self.packages: return
-        self.packages[name] = {art:0 for art in self.data.index}
+        if not self.session.add_box(name): return
         self.box_listbox.insert(tk.END,name)
         self.box_listbox.selection_clear(0, tk.END)
         self.box_listbox.selection_set(tk.END)
         self.on_box_select()
 
+    def _read_box_catalog(self):
+        """Каталог размеров {article: (объём л, вес кг)}; без файла - пустой"""
+        path = filedialog.askopenfilename(title="Каталог размеров и веса (Отмена - без каталога)",
+                                          filetypes=[("Excel files","*.xls *.xlsx")])
+        if not path:
+            return {}
+        articles, volumes, weights = self.parse_cache.load(
+            path, 'box_catalog', excel_ingest.PARSER_VERSION,
+            lambda p: excel_ingest.read_box_catalog(p, self._progress("Чтение каталога")),
+            excel_ingest.engine(path))
+        return dict(zip(articles, zip(volumes, weights)))
+
+    def plan_boxes(self):
+        if not self.session.loaded:
+            messagebox.showwarning("Внимание","Сначала загрузите лист.")
+            return
+        try:
+            catalog = self._read_box_catalog()
+        except Exception as e:
+            winsound.Beep(1000,200)
+            messagebox.showerror("Ошибка", f"Не удалось загрузить каталог:\n{e}")
+            return
+        volume = simpledialog.askfloat("План коробок", "Объём коробки, л:",
+                                       initialvalue=box_planner.BOX_VOLUME, minvalue=0.001)
+        if volume is None: return
+        weight = simpledialog.askfloat("План коробок", "Максимальный вес коробки, кг:",
+                                       initialvalue=box_planner.BOX_WEIGHT, minvalue=0.001)
+        if weight is None: return
+        # Планируется только то, что ещё не разложено и не входит в прежний план
+        plan = box_planner.plan_boxes(self.session.articles, self.session.unplanned_counts(),
+                                      catalog, volume, weight)
+        if not plan.boxes:
+            messagebox.showinfo("План коробок", "Всё уже разложено или распланировано.")
+            return
+        if not messagebox.askyesno("План коробок",
+                                   box_planner.summary_text(plan, volume, weight) + "\n\nСоздать коробки?"):
+            return
+        self.session.apply_plan(box_planner.box_contents(plan))
+        self._show_session()
+
     def rename_box(self):
         sel = self.box_listbox.curselection()
         if not sel: return
         old = self.box_listbox.get(sel)
         new = simpledialog.askstring("Переименовать","Новое имя:", initialvalue=old)
-        if not new or new in self.packages: return
-        self.packages[new] = self.packages.pop(old)
+        if not self.session.rename_box(old, new): return
+        if self.current_box == old: self.current_box = new
         self.box_listbox.delete(sel); self.box_listbox.insert(sel,new); self.box_listbox.selection_set(sel)
         self.on_box_select()
 
@@ -226,9 +570,9 @@ class WarehousePacker:
         if not sel: return
         name = self.box_listbox.get(sel)
         if messagebox.askyesno("Удалить", f"Удалить '{name}'?"):
-            self.packages.pop(name,None)
+            self.session.delete_box(name)
             self.box_listbox.delete(sel)
-            self.current_box=None; self.tree.delete(*self.tree.get_children())
+            self.current_box=None
             self.refresh_tree()
 
     def on_box_select(self,event=None):
@@ -237,271 +581,273 @@ class WarehousePacker:
         self.current_box = self.box_listbox.get(sel)
         self.refresh_tree()
 
-    def total_scanned(self,article):
-        return sum(b.get(article,0) for b in self.packages.values())
-
     def process_scan(self, event):
         gtin = self.scan_entry.get().strip()
         self.scan_entry.delete(0, tk.END)
-        if self.data is None or self.current_box is None or self.gtin_map is None:
-            winsound.Beep(1000,200)
-            messagebox.showwarning("Внимание","Загрузите данные и выберите коробку.")
-            self.scan_entry.focus_set()
-            return
-        if gtin not in self.gtin_map.index:
-            winsound.Beep(1000,200)
-            messagebox.showwarning("Не найден GTIN", f"GTIN {gtin} отсутствует.")
-            return
-        article = self.gtin_map.at[gtin]
-        if article not in self.data.index:
-            winsound.Beep(1000,200)
-            messagebox.showerror("Ошибка данных", f"Артикул {article} не найден в листе.")
-            return
-        allowed = self.data.at[article,'quantity']
-        used = self.total_scanned(article)
-        remaining = allowed - used
-        if remaining <= 0:
-            winsound.Beep(1000,200)
-            messagebox.showerror("Превышено", f"Доступно {allowed}, использовано {used}")
-            return
+        if gtin:
+            self.intake.push(gtin, self.current_box)
+            # Вся пачка кодов разбирается одним проходом через кадр
+            if self._scan_flush is None:
+                self._scan_flush = self.root.after(FLUSH_DELAY_MS, self._flush_scans)
+        self.scan_entry.focus_set()
 
-        # Проверяем наличие на складе
-        if self.storage and self.storage.enabled:
-            storage_qty, storage_cell = self.storage.get_article_info(article)
-            if storage_qty is not None and storage_qty <= 0:
+    @metrics.timed('scan_flush')
+    def _flush_scans(self):
+        self._scan_flush = None
+        changed, errors = self.intake.drain()
+        if changed:
+            self.refresh_tree(changed)
+        if errors:
+            winsound.PlaySound('SystemHand', winsound.SND_ALIAS | winsound.SND_ASYNC)
+            for error in errors:
+                self.error_list.insert(0, f"{time.strftime('%H:%M:%S', time.localtime(error.time))}  "
+                                          f"{error.code}: {error.message}")
+            self.error_list.delete(self.intake.errors.maxlen, tk.END)
+            last = errors[-1]
+            self.scan_status.config(text=f"{last.title}: {last.message}", fg="red3")
+            lost = next((error for error in errors if error.status == NO_CONNECTION), None)
+            if lost is not None:
+                # Не "нет на складе": упаковщик должен знать, что сканы не учтены
                 winsound.Beep(1000,200)
-                messagebox.showwarning("Недостаточно на складе", 
-                                     f"Товар {article} отсутствует на складе")
-                return
-            
-            # Уменьшаем количество на складе
-            self.storage.update_article_quantity(article, -1)
-            self.storage.save_storage_data()
-
-        # Record successful scan and play success sound
-        self.packages[self.current_box][article] += 1
-        winsound.PlaySound('SystemAsterisk', winsound.SND_ALIAS | winsound.SND_ASYNC)
-        self.refresh_tree()
+                messagebox.showerror(lost.title, f"{lost.message}\nНе учтено сканов: "
+                                     f"{sum(error.status == NO_CONNECTION for error in errors)}")
+        elif changed:
+            # Successful scan: play success sound
+            winsound.PlaySound('SystemAsterisk', winsound.SND_ALIAS | winsound.SND_ASYNC)
+            self.scan_status.config(text=f"Принято сканов: {self.intake.accepted}", fg="dark green")
+
+    def clear_scan_errors(self):
+        self.intake.clear_errors()
+        self.error_list.delete(0, tk.END)
+        self.scan_status.config(text="")
         self.scan_entry.focus_set()
 
     def on_tree_double_click(self,event):
         item=self.tree.identify_row(event.y); col=self.tree.identify_column(event.x)
         if not item or col!='#2': return
-        art, scanned, remaining = self.tree.item(item,'values')[:3]
+        art = self.tree.item(item,'values')[0]
+        scanned = self.session.box_count(self.current_box, art)
         new_val=simpledialog.askinteger("Редактировать","Новое количество:", 
-                                       initialvalue=int(scanned), minvalue=0)
+                                       initialvalue=scanned, minvalue=0)
         if new_val is None: return
-        allowed=self.data.at[art,'quantity']
-        other=self.total_scanned(art)-int(scanned)
-        if new_val+other>allowed:
-            winsound.Beep(1000,200)
-            messagebox.showerror("Превышено", f"Всего доступно {allowed}, в других коробках {other}")
+        result=self.session.set_quantity(self.current_box, art, new_val)
+        if result.status != OK:
+            self._report(result)
             return
-        
-        # Обновляем склад при изменении количества
-        if self.storage and self.storage.enabled:
-            difference = int(scanned) - new_val  # Разница: положительная = возвращаем на склад
-            if difference != 0:
-                self.storage.update_article_quantity(art, difference)
-                self.storage.save_storage_data()
-        
-        self.packages[self.current_box][art]=new_val
-        self.refresh_tree()
+        self.refresh_tree([self.session.article_ids[art]])
 
-    def refresh_tree(self):
-        # Определяем, нужно ли показывать колонку с ячейками
-        show_cells = self.storage and self.storage.enabled
-        
-        # Обновляем структуру дерева если нужно
-        current_columns = self.tree['columns']
-        needed_columns = ("article","scanned","remaining","cell") if show_cells else ("article","scanned","remaining")
-        
-        if current_columns != needed_columns:
-            self.tree.destroy()
-            if show_cells:
-                self.tree = ttk.Treeview(self.tree.master, columns=needed_columns, show='headings')
-                self.tree.heading('article', text='Артикул')
-                self.tree.heading('scanned', text='В коробке')
-                self.tree.heading('remaining', text='Осталось')
-                self.tree.heading('cell', text='Ячейка')
-                self.tree.column('article', width=200)
-                self.tree.column('scanned', width=100)
-                self.tree.column('remaining', width=100)
-                self.tree.column('cell', width=100)
-            else:
-                self.tree = ttk.Treeview(self.tree.master, columns=needed_columns, show='headings')
-                self.tree.heading('article', text='Артикул')
-                self.tree.heading('scanned', text='В коробке')
-                self.tree.heading('remaining', text='Осталось')
-                self.tree.column('article', width=300)
-                self.tree.column('scanned', width=120)
-                self.tree.column('remaining', width=120)
-            
-            self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-            self.tree.bind('<Double-1>', self.on_tree_double_click)
+    @metrics.timed('refresh_tree')
+    def refresh_tree(self, changed=None):
+        """Обновление таблицы по разнице с показанным состоянием.
 
-        # Update headings with totals
-        total_articles = len(self.data) if self.data is not None else 0
-        if self.current_box is not None:
-            total_scanned = sum(self.packages[self.current_box].values())
-        else:
-            total_scanned = 0
-        total_remaining = sum(self.data.at[art,'quantity'] - self.total_scanned(art) 
-                            for art in self.data.index) if self.data is not None else 0
+        changed - id артикулов, которые могли измениться; None - сверить все строки
+        (например, при смене коробки).
+        """
+        # Таблицу пересоздаём только если включили/отключили склад
+        # или лист перешёл через порог виртуального режима
+        if self.tree_mode != self._tree_mode():
+            (self.vtree.frame if self.vtree else self.tree).destroy()
+            self._build_tree()
 
-        self.tree.heading('article', text=f'Артикул ({total_articles})')
-        self.tree.heading('scanned', text=f'В коробке ({total_scanned})')
+        # Update headings with totals
+        session = self.session
+        total_remaining = session.total_remaining
+        box_total = session.box_total(self.current_box)
+        target_total = session.box_target_total(self.current_box)
+        # У коробки из плана показываем "положено / по плану"
+        self._box_targets = session.box_targets(self.current_box) if target_total else None
+        self.tree.heading('article', text=f'Артикул ({len(session.articles)})')
+        self.tree.heading('scanned', text=f'В коробке ({box_total} / {target_total})' if target_total
+                          else f'В коробке ({box_total})')
         self.tree.heading('remaining', text=f'Осталось ({total_remaining})')
 
-        # Refresh rows
-        self.tree.delete(*self.tree.get_children())
-        select_next = None
-        if self.data is not None and self.current_box is not None:
-            for idx, (art, qty) in enumerate(self.data['quantity'].items()):
-                scanned = self.packages[self.current_box].get(art, 0)
-                rem = qty - self.total_scanned(art)
-                
-                if show_cells:
-                    # Получаем информацию о ячейке
-                    storage_qty, storage_cell = self.storage.get_article_info(art)
-                    cell_info = storage_cell if storage_cell else ""
-                    values = (art, scanned, rem, cell_info)
-                else:
-                    values = (art, scanned, rem)
-                
-                iid = self.tree.insert('', tk.END, values=values)
-                if select_next is None and rem > 0:
-                    select_next = iid
-        
-        # выделить строку с первым незаполненным
-        if select_next is not None:
-            self.tree.selection_set(select_next)
-            self.tree.focus(select_next)
-            self.tree.see(select_next)
+        if not session.loaded or self.current_box is None:
+            self._clear_rows()
+        elif self._shown_articles is not session.articles:
+            self._populate_rows()
+        else:
+            self._update_rows(changed)
+
+        # выделить строку с первым незаполненным (первым по маршруту, если он включён)
+        if self._shown_articles is not None:
+            if self._box_targets is not None:
+                pending = session.box_counts(self.current_box) < self._box_targets
+            else:
+                pending = session.remaining_counts() > 0
+            order = self._shown_order
+            unfinished = np.flatnonzero(pending) if order is None else order[pending[order]]
+            if len(unfinished):
+                self._select_row(int(unfinished[0]))
 
         # Update label with total remaining for ALL boxes
         self.remaining_label.config(text=f"Всего осталось распределить: {total_remaining}")
 
+    def _display_row(self, i):
+        """Номер строки таблицы для артикула с id i"""
+        return i if self._shown_order is None else int(self.route.position[i])
+
+    def _select_row(self, i):
+        if self.vtree:
+            self.vtree.select(self._display_row(i))
+            return
+        select_next = self._row_iids[i]
+        self.tree.selection_set(select_next)
+        self.tree.focus(select_next)
+        self.tree.see(select_next)
+
+    def _row_values(self, i):
+        """Значения строки таблицы для артикула с id i"""
+        session = self.session
+        art = session.articles[i]
+        scanned = self._scanned_text(i, session.box_count(self.current_box, art))
+        rem = session.remaining(art)
+        if 'cell' in self.tree_mode[0]:
+            return (art, scanned, rem, self._cell_text(art))
+        return (art, scanned, rem)
+
+    def _scanned_text(self, i, scanned):
+        """Колонка "В коробке": у коробки из плана - положено / по плану"""
+        if self._box_targets is None or not self._box_targets[i]:
+            return scanned
+        return f"{scanned} / {self._box_targets[i]}"
+
+    def _target_counts(self, box_counts):
+        """План текущей коробки по id; 0 - без плана"""
+        return np.zeros_like(box_counts) if self._box_targets is None else self._box_targets
+
+    def _cell_text(self, art):
+        """Ячейка склада для колонки таблицы"""
+        storage_qty, storage_cell = self.storage.get_article_info(art)
+        if storage_cell and self.storage.stale:
+            storage_cell += " *"  # из снимка, ещё не сверено
+        return storage_cell if storage_cell else ""
+
+    def _clear_rows(self):
+        if self.vtree:
+            self.vtree.clear()
+        elif self._row_iids:
+            self.tree.delete(*self._row_iids)
+        self._shown_articles = None
+        self._shown_order = None
+        self._row_iids = []
+        self._shown_scanned = self._shown_remaining = self._shown_targets = None
+
+    def _populate_rows(self):
+        """Полная вставка строк - только для нового листа"""
+        self._clear_rows()
+        session = self.session
+        order = self._shown_order = self._route_order()
+        if self.vtree:
+            # Строки не вставляются: окно само запросит видимые через _row_values
+            row_values = self._row_values if order is None else lambda row: self._row_values(int(order[row]))
+            self.vtree.set_model(len(session.articles), row_values)
+            self._shown_articles = session.articles
+            return
+        show_cells = 'cell' in self.tree_mode[0]
+        box_counts = session.box_counts(self.current_box)
+        remaining = session.remaining_counts()
+        self._row_iids = [None] * len(session.articles)
+        for i in (range(len(session.articles)) if order is None else order.tolist()):
+            art = session.articles[i]
+            scanned = self._scanned_text(i, int(box_counts[i]))
+            rem = int(remaining[i])
+            if show_cells:
+                values = (art, scanned, rem, self._cell_text(art))
+            else:
+                values = (art, scanned, rem)
+            self._row_iids[i] = self.tree.insert('', tk.END, values=values)
+        self._shown_articles = session.articles
+        self._shown_scanned = box_counts.copy()
+        self._shown_remaining = remaining
+        self._shown_targets = self._target_counts(box_counts).copy()
+
+    def _update_rows(self, changed):
+        """Перезапись только тех ячеек таблицы, значения которых изменились"""
+        if self.vtree:
+            if changed is None:
+                self.vtree.refresh()
+            else:
+                self.vtree.refresh_rows([self._display_row(i) for i in changed])
+            return
+        box_counts = self.session.box_counts(self.current_box)
+        remaining = self.session.remaining_counts()
+        # Текст "В коробке" зависит и от плана коробки: при смене коробки
+        # с другим планом строка перерисовывается, даже если число то же
+        targets = self._target_counts(box_counts)
+        # Явно переданные строки могли измениться и на складе - обновляем ячейку
+        show_cells = changed is not None and 'cell' in self.tree_mode[0]
+        if changed is None:
+            changed = np.flatnonzero((box_counts != self._shown_scanned) |
+                                     (targets != self._shown_targets) |
+                                     (remaining != self._shown_remaining)).tolist()
+        for i in changed:
+            if show_cells:
+                self.tree.set(self._row_iids[i], 'cell', self._cell_text(self.session.articles[i]))
+            iid = self._row_iids[i]
+            scanned, rem = int(box_counts[i]), int(remaining[i])
+            if scanned != self._shown_scanned[i] or targets[i] != self._shown_targets[i]:
+                self.tree.set(iid, 'scanned', self._scanned_text(i, scanned))
+                self._shown_scanned[i] = scanned
+                self._shown_targets[i] = targets[i]
+            if rem != self._shown_remaining[i]:
+                self.tree.set(iid, 'remaining', rem)
+                self._shown_remaining[i] = rem
+
     def export(self):
-        rows=[]
-        for box,items in self.packages.items():
-            for art,cnt in items.items():
-                if cnt>0:
-                    row_data = {'Артикул товара':art,'Кол-во товаров':cnt,'Коробка':box}
-                    
-                    # Добавляем информацию о ячейке если доступна
-                    if self.storage and self.storage.enabled:
-                        storage_qty, storage_cell = self.storage.get_article_info(art)
-                        row_data['Ячейка'] = storage_cell if storage_cell else ""
-                    
-                    rows.append(row_data)
-        
-        if not rows:
+        if not self.session.scanned.any():
             winsound.Beep(1000,200); messagebox.showwarning("Пусто","Нет данных для экспорта."); return
-        df=pd.DataFrame(rows)
         path=filedialog.asksaveasfilename(defaultextension='.xlsx',filetypes=[('Excel','*.xlsx')])
         if not path: return
+        # Добавляем информацию о ячейке если доступна
+        cell_of = None
+        if self.storage and self.storage.enabled:
+            cell_of = lambda art: self.storage.get_article_info(art)[1]
         try:
-            df.to_excel(path,index=False)
+            shipment_writer.write_export(path, self.session, cell_of, self._route_order())
             messagebox.showinfo("Готово",f"Сохранено в {os.path.basename(path)}")
         except Exception as e:
             winsound.Beep(1000,200); messagebox.showerror("Ошибка",f"Не удалось сохранить:\n{e}")
 
     def ship_wb(self):
-        if not self.packages:
+        if not self.session.boxes:
             messagebox.showwarning("Пусто", "Нет данных для отгрузки WB.")
             return
         tpl_path = filedialog.askopenfilename(title="Загрузить шаблон WB", filetypes=[('Excel','*.xlsx')])
         if not tpl_path: return
         try:
-            tpl = pd.read_excel(tpl_path, dtype=str)
+            tpl = self._read_template(tpl_path)
             if 'ШК короба' not in tpl.columns or 'Срок годности' not in tpl.columns:
                 raise ValueError('Шаблон должен содержать колонки "ШК короба" и "Срок годности"')
         except Exception as e:
             winsound.Beep(1000,200)
             messagebox.showerror("Ошибка шаблона", str(e)); return
-        boxes = list(self.packages.keys())
-        article_to_gtin = {art:gt for gt,art in self.gtin_map.items()} if self.gtin_map is not None else {}
-        out_rows = []
-        for idx, box in enumerate(boxes):
-            if idx >= len(tpl):
-                break
-            box_code = tpl.at[idx, 'ШК короба']
-            shelf_life = tpl.at[idx, 'Срок годности']
-            for art, cnt in self.packages[box].items():
-                if cnt > 0:
-                    barcode = article_to_gtin.get(art, art)
-                    out_rows.append({
-                        'Баркод товара': barcode,
-                        'Кол-во товаров': cnt,
-                        'ШК короба': box_code,
-                        'Срок годности': shelf_life
-                    })
-        df_out = pd.DataFrame(out_rows)
         save_path = filedialog.asksaveasfilename(defaultextension='.xlsx', title="Сохранить отгрузку WB", filetypes=[('Excel','*.xlsx')])
         if not save_path: return
         try:
-            df_out.to_excel(save_path, index=False)
-            wb = load_workbook(save_path)
-            ws = wb.active
-            for row in ws.iter_rows(min_row=1, max_row=1):
-                for cell in row:
-                    cell.font = Font(bold=False)
-            for row in ws.iter_rows():
-                for cell in row:
-                    cell.border = None
-            wb.save(save_path)
+            # Один проход: строки пишутся сразу без жирного заголовка и рамок
+            shipment_writer.write_wb(save_path, self.session, tpl, self._route_order())
             messagebox.showinfo("Готово", f"WB отгрузка сохранена в {os.path.basename(save_path)}")
         except Exception as e:
             winsound.Beep(1000,200)
             messagebox.showerror("Ошибка", f"Не удалось сохранить WB файл:\n{e}")
 
     def ship_ozon(self):
-        if not self.packages:
+        if not self.session.boxes:
             messagebox.showwarning("Пусто", "Нет данных для отгрузки Ozon.")
             return
         tpl_path = filedialog.askopenfilename(title="Загрузить шаблон Ozon", filetypes=[('Excel','*.xlsx')])
         if not tpl_path: return
         try:
-            tpl = pd.read_excel(tpl_path, dtype=str)
-            required = ['ШК товара','Артикул товара','Кол-во товаров','Зона размещения','ШК ГМ','Тип ГМ (не обязательно)','Срок годности ДО в формате YYYY-MM-DD (не более 1 СГ на 1 SKU в 1 ГМ)']
-            missing = [col for col in required if col not in tpl.columns]
-            if missing:
-                raise ValueError(f"Шаблон должен содержать колонки: {', '.join(missing)}")
+            tpl = self._read_template(tpl_path)
+            shipment_writer.check_template(tpl, shipment_writer.OZON_COLUMNS)
         except Exception as e:
             winsound.Beep(1000,200)
             messagebox.showerror("Ошибка шаблона", str(e))
             return
-        boxes = list(self.packages.keys())
-
-        article_to_gtin = {art:gt for gt,art in self.gtin_map.items()} if self.gtin_map is not None else {}
-        out_rows = []
-        for idx, box in enumerate(boxes):
-            if idx >= len(tpl):
-                break
-            row = tpl.iloc[idx]
-            sku = row['ШК товара']
-            zone = row['Зона размещения']
-            gm_code = row['ШК ГМ']
-            gm_type = row.get('Тип ГМ', '')
-            shelf = row['Срок годности ДО в формате YYYY-MM-DD (не более 1 СГ на 1 SKU в 1 ГМ)']
-            for art, cnt in self.packages[box].items():
-                if cnt > 0:
-                    barcode = article_to_gtin.get(art, art)
-                    out_rows.append({
-                        'ШК товара': barcode,
-                        'Артикул товара': art,
-                        'Кол-во товаров': cnt,
-                        'Зона размещения': zone,
-                        'ШК ГМ': gm_code,
-                        'Тип ГМ (не обязательно)': gm_type,
-                        'Срок годности ДО в формате YYYY-MM-DD (не более 1 СГ на 1 SKU в 1 ГМ)': shelf
-                    })
-        df_out = pd.DataFrame(out_rows)
         save_path = filedialog.asksaveasfilename(defaultextension='.xlsx', title="Сохранить отгрузку Ozon", filetypes=[('Excel','*.xlsx')])
         if not save_path: return
         try:
-            df_out.to_excel(save_path, index=False)
+            shipment_writer.write_ozon(save_path, self.session, tpl, self._route_order())
             messagebox.showinfo("Готово", f"Ozon отгрузка сохранена в {os.path.basename(save_path)}")
         except Exception as e:
             winsound.Beep(1000,200)
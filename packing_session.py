@@ -0,0 +1,400 @@
+"""Ядро упаковки без интерфейса: лист заказа, GTIN-сопоставления, коробки и склад.
+
+Модуль не зависит от tkinter/winsound, поэтому его можно использовать
+без окна: из тестов, нагрузочных скриптов и пакетной обработки.
+"""
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+# Коды результатов операций
+OK = 'ok'
+NOT_READY = 'not_ready'
+UNKNOWN_GTIN = 'unknown_gtin'
+UNKNOWN_ARTICLE = 'unknown_article'
+EXCEEDED = 'exceeded'
+INVALID_QUANTITY = 'invalid_quantity'
+OUT_OF_STOCK = 'out_of_stock'
+UNKNOWN_BOX = 'unknown_box'
+NO_CONNECTION = 'no_connection'
+
+# Начальная ёмкость матрицы коробок, дальше растёт удвоением
+INITIAL_BOXES = 16
+
+# Версия формата сохранённой сессии (to_dict/save)
+SESSION_FORMAT = 1
+
+# status - один из кодов выше; level - 'info'/'warning'/'error' для интерфейса
+ScanResult = namedtuple('ScanResult', 'status article title message level')
+
+
+def _result(status, article=None, title="", message="", level='error'):
+    return ScanResult(status, article, title, message, level)
+
+
+class PackingSession:
+    def __init__(self, storage=None):
+        self.storage = storage   # WarehouseStorage или None
+        self.gtin_map = None     # GtinCatalog: gtin <-> article
+        self.journal = None      # ScanJournal или None
+        self.articles = []       # id -> артикул (в порядке листа)
+        self.article_ids = {}    # артикул -> id
+        self.quantities = np.zeros(0, dtype=np.int32)  # id -> количество по листу
+        self.scanned = np.zeros(0, dtype=np.int32)     # id -> сумма по всем коробкам
+        self.total_remaining = 0
+        self.boxes = []          # имена коробок в порядке добавления
+        self._box_rows = {}      # имя -> строка матрицы counts
+        self._box_totals = np.zeros(0, dtype=np.int32)
+        self.counts = np.zeros((0, 0), dtype=np.int32)  # коробки x артикулы
+        self.targets = {}        # план: имя коробки -> (id артикулов, количества)
+        self.loaded = False
+
+    @property
+    def storage_enabled(self):
+        return bool(self.storage and self.storage.enabled)
+
+    def load_sheet(self, articles, quantities):
+        """Установка листа заказа; артикулы получают целочисленные id, коробки сбрасываются"""
+        self.articles = list(articles)
+        self.article_ids = {art: i for i, art in enumerate(self.articles)}
+        self.quantities = np.asarray(quantities, dtype=np.int32)
+        self.scanned = np.zeros(len(self.articles), dtype=np.int32)
+        self.total_remaining = int(self.quantities.sum())
+        self.boxes = []
+        self._box_rows = {}
+        self._box_totals = np.zeros(INITIAL_BOXES, dtype=np.int32)
+        self.counts = np.zeros((INITIAL_BOXES, len(self.articles)), dtype=np.int32)
+        self.targets = {}
+        self.loaded = True
+        if self.journal:
+            self.journal.snapshot(self)
+
+    def set_gtin_map(self, gtin_map):
+        self.gtin_map = gtin_map
+
+    # --- Сохранение ---
+
+    def to_dict(self):
+        """Лист заказа и содержимое коробок в виде, пригодном для JSON"""
+        return {
+            'format': SESSION_FORMAT,
+            'articles': self.articles,
+            'quantities': self.quantities.tolist(),
+            'boxes': [self._box_dict(box) for box in self.boxes],
+        }
+
+    def _box_dict(self, box):
+        data = {'name': box, 'items': dict(self.box_items(box))}
+        if self.box_target_total(box):
+            data['target'] = dict(self.box_target_items(box))
+        return data
+
+    def restore(self, data):
+        """Состояние из to_dict(). Склад не меняется: остатки списаны ещё при упаковке"""
+        if data.get('format') != SESSION_FORMAT:
+            raise ValueError(f"Неподдерживаемый формат сессии: {data.get('format')!r}")
+        # Сначала проверка, чтобы ошибка не оставила сессию наполовину загруженной
+        known = set(data['articles'])
+        names = [box['name'] for box in data['boxes']]
+        if len(set(names)) != len(names) or not all(names):
+            raise ValueError("Имена коробок в сессии пустые или повторяются.")
+        for box in data['boxes']:
+            unknown = [art for art in (*box['items'], *box.get('target', ())) if art not in known]
+            if unknown:
+                raise ValueError(f"Артикул {unknown[0]} из коробки {box['name']} не найден в листе.")
+
+        journal, self.journal = self.journal, None
+        try:
+            self.load_sheet(data['articles'], data['quantities'])
+            for box in data['boxes']:
+                self.add_box(box['name'])
+                row = self._box_rows[box['name']]
+                for art, cnt in box['items'].items():
+                    self._add(row, self.article_ids[art], int(cnt))
+                target = box.get('target')
+                if target:
+                    self.targets[box['name']] = (
+                        np.array([self.article_ids[art] for art in target], dtype=np.intp),
+                        np.array(list(target.values()), dtype=np.int32))
+        finally:
+            self.journal = journal
+        if journal:
+            journal.snapshot(self)
+
+    def apply_record(self, record):
+        """Повтор записи журнала (см. scan_journal); склад не меняется"""
+        op = record[0]
+        if op == 'c':
+            box, article, delta = record[1:]
+            self._add(self._box_rows[box], self.article_ids[article], delta)
+        elif op == 'a':
+            self.add_box(record[1])
+        elif op == 'r':
+            self.rename_box(record[1], record[2])
+        elif op == 'd':
+            self.delete_box(record[1])
+        else:
+            raise ValueError(f"Неизвестная запись журнала: {record!r}")
+
+    def _log(self, *record):
+        if self.journal:
+            self.journal.record(self, record)
+
+    def save(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, storage=None):
+        session = cls(storage)
+        with open(path, 'r', encoding='utf-8') as f:
+            session.restore(json.load(f))
+        return session
+
+    # --- Коробки ---
+
+    def add_box(self, name):
+        if not self.loaded or not name or name in self._box_rows:
+            return False
+        row = len(self.boxes)
+        if row == len(self.counts):
+            # Удваиваем ёмкость, чтобы добавление коробки было амортизированно O(1)
+            self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)])
+            self._box_totals = np.concatenate([self._box_totals, np.zeros_like(self._box_totals)])
+        self._box_rows[name] = row
+        self.boxes.append(name)
+        self._log('a', name)
+        return True
+
+    def rename_box(self, old, new):
+        if not new or new in self._box_rows or old not in self._box_rows:
+            return False
+        self._box_rows[new] = self._box_rows.pop(old)
+        if old in self.targets:
+            self.targets[new] = self.targets.pop(old)
+        self.boxes[self.boxes.index(old)] = new
+        self._log('r', old, new)
+        return True
+
+    def delete_box(self, name):
+        row = self._box_rows.pop(name, None)
+        if row is None:
+            return False
+        self.scanned -= self.counts[row]
+        self.total_remaining += int(self._box_totals[row])
+        # Последняя занятая строка переезжает на место удалённой
+        last = len(self.boxes) - 1
+        if row != last:
+            moved = next(b for b, r in self._box_rows.items() if r == last)
+            self._box_rows[moved] = row
+            self.counts[row] = self.counts[last]
+            self._box_totals[row] = self._box_totals[last]
+        self.counts[last] = 0
+        self._box_totals[last] = 0
+        self.boxes.remove(name)
+        self.targets.pop(name, None)
+        self._log('d', name)
+        return True
+
+    def box_items(self, box, order=None):
+        """Ненулевое содержимое коробки: (артикул, количество) в порядке листа
+        или в порядке order (массив id артикулов, например маршрут сборки)"""
+        row = self.counts[self._box_rows[box]]
+        ids = np.flatnonzero(row) if order is None else order[row[order] != 0]
+        for i in ids:
+            yield self.articles[i], int(row[i])
+
+    def box_table(self, order=None):
+        """Ненулевое содержимое всех коробок в длинном формате - три массива
+        одной длины: номер коробки в self.boxes, id артикула, количество.
+        Коробки идут в порядке self.boxes, внутри коробки - порядок листа
+        или порядок order, как в box_items."""
+        n = len(self.boxes)
+        row_box = np.empty(n, dtype=np.intp)
+        row_box[[self._box_rows[box] for box in self.boxes]] = np.arange(n)
+        rows, ids = np.nonzero(self.counts[:n])
+        quantities = self.counts[rows, ids]
+        boxes = row_box[rows]
+        if order is None:
+            # nonzero уже идёт по строкам матрицы, осталось упорядочить коробки
+            sort = np.argsort(boxes, kind='stable')
+        else:
+            rank = np.full(len(self.articles), -1, dtype=np.intp)
+            rank[order] = np.arange(len(order))
+            keep = rank[ids] >= 0
+            boxes, ids, quantities = boxes[keep], ids[keep], quantities[keep]
+            sort = np.lexsort((rank[ids], boxes))
+        return boxes[sort], ids[sort].astype(np.intp), quantities[sort]
+
+    def box_counts(self, box):
+        """Количества по всем артикулам в коробке (массив в порядке листа)"""
+        row = self._box_rows.get(box)
+        if row is None:
+            return np.zeros(len(self.articles), dtype=np.int32)
+        return self.counts[row]
+
+    def box_total(self, box):
+        row = self._box_rows.get(box)
+        return 0 if row is None else int(self._box_totals[row])
+
+    # --- План коробок ---
+
+    def box_targets(self, box):
+        """Плановые количества по всем артикулам в коробке (массив в порядке листа)"""
+        target = np.zeros(len(self.articles), dtype=np.int32)
+        if box in self.targets:
+            ids, quantities = self.targets[box]
+            target[ids] = quantities
+        return target
+
+    def box_target_items(self, box):
+        ids, quantities = self.targets[box]
+        for i, cnt in sorted(zip(ids.tolist(), quantities.tolist())):
+            yield self.articles[i], cnt
+
+    def box_target_total(self, box):
+        return int(self.targets[box][1].sum()) if box in self.targets else 0
+
+    def unplanned_counts(self):
+        """Сколько единиц ещё не разложено и не входит в план ни одной коробки"""
+        outstanding = np.zeros(len(self.articles), dtype=np.int64)
+        for box, (ids, quantities) in self.targets.items():
+            scanned = self.counts[self._box_rows[box], ids]
+            np.add.at(outstanding, ids, np.maximum(quantities - scanned, 0))
+        return np.maximum(self.remaining_counts() - outstanding, 0)
+
+    def apply_plan(self, contents, prefix="План-"):
+        """Новые коробки с плановыми количествами.
+
+        contents - по одной паре (id артикулов, количества) на коробку.
+        Возвращает имена созданных коробок.
+        """
+        names, number = [], 1
+        journal, self.journal = self.journal, None
+        try:
+            for ids, quantities in contents:
+                while f"{prefix}{number:03d}" in self._box_rows:
+                    number += 1
+                name = f"{prefix}{number:03d}"
+                self.add_box(name)
+                self.targets[name] = (np.asarray(ids, dtype=np.intp),
+                                      np.asarray(quantities, dtype=np.int32))
+                names.append(name)
+        finally:
+            self.journal = journal
+        # План не пишется в журнал по записям: сохраняем его снимком
+        if journal and names:
+            journal.snapshot(self)
+        return names
+
+    # --- Счётчики ---
+
+    def quantity(self, article):
+        i = self.article_ids.get(article)
+        return 0 if i is None else int(self.quantities[i])
+
+    def total_scanned(self, article):
+        """Сколько единиц артикула разложено по всем коробкам"""
+        i = self.article_ids.get(article)
+        return 0 if i is None else int(self.scanned[i])
+
+    def remaining(self, article):
+        i = self.article_ids.get(article)
+        return 0 if i is None else int(self.quantities[i] - self.scanned[i])
+
+    def remaining_counts(self):
+        return self.quantities - self.scanned
+
+    def box_count(self, box, article):
+        row = self._box_rows.get(box)
+        i = self.article_ids.get(article)
+        if row is None or i is None:
+            return 0
+        return int(self.counts[row, i])
+
+    # --- Операции ---
+
+    def lookup(self, gtin):
+        """GTIN -> артикул или None"""
+        if not self.gtin_map:
+            return None
+        return self.gtin_map.get(gtin)
+
+    def _add(self, row, i, delta):
+        self.counts[row, i] += delta
+        self.scanned[i] += delta
+        self._box_totals[row] += delta
+        self.total_remaining -= delta
+
+    def scan(self, gtin, box):
+        """Учёт одной отсканированной единицы в коробке box"""
+        row = self._box_rows.get(box)
+        if not self.loaded or row is None or not self.gtin_map:
+            return _result(NOT_READY, None, "Внимание",
+                           "Загрузите данные и выберите коробку.", 'warning')
+        article = self.lookup(gtin)
+        if article is None:
+            return _result(UNKNOWN_GTIN, None, "Не найден GTIN",
+                           f"GTIN {gtin} отсутствует.", 'warning')
+        i = self.article_ids.get(article)
+        if i is None:
+            return _result(UNKNOWN_ARTICLE, article, "Ошибка данных",
+                           f"Артикул {article} не найден в листе.")
+        allowed = int(self.quantities[i])
+        used = int(self.scanned[i])
+        if allowed - used <= 0:
+            return _result(EXCEEDED, article, "Превышено",
+                           f"Доступно {allowed}, использовано {used}")
+
+        # Проверяем наличие на складе и списываем единицу одной операцией
+        # (в памяти или на общем сервере склада; запись в таблицу идёт в фоне)
+        if self.storage_enabled:
+            reserved = self.storage.reserve(article)
+            if reserved is None:
+                return self._no_connection(article)
+            if not reserved:
+                return _result(OUT_OF_STOCK, article, "Недостаточно на складе",
+                               f"Товар {article} отсутствует на складе", 'warning')
+
+        self._add(row, i, 1)
+        self._log('c', box, article, 1)
+        return _result(OK, article, level='info')
+
+    def _no_connection(self, article):
+        return _result(NO_CONNECTION, article, "Нет связи со складом",
+                       f"Сервер склада недоступен ({self.storage.inventory_error}), "
+                       f"товар {article} не учтён.")
+
+    def set_quantity(self, box, article, n):
+        """Ручная установка количества артикула в коробке"""
+        row = self._box_rows.get(box)
+        if row is None:
+            return _result(UNKNOWN_BOX, article, "Внимание", "Выберите коробку.", 'warning')
+        i = self.article_ids.get(article)
+        if i is None:
+            return _result(UNKNOWN_ARTICLE, article, "Ошибка данных",
+                           f"Артикул {article} не найден в листе.")
+        if n < 0:
+            return _result(INVALID_QUANTITY, article, "Ошибка данных",
+                           f"Количество не может быть отрицательным: {n}")
+        current = int(self.counts[row, i])
+        allowed = int(self.quantities[i])
+        other = int(self.scanned[i]) - current
+        if n + other > allowed:
+            return _result(EXCEEDED, article, "Превышено",
+                           f"Всего доступно {allowed}, в других коробках {other}")
+
+        # Обновляем склад при изменении количества
+        if self.storage_enabled:
+            difference = current - n  # Разница: положительная = возвращаем на склад
+            if difference != 0 and not self.storage.update_article_quantity(article, difference):
+                return self._no_connection(article)
+
+        if n != current:
+            self._add(row, i, n - current)
+            self._log('c', box, article, n - current)
+        return _result(OK, article, level='info')
@@ -0,0 +1,103 @@
+"""Кэш разобранных Excel-файлов по хешу содержимого.
+
+Повторная загрузка того же файла (лист заказа, GTIN-таблица, шаблон WB/Ozon)
+берёт готовый результат из бинарного файла вместо разбора xlsx. Ключ -
+хеш содержимого, имя и версия парсера и библиотека разбора, поэтому
+переименованный файл всё равно попадает в кэш, а изменённый парсер или
+другая библиотека (calamine/openpyxl) не получат старый результат.
+Повреждённая или несовместимая запись удаляется, файл разбирается заново.
+Размер кэша ограничен, вытесняются давно не использованные записи.
+"""
+import hashlib
+import os
+import pickle
+
+CACHE_DIR = os.path.expanduser('~/.warehouse_packer_cache')
+MAX_BYTES = 256 * 1024 * 1024
+
+
+def file_digest(path):
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ParseCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0    # размер исходных файлов, которые не пришлось разбирать
+
+    def load(self, path, parser, version, parse, engine=None):
+        """Результат parse(path) из кэша или после разбора; engine - чем
+        разбирается файл (excel_ingest.engine), входит в ключ"""
+        key = f"{file_digest(path)}-{parser}-{version}"
+        if engine:
+            key += f"-{engine}"
+        entry = os.path.join(self.directory, key + '.pkl')
+        try:
+            with open(entry, 'rb') as f:
+                result = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            # Обрезанный файл, другая версия Python/NumPy и т.п.: запись не нужна
+            try:
+                os.remove(entry)
+            except OSError:
+                pass
+        else:
+            os.utime(entry)  # время доступа для вытеснения
+            self.hits += 1
+            self.bytes_saved += os.path.getsize(path)
+            return result
+
+        self.misses += 1
+        result = parse(path)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = entry + '.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, entry)
+            self.evict()
+        except OSError as e:
+            print(f"Не удалось сохранить кэш разбора: {e}")
+        return result
+
+    def entries(self):
+        """Записи кэша (путь, размер, время доступа), старые первыми"""
+        if not os.path.isdir(self.directory):
+            return []
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                entry = os.path.join(self.directory, name)
+                st = os.stat(entry)
+                found.append((entry, st.st_size, st.st_mtime))
+        return sorted(found, key=lambda e: e[2])
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for entry, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(entry)
+            total -= size
+
+    def clear(self):
+        for entry, _, _ in self.entries():
+            os.remove(entry)
+
+    def stats_text(self):
+        return (f"Попаданий: {self.hits}, промахов: {self.misses}\n"
+                f"Не разобрано повторно: {self.bytes_saved / 1e6:.1f} МБ\n"
+                f"Размер кэша: {self.size() / 1e6:.1f} из {self.max_bytes / 1e6:.0f} МБ")
@@ -0,0 +1,222 @@
+"""Маршрут сборки: порядок артикулов листа по ячейкам склада.
+
+Код ячейки разбирается в координаты по схеме склада (файл LAYOUT_FILE,
+JSON): регулярное выражение с группами zone, rack и shelf, порядок зон и
+расстояния. Стеллаж (rack) - проход, полка (shelf) - место вдоль прохода.
+Расстояние между ячейками - как для склада с параллельными проходами:
+в одном проходе - вдоль него, в разных - через ближайший конец прохода.
+
+Маршрут строится один раз на лист: змейка по проходам (чётные проходы -
+вперёд, нечётные - назад), затем улучшение 2-opt в окне WINDOW соседних
+ячеек. При смене ячеек на складе маршрут не пересчитывается целиком:
+артикул переносится в уже посещаемую ячейку или новая ячейка вставляется
+в самое дешёвое место маршрута. Артикулы без ячейки идут в конце в
+порядке листа.
+
+Модуль не зависит от tkinter.
+"""
+import json
+import os
+import re
+
+import numpy as np
+
+LAYOUT_FILE = os.path.expanduser('~/.warehouse_pick_layout.json')
+DEFAULT_LAYOUT = {
+    # A-01-01, B 2 14, С-03-02 ...
+    'pattern': r'^\s*(?P<zone>[^\W\d_]+)[\s.-]*(?P<rack>\d+)[\s.-]*(?P<shelf>\d+)',
+    'zones': [],            # порядок обхода зон; остальные - после них по мере появления
+    'rack_spacing': 3.0,    # м между соседними проходами
+    'shelf_length': 1.0,    # м вдоль прохода на одну полку
+    'zone_spacing': 200.0,  # м между началами соседних зон
+}
+# Сколько соседних ячеек рассматривает 2-opt и сколько проходов делает
+WINDOW = 40
+MAX_PASSES = 3
+
+
+class Layout:
+    def __init__(self, settings=None):
+        settings = dict(DEFAULT_LAYOUT, **(settings or {}))
+        self.pattern = re.compile(settings['pattern'])
+        missing = {'zone', 'rack', 'shelf'} - set(self.pattern.groupindex)
+        if missing:
+            raise ValueError(f"В шаблоне ячейки нет групп: {', '.join(sorted(missing))}")
+        self.zones = {str(zone).upper(): i for i, zone in enumerate(settings['zones'])}
+        self.rack_spacing = float(settings['rack_spacing'])
+        self.shelf_length = float(settings['shelf_length'])
+        self.zone_spacing = float(settings['zone_spacing'])
+
+    def parse(self, cell):
+        """Код ячейки -> (зона, стеллаж, полка) или None"""
+        match = self.pattern.match(cell or "")
+        if not match:
+            return None
+        return match['zone'].upper(), int(match['rack']), int(match['shelf'])
+
+    def zone_index(self, zone):
+        if zone not in self.zones:
+            # Новые зоны - после известных, в порядке появления
+            self.zones[zone] = len(self.zones)
+        return self.zones[zone]
+
+    def coordinates(self, parsed):
+        """[(зона, стеллаж, полка)] -> массивы x (проход) и y (вдоль прохода), м"""
+        if not parsed:
+            return np.zeros(0), np.zeros(0)
+        x = np.array([self.zone_index(zone) * self.zone_spacing + rack * self.rack_spacing
+                      for zone, rack, _ in parsed])
+        y = np.array([shelf * self.shelf_length for _, _, shelf in parsed], dtype=float)
+        return x, y
+
+
+def load_layout(path=LAYOUT_FILE):
+    """Схема склада из файла; без файла - схема по умолчанию"""
+    if not os.path.exists(path):
+        return Layout()
+    with open(path, 'r', encoding='utf-8') as f:
+        return Layout(json.load(f))
+
+
+def distance(xa, ya, xb, yb, length):
+    """Путь между ячейками; length - длина прохода (выход с обоих концов)"""
+    around = np.minimum(ya + yb, 2 * length - ya - yb)
+    return np.abs(xa - xb) + np.where(xa == xb, np.abs(ya - yb), around)
+
+
+def serpentine(x, y):
+    """Индексы ячеек змейкой: проходы по возрастанию x, направление чередуется"""
+    aisle = np.unique(x, return_inverse=True)[1]
+    along = np.where(aisle % 2 == 0, y, -y)
+    return np.lexsort((along, x))
+
+
+def two_opt(route, x, y, length, window=WINDOW, passes=MAX_PASSES):
+    """Улучшение открытого маршрута разворотами отрезков длиной до window"""
+    route = np.array(route)
+    n = len(route)
+    for _ in range(passes):
+        improved = False
+        for i in range(n - 2):
+            j = np.arange(i + 2, min(n - 1, i + window + 1))
+            if not len(j):
+                break
+            a, b = route[i], route[i + 1]
+            c, d = route[j], route[j + 1]
+            # Выигрыш от замены рёбер a-b и c-d на a-c и b-d
+            gain = (distance(x[a], y[a], x[b], y[b], length)
+                    + distance(x[c], y[c], x[d], y[d], length)
+                    - distance(x[a], y[a], x[c], y[c], length)
+                    - distance(x[b], y[b], x[d], y[d], length))
+            best = int(np.argmax(gain))
+            if gain[best] > 1e-9:
+                k = j[best]
+                route[i + 1:k + 1] = route[i + 1:k + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return route
+
+
+class PickRoute:
+    """Порядок обхода ячеек и артикулов листа"""
+
+    def __init__(self, layout=None):
+        self.layout = layout or Layout()
+        self.count = 0            # артикулов в листе
+        self.cells = []           # ячейки в порядке обхода
+        self.groups = {}          # ячейка -> множество id артикулов
+        self.article_cell = {}    # id -> ячейка на маршруте
+        self.xy = {}              # ячейка -> (x, y)
+        self.length = 0.0         # длина прохода
+        self.order = np.zeros(0, dtype=np.intp)     # id артикулов в порядке маршрута
+        self.position = np.zeros(0, dtype=np.intp)  # id -> место в маршруте
+
+    def build(self, articles, cell_of):
+        """Маршрут для листа; cell_of(article) -> код ячейки или пустая строка"""
+        self.count = len(articles)
+        self.groups, self.article_cell, self.xy = {}, {}, {}
+        for i, art in enumerate(articles):
+            cell = (cell_of(art) or "").strip()
+            if cell and self._locate(cell):
+                self.groups.setdefault(cell, set()).add(i)
+                self.article_cell[i] = cell
+        cells = list(self.groups)
+        x, y = self._arrays(cells)
+        self.length = float(y.max()) + self.layout.shelf_length if len(y) else 0.0
+        route = two_opt(serpentine(x, y), x, y, self.length)
+        self.cells = [cells[k] for k in route]
+        self._update_order()
+
+    def update(self, ids, articles, cell_of):
+        """Учесть новые ячейки артикулов ids; True, если порядок изменился"""
+        changed = False
+        for i in ids:
+            cell = (cell_of(articles[i]) or "").strip()
+            if cell and not self._locate(cell):
+                cell = ""
+            old = self.article_cell.get(i)
+            if (old or "") == cell:
+                continue
+            changed = True
+            if old:
+                group = self.groups[old]
+                group.discard(i)
+                if not group:
+                    del self.groups[old]
+                    self.cells.remove(old)
+                del self.article_cell[i]
+            if cell:
+                if cell not in self.groups:
+                    self.groups[cell] = set()
+                    self._insert(cell)
+                self.groups[cell].add(i)
+                self.article_cell[i] = cell
+        if changed:
+            self._update_order()
+        return changed
+
+    def _locate(self, cell):
+        """Координаты ячейки в self.xy; False, если код не разобрать"""
+        if cell not in self.xy:
+            parsed = self.layout.parse(cell)
+            if parsed is None:
+                return False
+            x, y = self.layout.coordinates([parsed])
+            self.xy[cell] = (float(x[0]), float(y[0]))
+        return True
+
+    def _arrays(self, cells):
+        if not cells:
+            return np.zeros(0), np.zeros(0)
+        x, y = zip(*(self.xy[cell] for cell in cells))
+        return np.array(x), np.array(y)
+
+    def _insert(self, cell):
+        """Вставка ячейки в самое дешёвое место маршрута"""
+        cx, cy = self.xy[cell]
+        self.length = max(self.length, cy + self.layout.shelf_length)
+        if not self.cells:
+            self.cells.append(cell)
+            return
+        x, y = self._arrays(self.cells)
+        to_cell = distance(x, y, cx, cy, self.length)
+        # Между соседями k и k+1, либо в начало или конец маршрута
+        between = to_cell[:-1] + to_cell[1:] - distance(x[:-1], y[:-1], x[1:], y[1:], self.length)
+        costs = np.concatenate([[to_cell[0]], between, [to_cell[-1]]])
+        self.cells.insert(int(np.argmin(costs)), cell)
+
+    def _update_order(self):
+        routed = [sorted(self.groups[cell]) for cell in self.cells]
+        on_route = np.zeros(self.count, dtype=bool)
+        order = [i for group in routed for i in group]
+        on_route[order] = True
+        self.order = np.concatenate([np.array(order, dtype=np.intp),
+                                     np.flatnonzero(~on_route)]).astype(np.intp)
+        self.position = np.empty(self.count, dtype=np.intp)
+        self.position[self.order] = np.arange(self.count)
+
+    def walk_length(self):
+        """Длина маршрута по ячейкам, м"""
+        x, y = self._arrays(self.cells)
+        return float(distance(x[:-1], y[:-1], x[1:], y[1:], self.length).sum()) if len(x) > 1 else 0.0
@@ -0,0 +1,67 @@
+"""Очередь приёма сканов.
+
+Сканер присылает коды пачками, как быстрый ввод с клавиатуры. Окно только
+кладёт код в очередь (вместе с коробкой, выбранной в момент скана) и не
+ждёт ни обработки, ни перерисовки. Очередь разбирается по порядку через
+PackingSession один раз за пачку; ошибки не показываются диалогами, а
+копятся в списке для строки состояния. Если сервер склада недоступен,
+остаток пачки не отправляется: каждый код ждал бы таймаута связи, поэтому
+такие коды сразу уходят в ошибки и их нужно отсканировать заново.
+
+Модуль не зависит от tkinter: его используют окно и бенчмарк.
+"""
+import time
+from collections import deque, namedtuple
+
+import metrics
+from packing_session import NO_CONNECTION, OK
+
+# Задержка разбора после первого кода пачки: один кадр
+FLUSH_DELAY_MS = 16
+# Сколько последних ошибок хранить для списка в окне
+ERROR_LOG_SIZE = 200
+
+ScanError = namedtuple('ScanError', 'time code box status title message level')
+
+
+class ScanIntake:
+    def __init__(self, session):
+        self.session = session
+        self.pending = deque()                        # (код, коробка) в порядке прихода
+        self.errors = deque(maxlen=ERROR_LOG_SIZE)    # последние ошибки, новые в конце
+        self.accepted = 0                             # принятых сканов всего
+
+    def push(self, code, box):
+        self.pending.append((code, box))
+
+    def drain(self):
+        """Разобрать все накопленные коды по порядку.
+
+        Возвращает (отсортированные id изменившихся артикулов, новые ошибки).
+        """
+        session = self.session
+        changed, errors = set(), []
+        while self.pending:
+            code, box = self.pending.popleft()
+            if metrics.ENABLED:
+                start = time.perf_counter()
+                result = session.scan(code, box)
+                metrics.observe('scan', time.perf_counter() - start, result.status != OK)
+            else:
+                result = session.scan(code, box)
+            if result.status == OK:
+                changed.add(session.article_ids[result.article])
+                self.accepted += 1
+            else:
+                errors.append(ScanError(time.time(), code, box, result.status, result.title,
+                                        result.message, result.level))
+                if result.status == NO_CONNECTION:
+                    while self.pending:
+                        code, box = self.pending.popleft()
+                        errors.append(ScanError(time.time(), code, box, NO_CONNECTION, result.title,
+                                                "не обработан: нет связи со складом", 'error'))
+        self.errors.extend(errors)
+        return sorted(changed), errors
+
+    def clear_errors(self):
+        self.errors.clear()
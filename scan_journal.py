@@ -0,0 +1,175 @@
+"""Журнал упаковки для восстановления после сбоя.
+
+Каждое изменение сессии (скан, правка количества, добавление/переименование/
+удаление коробки) дописывается строкой JSON в journal-<поколение>.log.
+Строка сразу уходит в ОС, а fsync делается пачками - раз в FSYNC_BATCH
+записей или FSYNC_INTERVAL секунд. Накопив SNAPSHOT_EVERY записей,
+журнал уплотняется по таймеру окна (maintain), а не в обработке скана:
+состояние сессии копируется, новые записи сразу идут в журнал следующего
+поколения, а snapshot.json с этим номером поколения пишется в фоновом
+потоке. При восстановлении повторяются все журналы, начиная с поколения
+снимка, поэтому сбой до замены снимка ничего не теряет.
+
+Повтор журнала не трогает склад: остатки списаны ещё во время упаковки.
+"""
+import glob
+import json
+import os
+import re
+import threading
+import time
+
+import metrics
+
+JOURNAL_DIR = os.path.expanduser('~/.warehouse_packer_journal')
+FSYNC_BATCH = 64
+FSYNC_INTERVAL = 1.0
+SNAPSHOT_EVERY = 5000
+
+
+class ScanJournal:
+    def __init__(self, directory=JOURNAL_DIR):
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, 'snapshot.json')
+        self.generation = 0
+        self._file = None
+        self._records = 0      # записей после последнего снимка
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._worker = None    # поток фонового снимка
+
+    def _journal_path(self, generation):
+        return os.path.join(self.directory, f'journal-{generation}.log')
+
+    def exists(self):
+        """Есть ли сохранённая сессия для восстановления"""
+        return os.path.exists(self.snapshot_path)
+
+    def record(self, session, record):
+        if self._file is None:
+            return
+        try:
+            self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+            self._file.flush()
+            self._records += 1
+            self._unsynced += 1
+            # Уплотнение при SNAPSHOT_EVERY - в maintain, не здесь
+            if (self._unsynced >= FSYNC_BATCH
+                    or time.monotonic() - self._last_sync >= FSYNC_INTERVAL):
+                self.sync()
+        except OSError as e:
+            print(f"Ошибка записи журнала упаковки: {e}")
+
+    def sync(self):
+        """fsync накопленных записей; окно вызывает его и по таймеру"""
+        if self._file is not None and self._unsynced:
+            with metrics.timer('journal_fsync'):
+                os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def maintain(self, session):
+        """Работа по таймеру окна: fsync хвоста и, когда пора, уплотнение в фоне"""
+        self.sync()
+        if self._file is not None and self._records >= SNAPSHOT_EVERY and not self._busy():
+            self.snapshot(session, background=True)
+
+    def _busy(self):
+        return self._worker is not None and self._worker.is_alive()
+
+    def _wait(self):
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+    def snapshot(self, session, background=False):
+        """Полный снимок сессии и новый пустой журнал (уплотнение).
+
+        background - записать снимок в фоновом потоке; копия состояния и
+        переключение журнала всё равно делаются сразу.
+        """
+        self._wait()
+        generation = self.generation + 1
+        state = {'generation': generation, 'session': session.to_dict()}
+        os.makedirs(self.directory, exist_ok=True)
+        self.close()
+        self.generation = generation
+        self._file = open(self._journal_path(generation), 'a', encoding='utf-8')
+        self._records = 0
+        if background:
+            self._worker = threading.Thread(target=self._write_snapshot, args=(state,),
+                                            name="journal-snapshot", daemon=True)
+            self._worker.start()
+        else:
+            self._write_snapshot(state)
+
+    def _write_snapshot(self, state):
+        tmp = self.snapshot_path + '.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+                f.flush()
+                with metrics.timer('journal_snapshot'):
+                    os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+            # Журналы до поколения снимка уже учтены в нём
+            self._remove_journals(before=state['generation'])
+        except OSError as e:
+            # Старый снимок и все журналы остаются - восстановление по ним верно
+            print(f"Ошибка записи снимка упаковки: {e}")
+
+    def resume(self, session):
+        """Снимок + хвост журнала -> session; возвращает число повторённых записей"""
+        with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        self.generation = state['generation']
+        records = []
+        for generation in self._journal_generations():
+            if generation < self.generation:
+                continue
+            with open(self._journal_path(generation), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break  # строка, оборванная сбоем при записи
+        journal, session.journal = session.journal, None
+        try:
+            session.restore(state['session'])
+            for record in records:
+                session.apply_record(record)
+        finally:
+            session.journal = journal
+        # Сразу уплотняем: восстановленное состояние становится новым снимком
+        self.snapshot(session)
+        return len(records)
+
+    def close(self):
+        self._wait()
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def clear(self):
+        """Забыть сохранённую сессию"""
+        self.close()
+        self._remove_journals()
+        if os.path.exists(self.snapshot_path):
+            os.remove(self.snapshot_path)
+        self.generation = 0
+
+    def _journal_generations(self):
+        """Номера поколений журналов на диске по возрастанию"""
+        found = []
+        for path in glob.glob(os.path.join(self.directory, 'journal-*.log')):
+            match = re.fullmatch(r'journal-(\d+)\.log', os.path.basename(path))
+            if match:
+                found.append(int(match[1]))
+        return sorted(found)
+
+    def _remove_journals(self, before=None):
+        """Удалить журналы поколений меньше before (все, если None)"""
+        for generation in self._journal_generations():
+            if before is None or generation < before:
+                os.remove(self._journal_path(generation))
@@ -0,0 +1,130 @@
+"""Запись отгрузок WB/Ozon и экспорта коробок в xlsx.
+
+Все три выгрузки строятся по одной схеме: содержимое коробок берётся из
+сессии одной таблицей в длинном формате (коробка, id артикула, количество,
+см. PackingSession.box_table), а остальные столбцы присоединяются к ней
+индексированием массивов: значения шаблона - по номеру коробки, ячейка
+склада и GTIN - по артикулу, причём для каждого артикула они вычисляются
+один раз, сколько бы коробок его ни содержали. Готовые столбцы пишет
+xlsx_writer без жирного заголовка и рамок, как требуют маркетплейсы.
+
+Модуль не зависит от tkinter и используется и окном, и пакетной обработкой.
+"""
+import math
+
+import numpy as np
+
+import metrics
+import xlsx_writer
+
+EXPORT_COLUMNS = ['Артикул товара', 'Кол-во товаров', 'Коробка']
+WB_COLUMNS = ['Баркод товара', 'Кол-во товаров', 'ШК короба', 'Срок годности']
+WB_TEMPLATE_COLUMNS = ['ШК короба', 'Срок годности']
+OZON_SHELF_COLUMN = 'Срок годности ДО в формате YYYY-MM-DD (не более 1 СГ на 1 SKU в 1 ГМ)'
+OZON_COLUMNS = ['ШК товара', 'Артикул товара', 'Кол-во товаров', 'Зона размещения',
+                'ШК ГМ', 'Тип ГМ (не обязательно)', OZON_SHELF_COLUMN]
+# Тип ГМ в шаблоне: заголовок маркетплейса, затем короткое имя
+OZON_GM_TYPE_COLUMNS = [OZON_COLUMNS[5], 'Тип ГМ']
+
+
+def _cell(value):
+    """Пустые значения шаблона (NaN) -> пустая ячейка"""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _barcode(gtin_map, article):
+    return (gtin_map.preferred_gtin(article) if gtin_map else None) or article
+
+
+def check_template(tpl, required):
+    """Ошибка с перечнем колонок, которых нет в шаблоне"""
+    missing = [col for col in required if col not in tpl.columns]
+    if missing:
+        raise ValueError(f"Шаблон должен содержать колонки: {', '.join(missing)}")
+
+
+def _by_article(session, ids, value_of):
+    """Столбец value_of(article) для строк ids; по одному вызову на артикул"""
+    unique, inverse = np.unique(ids, return_inverse=True)
+    values = np.empty(len(unique), dtype=object)
+    values[:] = [value_of(session.articles[i]) for i in unique]
+    return values[inverse]
+
+
+def _by_box(tpl, names, boxes):
+    """Столбец шаблона для строк коробок boxes (номер коробки = номер строки шаблона).
+
+    names - имя колонки или несколько вариантов по приоритету; без колонки - пусто.
+    """
+    names = [names] if isinstance(names, str) else names
+    column = next((name for name in names if name in tpl.columns), None)
+    values = np.empty(len(tpl), dtype=object)
+    if column is not None:
+        values[:] = [_cell(v) for v in tpl[column].tolist()]
+    else:
+        values[:] = ''
+    return values[boxes]
+
+
+def _template_table(session, tpl, order):
+    """Длинная таблица без коробок, которым не хватило строк шаблона"""
+    boxes, ids, counts = session.box_table(order)
+    keep = boxes < len(tpl)
+    return boxes[keep], ids[keep], counts[keep]
+
+
+def export_columns(session, cell_of=None, order=None):
+    """Столбцы экспорта: артикул, количество, коробка [, ячейка склада].
+
+    cell_of(article) -> ячейка или None; без него колонки "Ячейка" нет.
+    order - порядок артикулов внутри коробки (id), по умолчанию порядок листа.
+    """
+    boxes, ids, counts = session.box_table(order)
+    articles = np.array(session.articles, dtype=object)[ids]
+    columns = [articles, counts, np.array(session.boxes, dtype=object)[boxes]]
+    if cell_of is not None:
+        columns.append(_by_article(session, ids, lambda art: cell_of(art) or ""))
+    return columns
+
+
+def wb_columns(session, tpl, order=None):
+    """Столбцы отгрузки WB: i-я коробка получает ШК и срок из i-й строки шаблона"""
+    boxes, ids, counts = _template_table(session, tpl, order)
+    return [_by_article(session, ids, lambda art: _barcode(session.gtin_map, art)), counts,
+            _by_box(tpl, 'ШК короба', boxes), _by_box(tpl, 'Срок годности', boxes)]
+
+
+def ozon_columns(session, tpl, order=None):
+    """Столбцы отгрузки Ozon: зона, ШК ГМ и срок берутся из строки шаблона коробки"""
+    boxes, ids, counts = _template_table(session, tpl, order)
+    return [_by_article(session, ids, lambda art: _barcode(session.gtin_map, art)),
+            np.array(session.articles, dtype=object)[ids], counts,
+            _by_box(tpl, 'Зона размещения', boxes), _by_box(tpl, 'ШК ГМ', boxes),
+            _by_box(tpl, OZON_GM_TYPE_COLUMNS, boxes), _by_box(tpl, OZON_SHELF_COLUMN, boxes)]
+
+
+@metrics.timed('xlsx_write')
+def write_columns(path, columns, data):
+    """Заголовок columns и столбцы data; возвращает число строк данных"""
+    return xlsx_writer.write_sheet(path, columns, data)
+
+
+@metrics.timed('xlsx_write')
+def write_xlsx(path, columns, rows):
+    """Потоковая запись строк (кортежей) любого итератора; возвращает число строк данных"""
+    return xlsx_writer.write_rows(path, columns, rows)
+
+
+def write_export(path, session, cell_of=None, order=None):
+    columns = EXPORT_COLUMNS + (['Ячейка'] if cell_of is not None else [])
+    return write_columns(path, columns, export_columns(session, cell_of, order))
+
+
+def write_wb(path, session, tpl, order=None):
+    return write_columns(path, WB_COLUMNS, wb_columns(session, tpl, order))
+
+
+def write_ozon(path, session, tpl, order=None):
+    return write_columns(path, OZON_COLUMNS, ozon_columns(session, tpl, order))
@@ -0,0 +1,150 @@
+"""Фоновая сверка остатков в памяти с листом Google Sheets.
+
+Раз в RECONCILE_INTERVAL секунд поток читает лист и считает хеши блоков
+по CHUNK_ROWS строк. Разбираются и сливаются только блоки, хеш которых
+изменился с прошлой сверки. Слияние трёхстороннее, по каждому артикулу:
+база - последнее известное содержимое листа (storage.remote), локальное
+значение - storage_data вместе с ещё не записанными изменениями.
+Изменение количества в листе прибавляется к локальному значению, ячейка из
+листа принимается, если локально её не меняли. Сканирование при этом не
+ждёт: чтение листа идёт без блокировки, под ней - только слияние
+изменённых строк.
+"""
+import hashlib
+import json
+import threading
+
+RECONCILE_INTERVAL = 60
+CHUNK_ROWS = 500
+
+
+def parse_storage_rows(values, first_row=1):
+    """Строки листа -> ({article: (количество, ячейка)}, {article: номер строки}).
+
+    values[0] - строка first_row листа; заголовок и пустые строки пропускаются,
+    при повторе артикула берётся последняя строка.
+    """
+    records, rows = {}, {}
+    for row_number, row in enumerate(values, start=first_row):
+        if row_number == 1:
+            continue  # заголовок
+        if len(row) >= 2 and str(row[0]).strip():  # Минимум артикул и количество
+            article = str(row[0]).strip()
+            try:
+                quantity = int(row[1]) if str(row[1]).strip() else 0
+            except ValueError:
+                quantity = 0
+            cell = str(row[2]).strip() if len(row) > 2 else ""
+            records[article] = (quantity, cell)
+            rows[article] = row_number
+    return records, rows
+
+
+def chunk_hashes(values):
+    """Хеши блоков по CHUNK_ROWS строк (заголовок входит в первый блок)"""
+    return [hashlib.blake2b(json.dumps(values[i:i + CHUNK_ROWS], ensure_ascii=False).encode('utf-8'),
+                            digest_size=16).digest()
+            for i in range(0, len(values), CHUNK_ROWS)]
+
+
+class StorageReconciler:
+    def __init__(self, storage, interval=RECONCILE_INTERVAL):
+        self.storage = storage
+        self.interval = interval
+        self.last_error = None
+        self._hashes = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def reset(self, values):
+        """Запомнить содержимое листа, с которым совпадают данные в памяти"""
+        self._hashes = chunk_hashes(values)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="storage-reconcile", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.reconcile()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+
+    def reconcile(self):
+        """Одна сверка; возвращает множество артикулов, изменённых в памяти"""
+        storage = self.storage
+        with storage.lock:
+            generation = storage.write_generation
+        values = storage.fetch_sheet_values()
+        hashes = chunk_hashes(values)
+        changed_chunks = {i for i in range(max(len(hashes), len(self._hashes)))
+                          if i >= len(hashes) or i >= len(self._hashes) or hashes[i] != self._hashes[i]}
+        if not changed_chunks:
+            return set()
+
+        # Разбираем только изменившиеся блоки
+        remote, rows = {}, {}
+        for chunk in sorted(changed_chunks):
+            start = chunk * CHUNK_ROWS
+            part_remote, part_rows = parse_storage_rows(values[start:start + CHUNK_ROWS],
+                                                        first_row=start + 1)
+            remote.update(part_remote)
+            rows.update(part_rows)
+
+        with storage.lock:
+            if storage.write_generation != generation:
+                # Пока читали лист, в него писали: сверим в следующий раз
+                return set()
+            # Артикулы, чьи строки были в изменившихся блоках
+            candidates = set(remote)
+            candidates.update(article for article, row in storage.row_index.items()
+                              if (row - 1) // CHUNK_ROWS in changed_chunks)
+            changed = set()
+            for article in candidates:
+                if self._merge(article, remote.get(article), rows.get(article)):
+                    changed.add(article)
+        self._hashes = hashes
+        storage.notify_changed(changed)
+        return changed
+
+    def _merge(self, article, theirs, row):
+        """Слияние одного артикула (под storage.lock); True, если изменились данные в памяти"""
+        storage = self.storage
+        base = storage.remote.get(article)
+        record = storage.storage_data.get(article)
+        if theirs is None:
+            # Строку удалили из листа
+            storage.row_index.pop(article, None)
+            storage.remote.pop(article, None)
+            if record is None:
+                return False
+            if base is not None and (record.quantity, record.cell) == base:
+                del storage.storage_data[article]
+                storage.dirty.discard(article)
+                return True
+            # Есть локальные изменения: артикул будет дописан заново
+            storage.dirty.add(article)
+            return False
+
+        storage.row_index[article] = row
+        storage.remote[article] = theirs
+        if theirs == base:
+            return False
+        if record is None:
+            if base is not None and article in storage.dirty:
+                return False  # удалён локально, удаление ещё не записано
+            from warehouse_storage import StockRecord
+            storage.storage_data[article] = StockRecord(*theirs)
+            return True
+        base_quantity, base_cell = base if base is not None else (0, "")
+        record.quantity = max(0, record.quantity + theirs[0] - base_quantity)
+        if theirs[1] != base_cell and record.cell == base_cell:
+            record.cell = theirs[1]
+        return True
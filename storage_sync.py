@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import time
+
+# Сколько ждать после первого изменения, чтобы собрать пачку сканов в одну запись
+COALESCE_DELAY = 0.5
+# Паузы между повторами при ошибке записи, секунды
+RETRY_DELAYS = (1, 2, 5, 10, 30)
+
+
+def _merge(into, changes):
+    """Сложить изменения changes в into (article -> {'delta', 'cell'})"""
+    for article, entry in changes.items():
+        merged = into.setdefault(article, {'delta': 0, 'cell': ""})
+        merged['delta'] += entry['delta']
+        merged['cell'] = entry['cell'] or merged['cell']
+    return into
+
+
+class StorageSyncQueue:
+    """Фоновая запись изменений склада в Google Sheets.
+
+    Сканер меняет только данные в памяти и отмечает артикул в очереди;
+    отдельный поток собирает изменения за COALESCE_DELAY и записывает их
+    одним сохранением. Неотправленные изменения хранятся в файле и
+    применяются заново после переподключения.
+    """
+
+    def __init__(self, storage, pending_file=None):
+        self.storage = storage
+        self.pending_file = pending_file or os.path.expanduser('~/.warehouse_storage_pending.json')
+        self.pending = {}         # article -> {'delta': int, 'cell': str}
+        self.in_flight = {}       # то, что записывается прямо сейчас
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._load_pending()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="storage-sync", daemon=True)
+            self._thread.start()
+
+    def push(self, article, delta, cell=""):
+        """Учесть изменение артикула; запись произойдёт в фоне"""
+        with self._lock:
+            _merge(self.pending, {article: {'delta': delta, 'cell': cell}})
+        self.start()
+        self._wakeup.set()
+
+    def pending_count(self):
+        with self._lock:
+            return len(self.pending) + len(self.in_flight)
+
+    def status_text(self):
+        count = self.pending_count()
+        if not count:
+            return ""
+        text = f"Ожидает синхронизации: {count}"
+        if self.last_error:
+            text += f" (ошибка: {self.last_error})"
+        return text
+
+    def restore(self):
+        """Повторно применить сохранённые изменения к только что загруженным данным"""
+        with self._lock:
+            restored = dict(self.pending)
+        for article, entry in restored.items():
+            self.storage.apply_quantity_change(article, entry['delta'], entry['cell'])
+        if restored:
+            self.start()
+            self._wakeup.set()
+        return len(restored)
+
+    def stop(self, timeout=5):
+        """Остановить поток, попытавшись дописать очередь"""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        attempt = 0
+        while True:
+            self._wakeup.wait()
+            if not self._stopped:
+                time.sleep(COALESCE_DELAY)
+            self._wakeup.clear()
+            with self._lock:
+                batch, self.pending = self.pending, {}
+                self.in_flight = batch
+            if batch:
+                self._save_pending(batch)
+                try:
+                    self.storage.write_storage_data()
+                except Exception as e:
+                    self.last_error = str(e)
+                    with self._lock:
+                        # Возвращаем пачку в очередь, сверху новые изменения
+                        self.pending, self.in_flight = _merge(batch, self.pending), {}
+                    if self._stopped:
+                        return
+                    time.sleep(RETRY_DELAYS[min(attempt, len(RETRY_DELAYS) - 1)])
+                    attempt += 1
+                    self._wakeup.set()
+                    continue
+                attempt = 0
+                self.last_error = None
+                with self._lock:
+                    self.in_flight = {}
+                self._save_pending({})
+            if self._stopped and not self.pending_count():
+                return
+
+    def _load_pending(self):
+        try:
+            if os.path.exists(self.pending_file):
+                with open(self.pending_file, 'r', encoding='utf-8') as f:
+                    self.pending = json.load(f)
+        except Exception as e:
+            print(f"Ошибка загрузки очереди синхронизации: {e}")
+
+    def _save_pending(self, batch):
+        """Сохранить на диск batch вместе с изменениями, пришедшими после него"""
+        try:
+            with self._lock:
+                pending = _merge({a: dict(e) for a, e in batch.items()}, self.pending)
+            with open(self.pending_file, 'w', encoding='utf-8') as f:
+                json.dump(pending, f, ensure_ascii=False)
+        except Exception as e:
+            print(f"Ошибка сохранения очереди синхронизации: {e}")
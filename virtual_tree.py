@@ -0,0 +1,130 @@
+import tkinter as tk
+from tkinter import ttk
+
+# Сколько строк держать в Treeview сверх видимых
+BUFFER_ROWS = 5
+
+
+class VirtualTree:
+    """Таблица, которая держит в Treeview только видимые строки.
+
+    Данные в виджет не копируются: значения строк запрашиваются у row_values(index)
+    при прокрутке, поэтому память и время перерисовки не зависят от размера листа.
+    """
+
+    def __init__(self, master, columns, row_height, buffer=BUFFER_ROWS):
+        self.frame = tk.Frame(master)
+        self.tree = ttk.Treeview(self.frame, columns=columns, show='headings', selectmode='browse')
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.row_height = row_height
+        self.buffer = buffer
+        self.count = 0
+        self.row_values = None
+        self.top = 0              # индекс строки данных в первом слоте
+        self.visible = 1          # сколько строк помещается в окне
+        self.selected = None      # индекс выделенной строки данных
+        self._slots = []          # iid строк Treeview
+        self._slot_values = []    # показанные в слотах значения
+
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll(-1 if e.delta > 0 else 1, 'units'))
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-1, 'units'))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(1, 'units'))
+        self.tree.bind('<Up>', lambda e: self._move_selection(-1))
+        self.tree.bind('<Down>', lambda e: self._move_selection(1))
+        self.tree.bind('<Prior>', lambda e: self.scroll(-1, 'pages'))
+        self.tree.bind('<Next>', lambda e: self.scroll(1, 'pages'))
+
+    def set_model(self, count, row_values):
+        """Новый набор данных: count строк, row_values(index) -> кортеж значений"""
+        self.count = count
+        self.row_values = row_values
+        self.top = 0
+        self.selected = None
+        self._slot_values = [None] * len(self._slots)
+        self._render()
+
+    def clear(self):
+        self.set_model(0, None)
+
+    def index_of(self, iid):
+        """Индекс строки данных, показанной в слоте iid"""
+        return self.top + self._slots.index(iid)
+
+    def refresh(self):
+        """Перечитать все видимые строки (записываются только изменившиеся)"""
+        self._render()
+
+    def refresh_rows(self, indices):
+        """Перечитать строки по индексам; невидимые пропускаются"""
+        for index in indices:
+            slot = index - self.top
+            if 0 <= slot < len(self._slots):
+                self._fill_slot(slot)
+
+    def select(self, index):
+        """Выделить строку данных и прокрутить к ней"""
+        self.selected = index
+        if not (self.top <= index < self.top + self.visible):
+            self.top = index - self.visible // 2
+        self._render()
+
+    def scroll(self, number, what):
+        step = self.visible if what == 'pages' else 1
+        self.top += number * step
+        self._render()
+        return 'break'
+
+    def _on_scrollbar(self, action, *args):
+        if action == 'moveto':
+            self.top = int(float(args[0]) * self.count)
+            self._render()
+        elif action == 'scroll':
+            self.scroll(int(args[0]), args[1])
+
+    def _on_configure(self, event):
+        # Одна строка уходит под заголовки
+        visible = max(1, event.height // self.row_height - 1)
+        if visible != self.visible:
+            self.visible = visible
+            self._render()
+
+    def _move_selection(self, step):
+        if self.count:
+            current = self.selected if self.selected is not None else self.top - step
+            self.select(min(max(current + step, 0), self.count - 1))
+        return 'break'
+
+    def _fill_slot(self, slot):
+        values = self.row_values(self.top + slot)
+        if values != self._slot_values[slot]:
+            self.tree.item(self._slots[slot], values=values)
+            self._slot_values[slot] = values
+
+    def _render(self):
+        self.top = max(0, min(self.top, self.count - self.visible))
+        needed = min(self.visible + self.buffer, self.count - self.top)
+        while len(self._slots) < needed:
+            self._slots.append(self.tree.insert('', tk.END))
+            self._slot_values.append(None)
+        if len(self._slots) > needed:
+            self.tree.delete(*self._slots[needed:])
+            del self._slots[needed:]
+            del self._slot_values[needed:]
+        for slot in range(needed):
+            self._fill_slot(slot)
+
+        if self.count:
+            self.scrollbar.set(self.top / self.count, min(1.0, (self.top + self.visible) / self.count))
+        else:
+            self.scrollbar.set(0, 1)
+
+        slot = self.selected - self.top if self.selected is not None else -1
+        if 0 <= slot < needed:
+            self.tree.selection_set(self._slots[slot])
+            self.tree.focus(self._slots[slot])
+        else:
+            self.tree.selection_set(())
@@ -1,13 +1,27 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-import pandas as pd
+from tkinter import ttk, messagebox, simpledialog, filedialog
 import json
 import os
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+import threading
+import time
 import pickle
+import metrics
+from storage_sync import StorageSyncQueue
+from storage_reconcile import StorageReconciler
+from inventory_backends import SheetsBackend, SqliteBackend, SQLITE_FILE
+
+# Версия формата снимка остатков; снимок другой версии не читается
+SNAPSHOT_VERSION = 1
+
+
+class StockRecord:
+    """Остаток артикула на складе"""
+    __slots__ = ('quantity', 'cell')
+    
+    def __init__(self, quantity=0, cell=""):
+        self.quantity = quantity
+        self.cell = cell
+
 
 class WarehouseStorage:
     SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
@@ -17,16 +31,44 @@ class WarehouseStorage:
         self.service = None
         self.spreadsheet_id = None
         self.sheet_name = "Склад"
-        self.storage_data = pd.DataFrame(columns=['Артикул', 'Количество', 'Ячейка'])
-        self.storage_data.set_index('Артикул', inplace=True)
+        self.service_address = ""  # host:port общего сервера склада, пусто - своя таблица
+        self.backend_name = "sheets"  # 'sheets' или 'sqlite'
+        self.sqlite_path = SQLITE_FILE
+        self.inventory = None      # InventoryClient, когда склад ведёт сервер
+        self.inventory_error = ""  # последняя ошибка связи с сервером склада
+        self.storage_data = {}    # article -> StockRecord
         
         # Файлы для сохранения настроек
         self.config_file = os.path.expanduser('~/.warehouse_storage_config.json')
         self.creds_file = r'E:\warehouse_storage\credentials.json'
         self.token_file = os.path.expanduser('~/.warehouse_storage_token.pickle')
+        self.snapshot_file = os.path.expanduser('~/.warehouse_storage_snapshot.json')
         
         self.enabled = False
         self.load_config()
+
+        # Номера строк листа по артикулам и изменённые с последней записи ячейки:
+        # сохранение отправляет только их, а не переписывает весь лист
+        self.row_index = {}       # article -> номер строки в листе
+        self.dirty = set()        # артикулы, изменённые с последней записи
+        
+        # storage_data меняется из окна, а записывается фоновым потоком
+        self.lock = threading.RLock()
+        self.sync = StorageSyncQueue(self)
+        
+        # Последнее известное содержимое листа - база для сверки с ним
+        self.remote = {}          # article -> (количество, ячейка)
+        self.write_generation = 0 # растёт при каждой записи в лист
+        self.reconciler = StorageReconciler(self)
+        # Куда записываются остатки: лист Google Sheets или локальная база
+        self.backend = SheetsBackend(self)
+        # callback(articles) о строках, изменившихся не с этой станции
+        self.listeners = []
+        
+        # Остатки взяты из снимка и ещё не сверены с хранилищем
+        self.stale = False
+        self.snapshot_time = None
+        self.revalidate_error = None
         
     def load_config(self):
         """Загрузка сохраненной конфигурации"""
@@ -37,6 +79,9 @@ class WarehouseStorage:
                     self.spreadsheet_id = config.get('spreadsheet_id')
                     self.sheet_name = config.get('sheet_name', 'Склад')
                     self.enabled = config.get('enabled', False)
+                    self.service_address = config.get('service_address', "")
+                    self.backend_name = config.get('backend', "sheets")
+                    self.sqlite_path = config.get('sqlite_path', SQLITE_FILE)
         except Exception as e:
             print(f"Ошибка загрузки конфигурации: {e}")
     
@@ -46,15 +91,33 @@ class WarehouseStorage:
             config = {
                 'spreadsheet_id': self.spreadsheet_id,
                 'sheet_name': self.sheet_name,
-                'enabled': self.enabled
+                'enabled': self.enabled,
+                'service_address': self.service_address,
+                'backend': self.backend_name,
+                'sqlite_path': self.sqlite_path
             }
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(config, f, ensure_ascii=False, indent=2)
         except Exception as e:
             print(f"Ошибка сохранения конфигурации: {e}")
     
-    def authenticate_google(self):
-        """Аутентификация с Google Sheets API"""
+    def authenticate_google(self, interactive=True):
+        """Аутентификация с Google Sheets API.
+        
+        interactive=False - без окна входа и диалогов (для фонового потока):
+        если сохранённого токена не хватает, возвращает False.
+        """
+        # Клиент Google тяжёлый - загружается только при подключении
+        try:
+            from google.auth.transport.requests import Request
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            from googleapiclient.discovery import build
+        except ImportError as e:
+            if not interactive:
+                raise
+            messagebox.showerror("Ошибка", f"Не установлены библиотеки Google API:\n{e}")
+            return False
+        
         creds = None
         
         # Загрузка существующего токена
@@ -74,6 +137,8 @@ class WarehouseStorage:
                     creds = None
             
             if not creds:
+                if not interactive:
+                    return False
                 if not os.path.exists(self.creds_file):
                     messagebox.showerror(
                         "Ошибка", 
@@ -99,6 +164,8 @@ class WarehouseStorage:
             self.service = build('sheets', 'v4', credentials=creds)
             return True
         except Exception as e:
+            if not interactive:
+                raise
             messagebox.showerror("Ошибка подключения", str(e))
             return False
     
@@ -153,117 +220,324 @@ class WarehouseStorage:
             return False
     
     def load_storage_data(self):
-        """Загрузка данных склада из Google Sheets"""
-        if not self.service or not self.spreadsheet_id:
-            return False
-        
+        """Загрузка данных склада из хранилища (Google Sheets или SQLite)"""
         try:
-            range_name = f'{self.sheet_name}!A:C'
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.spreadsheet_id,
-                range=range_name
-            ).execute()
-            
-            values = result.get('values', [])
-            if not values or len(values) < 2:
-                # Пустая таблица или только заголовки
-                self.storage_data = pd.DataFrame(columns=['Количество', 'Ячейка'])
-                return True
-            
-            # Пропускаем заголовок
-            data_rows = values[1:]
-            
-            # Обрабатываем данные
-            processed_data = []
-            for row in data_rows:
-                if len(row) >= 2 and row[0].strip():  # Минимум артикул и количество
-                    article = row[0].strip()
-                    try:
-                        quantity = int(row[1]) if row[1].strip() else 0
-                    except:
-                        quantity = 0
-                    cell = row[2].strip() if len(row) > 2 else ""
-                    processed_data.append({
-                        'Артикул': article,
-                        'Количество': quantity,
-                        'Ячейка': cell
-                    })
-            
-            if processed_data:
-                self.storage_data = pd.DataFrame(processed_data)
-                self.storage_data.set_index('Артикул', inplace=True)
-            else:
-                self.storage_data = pd.DataFrame(columns=['Количество', 'Ячейка'])
-            
+            self.reload_storage_data()
             return True
             
         except Exception as e:
             messagebox.showerror("Ошибка загрузки данных", str(e))
             return False
     
-    def save_storage_data(self):
-        """Сохранение данных склада в Google Sheets"""
-        if not self.service or not self.spreadsheet_id:
+    @metrics.timed('storage_load')
+    def reload_storage_data(self):
+        """Загрузка из хранилища без диалогов; можно вызывать из фонового потока"""
+        records = self.backend.load()
+        with self.lock:
+            changed = self._replace_data(records)
+            # Изменения, не успевшие уйти в хранилище до отключения
+            self.sync.restore()
+        self.notify_changed(changed)
+        self.save_snapshot()
+    
+    def _replace_data(self, records):
+        """Новые остатки целиком (под self.lock); возвращает изменившиеся артикулы"""
+        old = self.storage_data
+        changed = {article for article in old.keys() | records.keys()
+                   if article not in old or article not in records
+                   or (old[article].quantity, old[article].cell) != tuple(records[article])}
+        self.storage_data = {article: StockRecord(quantity, cell)
+                             for article, (quantity, cell) in records.items()}
+        self.dirty = set()
+        self.stale = False
+        return changed
+    
+    # --- Снимок остатков на диске ---
+    
+    def _snapshot_source(self):
+        """Откуда взяты остатки: снимок другого склада не подставляется"""
+        if self.service_address:
+            return f"service:{self.service_address}"
+        if self.backend_name == "sqlite":
+            return f"sqlite:{self.sqlite_path}"
+        return f"sheets:{self.spreadsheet_id}/{self.sheet_name}"
+    
+    def save_snapshot(self):
+        """Последние известные остатки - для мгновенного старта"""
+        with self.lock:
+            items = [[article, record.quantity, record.cell]
+                     for article, record in self.storage_data.items()]
+        snapshot = {'version': SNAPSHOT_VERSION, 'source': self._snapshot_source(),
+                    'saved_at': time.time(), 'items': items}
+        try:
+            tmp = self.snapshot_file + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp, self.snapshot_file)
+        except Exception as e:
+            print(f"Ошибка сохранения снимка склада: {e}")
+    
+    def start_from_snapshot(self):
+        """Старт без ожидания сети: остатки из снимка, сверка с хранилищем в фоне.
+        
+        Пока сверка не закончилась, stale=True: окно помечает значения как
+        устаревшие, а запись в хранилище откладывается, чтобы не затереть
+        его старыми данными.
+        """
+        if not self.enabled:
             return False
+        try:
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            if (snapshot.get('version') != SNAPSHOT_VERSION
+                    or snapshot.get('source') != self._snapshot_source()):
+                snapshot = None
+        except (OSError, ValueError):
+            snapshot = None
+        with self.lock:
+            if snapshot:
+                self.storage_data = {article: StockRecord(quantity, cell)
+                                     for article, quantity, cell in snapshot['items']}
+                self.snapshot_time = snapshot['saved_at']
+            self.stale = True
+        threading.Thread(target=self._revalidate, name="storage-revalidate", daemon=True).start()
+        return snapshot is not None
+    
+    def _revalidate(self):
+        try:
+            if self.service_address:
+                from inventory_service import InventoryClient, parse_address
+                host, port = parse_address(self.service_address)
+                self._open_inventory_service(InventoryClient(host, port))
+            else:
+                if self.backend_name == "sqlite":
+                    if not isinstance(self.backend, SqliteBackend):
+                        self.use_backend(SqliteBackend(self.sqlite_path))
+                elif not self.authenticate_google(interactive=False):
+                    raise RuntimeError("нужен вход в Google - подключитесь в окне склада")
+                self.reload_storage_data()
+            self.revalidate_error = None
+        except Exception as e:
+            self.revalidate_error = str(e)
+    
+    def stale_text(self):
+        """Строка состояния для окна, пока остатки не сверены"""
+        if not self.stale:
+            return ""
+        if self.snapshot_time:
+            when = time.strftime('%d.%m %H:%M', time.localtime(self.snapshot_time))
+            text = f"Остатки из снимка ({when})"
+        else:
+            text = "Остатки склада ещё не загружены"
+        if self.revalidate_error:
+            return f"{text}, сверка не удалась: {self.revalidate_error}"
+        return f"{text}, идёт сверка..."
+    
+    def use_backend(self, backend):
+        """Переключение хранилища; данные нужно загрузить заново"""
+        self.backend.close()
+        self.backend = backend
+    
+    def fetch_sheet_values(self):
+        """Все строки листа склада (A:C) как их отдаёт Sheets API"""
+        result = self.service.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id,
+            range=f'{self.sheet_name}!A:C'
+        ).execute()
+        return result.get('values', [])
+    
+    def notify_changed(self, articles):
+        """Сообщить подписчикам об артикулах, изменённых не с этой станции"""
+        if articles:
+            for listener in list(self.listeners):
+                listener(articles)
+    
+    def connect_inventory_service(self, client=None):
+        """Подключение к общему серверу склада вместо своей таблицы.
         
+        client - готовый клиент (например LocalInventoryClient), иначе
+        InventoryClient по адресу service_address.
+        """
         try:
-            # Подготавливаем данные для записи
-            values = [['Артикул', 'Количество', 'Ячейка']]
-            
-            for article, row in self.storage_data.iterrows():
-                values.append([
-                    str(article),
-                    int(row['Количество']),
-                    str(row['Ячейка'])
-                ])
-            
-            # Очищаем существующие данные
-            range_name = f'{self.sheet_name}!A:C'
-            self.service.spreadsheets().values().clear(
-                spreadsheetId=self.spreadsheet_id,
-                range=range_name
-            ).execute()
-            
-            # Записываем новые данные
-            self.service.spreadsheets().values().update(
-                spreadsheetId=self.spreadsheet_id,
-                range=range_name,
-                valueInputOption='RAW',
-                body={'values': values}
-            ).execute()
-            
+            if client is None:
+                from inventory_service import InventoryClient, parse_address
+                host, port = parse_address(self.service_address)
+                client = InventoryClient(host, port)
+            self._open_inventory_service(client)
+        except Exception as e:
+            messagebox.showerror("Ошибка подключения к серверу склада", str(e))
+            return False
+        return True
+    
+    def _open_inventory_service(self, client):
+        """Подключение клиента и загрузка остатков с сервера; ошибки - исключениями"""
+        self.disconnect_inventory_service()
+        client.on_change = self._on_remote_change
+        try:
+            client.connect()
+            # Сначала подписка, потом снимок: изменения между ними не потеряются
+            client.call('subscribe')
+            items = client.call('snapshot')['items']
+        except Exception:
+            client.close()
+            raise
+        with self.lock:
+            changed = self._replace_data({article: (quantity, cell)
+                                          for article, quantity, cell in items})
+            self.row_index = {}
+        self.inventory = client
+        self.notify_changed(changed)
+        self.save_snapshot()
+    
+    def disconnect_inventory_service(self):
+        self.reconciler.stop()
+        if self.inventory is not None:
+            self.inventory.close()
+            self.inventory = None
+    
+    def _on_remote_change(self, article, quantity, cell):
+        """Уведомление сервера склада: новое значение остатка"""
+        with self.lock:
+            if quantity is None:
+                self.storage_data.pop(article, None)
+            else:
+                record = self.storage_data.get(article)
+                if record is None:
+                    self.storage_data[article] = StockRecord(quantity, cell)
+                else:
+                    record.quantity, record.cell = quantity, cell
+        self.notify_changed({article})
+    
+    @metrics.timed('inventory_call')
+    def _call_service(self, op, article, n, cell=""):
+        """Операция на сервере склада; None при ошибке связи (текст - в inventory_error)"""
+        try:
+            response = self.inventory.call(op, article=article, n=n, cell=cell)
+        except Exception as e:
+            self.inventory_error = str(e) or type(e).__name__
+            return None
+        self._on_remote_change(article, response['quantity'], response['cell'])
+        return response
+    
+    def save_storage_data(self):
+        """Сохранение данных склада в хранилище"""
+        try:
+            self.write_storage_data()
             return True
             
         except Exception as e:
             messagebox.showerror("Ошибка сохранения данных", str(e))
             return False
     
+    @metrics.timed('storage_write')
+    def write_storage_data(self):
+        """Запись изменённых с прошлого раза артикулов в хранилище без диалогов.
+        
+        Вызывается и из фонового потока.
+        """
+        if self.stale:
+            # Иначе устаревшие значения из снимка затёрли бы хранилище
+            raise RuntimeError("остатки ещё не сверены с хранилищем")
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+            records = {}
+            for article in dirty:
+                record = self.storage_data.get(article)
+                records[article] = None if record is None else (record.quantity, record.cell)
+        try:
+            if records:
+                self.backend.bulk_apply(records)
+        except Exception:
+            # Не записанное вернётся в следующую попытку
+            with self.lock:
+                self.dirty |= dirty
+            raise
+    
+    def compact_storage_data(self):
+        """Полная перезапись хранилища (в листе убирает пустые строки удалённых артикулов)"""
+        if self.stale:
+            raise RuntimeError("остатки ещё не сверены с хранилищем")
+        with self.lock:
+            records = {article: (record.quantity, record.cell)
+                       for article, record in self.storage_data.items()}
+            dirty, self.dirty = self.dirty, set()
+        try:
+            self.backend.compact(records)
+        except Exception:
+            with self.lock:
+                self.dirty |= dirty
+            raise
+    
+    def to_dataframe(self):
+        """Остатки в виде DataFrame (для выгрузки в Excel)"""
+        with self.lock:
+            rows = [(article, record.quantity, record.cell)
+                    for article, record in self.storage_data.items()]
+        import pandas as pd
+        df = pd.DataFrame(rows, columns=['Артикул', 'Количество', 'Ячейка'])
+        return df.set_index('Артикул')
+    
     def get_article_info(self, article):
         """Получение информации о товаре на складе"""
-        if not self.enabled or article not in self.storage_data.index:
+        record = self.storage_data.get(article) if self.enabled else None
+        if record is None:
             return None, ""
+        return record.quantity, record.cell
+    
+    def reserve(self, article, n=1):
+        """Списание n единиц, только если их хватает; False - товара нет,
+        None - сервер склада недоступен и списание не выполнено.
         
-        row = self.storage_data.loc[article]
-        return row['Количество'], row['Ячейка']
+        Артикул, которого нет на складе, не проверяется (как и раньше).
+        """
+        if not self.enabled:
+            return True
+        if self.inventory is not None:
+            response = self._call_service('reserve', article, n)
+            return None if response is None else bool(response['ok'])
+        
+        with self.lock:
+            record = self.storage_data.get(article)
+            if record is not None and record.quantity < n:
+                return False
+            self.apply_quantity_change(article, -n)
+        self.sync.push(article, -n)
+        return True
     
     def update_article_quantity(self, article, quantity_change, cell=""):
-        """Обновление количества товара на складе"""
+        """Обновление количества товара на складе.
+        
+        Меняются только данные в памяти, запись в таблицу уходит в фоновую очередь.
+        При работе через сервер склада изменение выполняет сервер.
+        """
         if not self.enabled:
             return True
+        if self.inventory is not None:
+            if quantity_change >= 0:
+                response = self._call_service('return', article, quantity_change, cell)
+            else:
+                response = self._call_service('decrement', article, -quantity_change)
+            return response is not None
         
-        if article not in self.storage_data.index:
+        with self.lock:
+            self.apply_quantity_change(article, quantity_change, cell)
+        self.sync.push(article, quantity_change, cell)
+        return True
+    
+    def apply_quantity_change(self, article, quantity_change, cell=""):
+        """Изменение количества в памяти без постановки в очередь синхронизации"""
+        record = self.storage_data.get(article)
+        if record is None:
             # Добавляем новый товар
-            self.storage_data.loc[article] = {'Количество': 0, 'Ячейка': cell}
+            record = self.storage_data[article] = StockRecord(0, cell)
         
         # Обновляем количество
-        current_qty = self.storage_data.loc[article, 'Количество']
-        new_qty = max(0, current_qty + quantity_change)  # Не допускаем отрицательные значения
-        
-        self.storage_data.loc[article, 'Количество'] = new_qty
+        record.quantity = max(0, record.quantity + quantity_change)  # Не допускаем отрицательные значения
+        self.dirty.add(article)
         
         # Обновляем ячейку, если указана
         if cell:
-            self.storage_data.loc[article, 'Ячейка'] = cell
+            record.cell = cell
         
         return True
     
@@ -288,13 +562,54 @@ class WarehouseStorage:
         sheet_entry.grid(row=1, column=1, sticky='w', padx=5, pady=2)
         sheet_entry.insert(0, self.sheet_name)
         
+        tk.Label(settings_frame, text="Сервер склада:").grid(row=2, column=0, sticky='w', padx=5, pady=2)
+        service_entry = tk.Entry(settings_frame, width=30)
+        service_entry.grid(row=2, column=1, sticky='w', padx=5, pady=2)
+        service_entry.insert(0, self.service_address)
+        
+        tk.Label(settings_frame, text="Хранилище:").grid(row=3, column=0, sticky='w', padx=5, pady=2)
+        backend_var = tk.StringVar(value=self.backend_name)
+        backend_frame = tk.Frame(settings_frame)
+        backend_frame.grid(row=3, column=1, sticky='w', padx=5, pady=2)
+        tk.Radiobutton(backend_frame, text="Google Sheets", variable=backend_var,
+                       value="sheets").pack(side=tk.LEFT)
+        tk.Radiobutton(backend_frame, text="SQLite (локально, без сети)", variable=backend_var,
+                       value="sqlite").pack(side=tk.LEFT)
+        
         # Кнопки управления
         btn_frame = tk.Frame(settings_frame)
-        btn_frame.grid(row=2, column=0, columnspan=2, pady=10)
+        btn_frame.grid(row=4, column=0, columnspan=2, pady=10)
         
         def connect_sheets():
             self.spreadsheet_id = spreadsheet_entry.get().strip()
             self.sheet_name = sheet_entry.get().strip() or "Склад"
+            self.service_address = service_entry.get().strip()
+            
+            # Общий сервер склада: таблицу ведёт он, станции к ней не подключаются
+            if self.service_address:
+                if self.connect_inventory_service():
+                    self.enabled = True
+                    self.save_config()
+                    messagebox.showinfo("Успех", f"Подключение к серверу склада {self.service_address} установлено")
+                    refresh_tree()
+                return
+            
+            self.backend_name = backend_var.get()
+            if self.backend_name == "sqlite":
+                try:
+                    if not isinstance(self.backend, SqliteBackend):
+                        self.use_backend(SqliteBackend(self.sqlite_path))
+                except Exception as e:
+                    messagebox.showerror("Ошибка подключения", str(e))
+                    return
+                if self.load_storage_data():
+                    self.enabled = True
+                    self.save_config()
+                    messagebox.showinfo("Успех", f"Склад открыт из {self.sqlite_path}")
+                    refresh_tree()
+                return
+            if not isinstance(self.backend, SheetsBackend):
+                self.use_backend(SheetsBackend(self))
             
             if not self.spreadsheet_id:
                 messagebox.showerror("Ошибка", "Укажите ID таблицы")
@@ -311,6 +626,7 @@ class WarehouseStorage:
                         messagebox.showerror("Ошибка", "Не удалось загрузить данные")
         
         def disconnect_sheets():
+            self.disconnect_inventory_service()
             self.enabled = False
             self.save_config()
             messagebox.showinfo("Информация", "Подключение к складу отключено")
@@ -320,8 +636,14 @@ class WarehouseStorage:
         tk.Button(btn_frame, text="Отключиться", command=disconnect_sheets).pack(side=tk.LEFT, padx=5)
         
         # Статус подключения
-        status_label = tk.Label(settings_frame, text=f"Статус: {'Подключен' if self.enabled else 'Не подключен'}")
-        status_label.grid(row=3, column=0, columnspan=2, pady=5)
+        def status_text():
+            text = f"Статус: {'Подключен' if self.enabled else 'Не подключен'}"
+            if self.enabled and self.stale:
+                text += f"\n{self.stale_text()}"
+            return text
+        
+        status_label = tk.Label(settings_frame, text=status_text())
+        status_label.grid(row=5, column=0, columnspan=2, pady=5)
         
         # Таблица данных склада
         data_frame = tk.LabelFrame(storage_window, text="Данные склада")
@@ -353,15 +675,60 @@ class WarehouseStorage:
         tree.column('quantity', width=100)
         tree.column('cell', width=150)
         tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        # Значения из снимка, ещё не сверенные с хранилищем
+        tree.tag_configure('stale', foreground='gray50')
         
         def refresh_tree():
             for item in tree.get_children():
                 tree.delete(item)
             
-            if self.enabled and not self.storage_data.empty:
-                for article, row in self.storage_data.iterrows():
-                    tree.insert('', tk.END, text=article, 
-                               values=(row['Количество'], row['Ячейка']))
+            if self.enabled and self.storage_data:
+                tags = ('stale',) if self.stale else ()
+                for article, record in self.storage_data.items():
+                    tree.insert('', tk.END, iid=article, text=article, 
+                               values=(record.quantity, record.cell), tags=tags)
+        
+        # Строки, изменённые сверкой или сервером склада, обновляются точечно.
+        # Подписчик вызывается из фонового потока, поэтому только копит артикулы
+        changed = set()
+        changed_lock = threading.Lock()
+        
+        def on_changed(articles):
+            with changed_lock:
+                changed.update(articles)
+        
+        shown_stale = [self.stale]
+        
+        def update_changed_rows():
+            if not storage_window.winfo_exists():
+                return
+            with changed_lock:
+                articles = list(changed)
+                changed.clear()
+            status_label.config(text=status_text())
+            if shown_stale[0] != self.stale:
+                # Сверка после старта из снимка закончилась: перерисовываем всё
+                shown_stale[0] = self.stale
+                refresh_tree()
+            elif self.enabled:
+                for article in articles:
+                    record = self.storage_data.get(article)
+                    if record is None:
+                        if tree.exists(article):
+                            tree.delete(article)
+                    elif tree.exists(article):
+                        tree.item(article, values=(record.quantity, record.cell))
+                    else:
+                        tree.insert('', tk.END, iid=article, text=article,
+                                    values=(record.quantity, record.cell))
+            storage_window.after(500, update_changed_rows)
+        
+        def on_destroy(event):
+            if event.widget is storage_window and on_changed in self.listeners:
+                self.listeners.remove(on_changed)
+        
+        self.listeners.append(on_changed)
+        storage_window.bind('<Destroy>', on_destroy)
         
         def add_item():
             article = article_entry.get().strip()
@@ -378,7 +745,6 @@ class WarehouseStorage:
             
             if self.enabled:
                 self.update_article_quantity(article, qty, cell)
-                self.save_storage_data()
             
             article_entry.delete(0, tk.END)
             qty_entry.delete(0, tk.END)
@@ -394,12 +760,36 @@ class WarehouseStorage:
                 return
             
             article = tree.item(selection[0])['text']
+            if self.inventory is not None:
+                messagebox.showwarning("Внимание", "При работе через сервер склада товары удаляются на сервере")
+                return
             if messagebox.askyesno("Подтверждение", f"Удалить {article} со склада?"):
-                if self.enabled and article in self.storage_data.index:
-                    self.storage_data.drop(article, inplace=True)
+                if self.enabled and article in self.storage_data:
+                    with self.lock:
+                        del self.storage_data[article]
+                        self.dirty.add(article)
                     self.save_storage_data()
                 refresh_tree()
         
+        def export_excel():
+            path = filedialog.asksaveasfilename(defaultextension='.xlsx', filetypes=[('Excel', '*.xlsx')])
+            if not path:
+                return
+            try:
+                self.to_dataframe().to_excel(path)
+                messagebox.showinfo("Готово", f"Остатки сохранены в {os.path.basename(path)}")
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Не удалось сохранить:\n{e}")
+        
+        def compact_sheet():
+            if not self.enabled:
+                return
+            try:
+                self.compact_storage_data()
+                messagebox.showinfo("Готово", "Лист склада перезаписан без пустых строк")
+            except Exception as e:
+                messagebox.showerror("Ошибка сохранения данных", str(e))
+        
         # Кнопки управления данными
         data_btn_frame = tk.Frame(data_frame)
         data_btn_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -407,6 +797,8 @@ class WarehouseStorage:
         tk.Button(data_btn_frame, text="Добавить", command=add_item).pack(side=tk.LEFT, padx=5)
         tk.Button(data_btn_frame, text="Удалить", command=remove_item).pack(side=tk.LEFT, padx=5)
         tk.Button(data_btn_frame, text="Обновить", command=refresh_tree).pack(side=tk.LEFT, padx=5)
+        tk.Button(data_btn_frame, text="Экспорт", command=export_excel).pack(side=tk.LEFT, padx=5)
+        tk.Button(data_btn_frame, text="Сжать лист", command=compact_sheet).pack(side=tk.LEFT, padx=5)
         
         # Привязка Enter к добавлению товара
         def on_enter(event):
@@ -420,4 +812,5 @@ class WarehouseStorage:
         article_entry.focus_set()
         
         # Инициализация таблицы
-        refresh_tree()
\ No newline at end of file
+        refresh_tree()
+        update_changed_rows()
\ No newline at end of file
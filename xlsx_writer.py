@@ -0,0 +1,188 @@
+"""Запись книги xlsx с одним листом из столбцов.
+
+Лист собирается строками XML напрямую, без объектной модели ячеек openpyxl:
+на каждую ячейку - одно форматирование строки, текст попадает в общую
+таблицу строк один раз, сколько бы раз он ни повторялся (коды коробок,
+зоны, сроки). Стилей у ячеек нет, заголовок без жирного шрифта и рамок,
+как требуют маркетплейсы. Время в архиве фиксированное, поэтому одинаковые
+данные дают побайтно одинаковый файл.
+
+write_sheet принимает готовые столбцы, write_rows - итератор строк.
+
+Значения: str - текст, int/float - число, None, NaN и "" - пустая ячейка,
+остальное записывается как str(value).
+"""
+import itertools
+import math
+import re
+import zipfile
+
+import numpy as np
+
+CHUNK_ROWS = 10000
+ZIP_TIME = (1980, 1, 1, 0, 0, 0)
+
+_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml'
+_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+_STATIC_PARTS = {
+    '[Content_Types].xml': (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        f'<Override PartName="/xl/workbook.xml" ContentType="{_TYPE}.sheet.main+xml"/>'
+        f'<Override PartName="/xl/worksheets/sheet1.xml" ContentType="{_TYPE}.worksheet+xml"/>'
+        f'<Override PartName="/xl/sharedStrings.xml" ContentType="{_TYPE}.sharedStrings+xml"/>'
+        f'<Override PartName="/xl/styles.xml" ContentType="{_TYPE}.styles+xml"/>'
+        '</Types>'),
+    '_rels/.rels': (
+        f'<Relationships xmlns="{_PKG_REL}">'
+        f'<Relationship Id="rId1" Type="{_REL}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    'xl/workbook.xml': (
+        f'<workbook xmlns="{_MAIN}" xmlns:r="{_REL}">'
+        '<sheets><sheet name="Sheet" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    'xl/_rels/workbook.xml.rels': (
+        f'<Relationships xmlns="{_PKG_REL}">'
+        f'<Relationship Id="rId1" Type="{_REL}/worksheet" Target="worksheets/sheet1.xml"/>'
+        f'<Relationship Id="rId2" Type="{_REL}/sharedStrings" Target="sharedStrings.xml"/>'
+        f'<Relationship Id="rId3" Type="{_REL}/styles" Target="styles.xml"/>'
+        '</Relationships>'),
+    'xl/styles.xml': (
+        f'<styleSheet xmlns="{_MAIN}">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'),
+}
+
+# Управляющие символы, недопустимые в XML 1.0
+_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _escape(text):
+    text = _ILLEGAL.sub('', text)
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def column_letter(index):
+    """0 -> A, 25 -> Z, 26 -> AA"""
+    letters = ''
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+class _Strings:
+    """Общая таблица строк книги: текст -> номер"""
+
+    def __init__(self):
+        self.index = {}
+        self.count = 0     # ссылок из ячеек
+
+    def cell(self, ref, text):
+        self.count += 1
+        k = self.index.setdefault(text, len(self.index))
+        return f'<c r="{ref}" t="s"><v>{k}</v></c>'
+
+    def xml(self):
+        items = []
+        for text in self.index:
+            space = ' xml:space="preserve"' if text != text.strip() else ''
+            items.append(f'<si><t{space}>{_escape(text)}</t></si>')
+        return (f'<sst xmlns="{_MAIN}" count="{self.count}" uniqueCount="{len(self.index)}">'
+                + ''.join(items) + '</sst>')
+
+
+def _value_cell(ref, value, strings):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return strings.cell(ref, value) if value else ''
+    if isinstance(value, (bool, np.bool_)):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, np.integer)):
+        return f'<c r="{ref}"><v>{int(value)}</v></c>'
+    if isinstance(value, (float, np.floating)):
+        if math.isnan(value):
+            return ''
+        if math.isinf(value):
+            return strings.cell(ref, str(value))
+        return f'<c r="{ref}"><v>{float(value)!r}</v></c>'
+    return strings.cell(ref, str(value))
+
+
+def _column_cells(letter, values, first, strings):
+    """XML ячеек одного столбца, начиная со строки first"""
+    refs = [f"{letter}{r}" for r in range(first, first + len(values))]
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'iu':
+        return [f'<c r="{ref}"><v>{v}</v></c>' for ref, v in zip(refs, values.tolist())]
+    if isinstance(values, np.ndarray):
+        values = values.tolist()
+    return [_value_cell(ref, v, strings) for ref, v in zip(refs, values)]
+
+
+def write_sheet(path, header, columns):
+    """Заголовок и столбцы одинаковой длины (списки или массивы NumPy) в path;
+    возвращает число строк данных"""
+    rows = len(columns[0]) if columns else 0
+    if any(len(col) != rows for col in columns):
+        raise ValueError("Столбцы разной длины")
+    chunks = ([col[start:start + CHUNK_ROWS] for col in columns]
+              for start in range(0, rows, CHUNK_ROWS))
+    return _write(path, header, chunks, len(columns))
+
+
+def write_rows(path, header, rows):
+    """То же для итератора строк (кортежей): читается кусками по CHUNK_ROWS,
+    поэтому память не зависит от числа строк"""
+    rows = iter(rows)
+
+    def chunks():
+        while True:
+            chunk = list(itertools.islice(rows, CHUNK_ROWS))
+            if not chunk:
+                return
+            yield [list(col) for col in itertools.zip_longest(*chunk)]
+    return _write(path, header, chunks(), len(header))
+
+
+def _write(path, header, chunks, width):
+    """Книга из кусков столбцов; возвращает число строк данных"""
+    strings = _Strings()
+    written = 0
+
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, body in _STATIC_PARTS.items():
+            zf.writestr(zipfile.ZipInfo(name, ZIP_TIME), _HEAD + body, zipfile.ZIP_DEFLATED)
+        info = zipfile.ZipInfo('xl/worksheets/sheet1.xml', ZIP_TIME)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with zf.open(info, 'w') as sheet:
+            sheet.write((_HEAD + f'<worksheet xmlns="{_MAIN}"><sheetData>').encode('utf-8'))
+            head = ''.join(_value_cell(f"{column_letter(k)}1", title, strings)
+                           for k, title in enumerate(header))
+            sheet.write(f'<row r="1">{head}</row>'.encode('utf-8'))
+            # Кусками по CHUNK_ROWS: память не растёт вместе с текстом листа
+            for columns in chunks:
+                first = written + 2
+                count = len(columns[0]) if columns else 0
+                letters = [column_letter(k) for k in range(max(width, len(columns)))]
+                cells = [_column_cells(letter, col, first, strings)
+                         for letter, col in zip(letters, columns)]
+                text = ''.join(f'<row r="{r}">{"".join(row)}</row>'
+                               for r, row in zip(range(first, first + count), zip(*cells)))
+                sheet.write(text.encode('utf-8'))
+                written += count
+            sheet.write(b'</sheetData></worksheet>')
+        zf.writestr(zipfile.ZipInfo('xl/sharedStrings.xml', ZIP_TIME), _HEAD + strings.xml(),
+                    zipfile.ZIP_DEFLATED)
+    return written